@@ -0,0 +1,91 @@
+import os
+import json
+import time
+import base64
+import hashlib
+import threading
+from .state import state_root, load_json, save_json
+
+# A successful validation is trusted for this long before a run checks the token again
+AUTH_TTL = 3600
+# Tokens this close to their expiry are validated again instead of trusted
+EXPIRY_MARGIN = 300
+
+# How a token was accepted: Bearer header on /me, or the gp_access_token cookie on /media/user
+AUTH_BEARER = "bearer"
+AUTH_COOKIE = "cookie"
+
+def token_expiry(token):
+    """
+    Reads the expiry (epoch seconds) from the "exp" claim of a JWT. The
+    signature is not checked; this only decides when to validate again.
+    Returns None for tokens that are not JWTs or carry no expiry.
+    """
+    parts = str(token).split(".")
+    if len(parts) != 3:
+        return None
+    try:
+        payload = parts[1] + "=" * (-len(parts[1]) % 4)
+        claims = json.loads(base64.urlsafe_b64decode(payload))
+        return int(claims["exp"])
+    except (ValueError, TypeError, KeyError):
+        return None
+
+class AuthCache:
+    """
+    Remembers tokens that validated: the user id, which auth style worked and
+    when the token expires, plus session facts such as the listing page size
+    (see GoProPlus.validate). Entries are keyed by a hash of the token, so the
+    token itself is never written. Kept in the local state folder rather than
+    the sync target, since one token may sync into several targets.
+    A read_only cache uses what earlier runs saved but never writes.
+    """
+    FILENAME = "auth.json"
+
+    def __init__(self, path=None, ttl=AUTH_TTL, read_only=False):
+        self.path = path or os.path.join(state_root(), self.FILENAME)
+        self.ttl = ttl
+        self.read_only = read_only
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(token):
+        return hashlib.sha256(str(token).encode()).hexdigest()[:32]
+
+    def get(self, token):
+        """The entry for token, however old, or None."""
+        entries = load_json(self.path, {})
+        entry = entries.get(self._key(token)) if isinstance(entries, dict) else None
+        return entry if isinstance(entry, dict) else None
+
+    def fresh(self, token):
+        """The entry for token if its validation can still be trusted, else None."""
+        entry = self.get(token)
+        if not entry or not entry.get("method"):
+            return None
+        now = time.time()
+        if entry.get("validated_at", 0) + self.ttl <= now:
+            return None
+        expires_at = entry.get("expires_at")
+        if expires_at and expires_at - EXPIRY_MARGIN <= now:
+            return None
+        return entry
+
+    def update(self, token, **fields):
+        if self.read_only:
+            return
+        with self._lock:
+            entries = load_json(self.path, {})
+            if not isinstance(entries, dict):
+                entries = {}
+            entry = entries.setdefault(self._key(token), {})
+            if all(entry.get(k) == v for k, v in fields.items()):
+                return
+            entry.update(fields)
+            save_json(self.path, entries)
+
+    def forget(self, token):
+        # Drops the validation but keeps session facts (page size) for the next one
+        entry = self.get(token)
+        if entry and entry.get("method"):
+            self.update(token, method=None, validated_at=0)
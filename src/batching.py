@@ -0,0 +1,51 @@
+import logging
+
+# Items up to this size are considered "small" and may be grouped into a batch
+BATCH_THRESHOLD = 20 * 1024 * 1024
+# Upper bound on the combined size of the items in one zip/source request
+BATCH_MAX_BYTES = 200 * 1024 * 1024
+# The ids end up in the query string, so keep batches at a sane length
+BATCH_MAX_ITEMS = 100
+
+def plan_batches(items, threshold=BATCH_THRESHOLD, max_bytes=BATCH_MAX_BYTES, max_items=BATCH_MAX_ITEMS):
+    """
+    Groups small items into batches for multi-id zip requests.
+    Returns (batches, remaining) where batches is a list of item lists and
+    remaining holds the items that should be downloaded one by one.
+    Items with an unknown size are never batched.
+    """
+    batches = []
+    remaining = []
+    current = []
+    current_bytes = 0
+
+    for item in items:
+        size = item.get("file_size")
+        try:
+            size = int(size)
+        except (TypeError, ValueError):
+            size = None
+
+        if size is None or size > threshold:
+            remaining.append(item)
+            continue
+
+        if current and (current_bytes + size > max_bytes or len(current) >= max_items):
+            batches.append(current)
+            current = []
+            current_bytes = 0
+
+        current.append(item)
+        current_bytes += size
+
+    if current:
+        batches.append(current)
+
+    # A batch of one is just a slower individual download
+    singles = [b[0] for b in batches if len(b) == 1]
+    batches = [b for b in batches if len(b) > 1]
+    remaining.extend(singles)
+
+    if batches:
+        logging.info(f"Planned {len(batches)} batches covering {sum(len(b) for b in batches)} small items.")
+    return batches, remaining
@@ -0,0 +1,503 @@
+import os
+import re
+import hmac
+import json
+import time
+import hashlib
+import logging
+import threading
+from urllib.parse import urlsplit, parse_qs, quote, unquote
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import requests
+from .gopro_client import GoProPlus
+from .reconcile import LocalIndex
+from .tiers import TierManifest, TIER_SOURCE, select_variation, variation_tier
+from .url_resolver import source_url_from_download
+from .retry import DownloadError, retry_after_seconds
+from .state import state_path, load_json
+
+# Default port of the cache server
+CACHE_PORT = 8766
+# Listings are answered from memory for this long, per token and query
+LISTING_TTL = 60
+# Lifetime of the signed links handed out for cached media
+LINK_TTL = 6 * 3600
+# Read size when filling from the cloud and serving to clients
+SERVE_CHUNK = 1024 * 1024
+# Request headers passed on to the API
+FORWARDED_HEADERS = ("Authorization", "Accept", "Cookie", "User-Agent")
+
+_CACHE_PATH = re.compile(r"^/cache/([^/]+)/([^/]+)$")
+_DOWNLOAD_PATH = re.compile(r"^/media/([^/]+)/download$")
+
+def _safe(name):
+    return re.sub(r"[^A-Za-z0-9._-]+", "_", str(name))
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+def parse_range(header, size):
+    """
+    Reads a single "bytes=" range into (start, end) with end inclusive. Returns
+    None when there is no range, or one that is served whole (several ranges);
+    raises ValueError when it lies outside the file.
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    first, _, last = header[len("bytes="):].strip().partition("-")
+    if not first:
+        if not last.isdigit() or not int(last):
+            raise ValueError(header)
+        return max(0, size - int(last)), size - 1
+    if not first.isdigit() or (last and not last.isdigit()):
+        return None
+    start, end = int(first), min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        raise ValueError(header)
+    return start, end
+
+class MediaStore:
+    """
+    Where the cache node finds media for its clients: source files that its
+    own sync put in the target folder (per .gopro-sync/index.json, as long as
+    name and size still match the listing), else blobs under
+    .gopro-sync/cache/<id>/<key> that were filled from the cloud on first request.
+    """
+    DIRNAME = "cache"
+
+    def __init__(self, target_folder, cache_dir=None):
+        self.cache_dir = cache_dir or state_path(target_folder, self.DIRNAME)
+        self.index_path = state_path(target_folder, LocalIndex.FILENAME)
+        self.tiers_path = state_path(target_folder, TierManifest.FILENAME)
+        self.items = {} # media id -> (filename, file_size), from the listings served
+        self._index = {}
+        self._proxies = {}
+        self._mtimes = None
+        self._lock = threading.Lock()
+
+    def remember(self, item):
+        if item.get("id") is not None:
+            self.items[str(item["id"])] = (item.get("filename"), item.get("file_size"))
+
+    def _synced_entries(self):
+        # The node's sync (in this process or another) rewrites these as it goes
+        mtimes = (_mtime(self.index_path), _mtime(self.tiers_path))
+        with self._lock:
+            if mtimes != self._mtimes:
+                self._index = load_json(self.index_path, {}) or {}
+                self._proxies = load_json(self.tiers_path, {}) or {}
+                self._mtimes = mtimes
+            return self._index, self._proxies
+
+    def synced_path(self, media_id):
+        """The source file of media_id in the target folder, or None."""
+        media_id = str(media_id)
+        filename, size = self.items.get(media_id, (None, None))
+        index, proxies = self._synced_entries()
+        entry = index.get(media_id)
+        if not (filename and size and entry) or media_id in proxies:
+            return None
+        path = entry["path"]
+        try:
+            if os.path.basename(path) == filename and os.path.getsize(path) == int(size):
+                return path
+        except (OSError, TypeError, ValueError):
+            pass
+        return None
+
+    def blob_path(self, media_id, key):
+        return os.path.join(self.cache_dir, _safe(media_id), _safe(key))
+
+    def prune(self):
+        """Drops source blobs the node's own sync has since stored in the target folder."""
+        removed = 0
+        try:
+            media_ids = os.listdir(self.cache_dir)
+        except OSError:
+            return 0
+        for media_id in media_ids:
+            blob = self.blob_path(media_id, TIER_SOURCE)
+            if os.path.exists(blob) and self.synced_path(media_id):
+                os.remove(blob)
+                removed += 1
+        if removed:
+            logging.info(f"Removed {removed} cached files that are now in the target folder")
+        return removed
+
+class _Fill:
+    """One transfer from the cloud into a blob, read by every request for it while it runs."""
+    def __init__(self, path):
+        self.path = path
+        self.part = path + ".part"
+        self.size = None # total bytes, once the cloud said
+        self.written = 0
+        self.done = False
+        self.error = None
+        self.cond = threading.Condition()
+
+    def wait_for(self, end):
+        """Blocks until the part file holds end bytes (or the fill ended); returns what it holds."""
+        with self.cond:
+            while self.written < end and not self.done and self.error is None:
+                self.cond.wait(1)
+            if self.error is not None and self.written < end:
+                raise self.error
+            return self.written
+
+    def wait_for_size(self):
+        with self.cond:
+            while self.size is None and not self.done and self.error is None:
+                self.cond.wait(1)
+            if self.error is not None:
+                raise self.error
+            return self.size if self.size is not None else self.written
+
+    def open(self):
+        # After the fill finished the part file has been renamed
+        with self.cond:
+            return open(self.path if self.done else self.part, 'rb')
+
+class CacheServer:
+    """
+    LAN read-through cache in front of the GoPro Cloud API. Clients use it as
+    their upstream (GoProPlus.host, see sync_account's upstream): API requests
+    are passed on with the client's own credentials, listings are kept for
+    LISTING_TTL seconds, and the media links in /media/{id}/download answers
+    (and in listings with variations) are replaced with signed links to this
+    server. Those are served with Range support from the MediaStore; a miss is
+    fetched from the cloud once, using the node's token, and streamed to every
+    client asking for it meanwhile. zip/source requests are passed through
+    uncached. GET /cache-status reports hits, misses and bytes.
+    """
+    def __init__(self, auth_token, target_folder, host="0.0.0.0", port=CACHE_PORT, cache_dir=None, cloud=None):
+        self.client = GoProPlus(auth_token)
+        self.cloud = (cloud or self.client.host).rstrip("/")
+        self.client.host = self.cloud
+        self.store = MediaStore(target_folder, cache_dir)
+        self.stats = {"hits": 0, "misses": 0, "bytes_served": 0, "bytes_fetched": 0}
+        self._secret = hashlib.sha256(b"gopro-sync-cache:" + auth_token.encode()).digest()
+        self._links = {} # (media id, key) -> signed cloud url
+        self._fills = {}
+        self._listings = {}
+        self._lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), _Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.cache = self
+        self._thread = None
+
+    @property
+    def address(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{'127.0.0.1' if host == '0.0.0.0' else host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="cache", daemon=True)
+        self._thread.start()
+        logging.info(f"Media cache listening on {self.address}, storing misses in {self.store.cache_dir}")
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        logging.info(f"Media cache: {self.stats['hits']} hits, {self.stats['misses']} misses, "
+                     f"{self.stats['bytes_served']} bytes served, {self.stats['bytes_fetched']} fetched from the cloud")
+
+    def prune(self):
+        return self.store.prune()
+
+    def _count(self, key, amount=1):
+        with self._lock:
+            self.stats[key] += amount
+
+    # Links
+
+    def _sign(self, media_id, key, expires):
+        message = f"{media_id}/{key}/{expires}".encode()
+        return hmac.new(self._secret, message, hashlib.sha256).hexdigest()[:32]
+
+    def verify(self, media_id, key, query):
+        try:
+            expires = int(query.get("Expires", [""])[0])
+        except ValueError:
+            return False
+        signature = query.get("Signature", [""])[0]
+        return expires > time.time() and hmac.compare_digest(signature, self._sign(media_id, key, expires))
+
+    def _keyed_urls(self, data):
+        # (entry, key) for every media URL of a /media/{id}/download answer. The
+        # keys are stable between answers, so a link can be looked up again
+        embedded = data.get("_embedded") if isinstance(data, dict) else None
+        if not isinstance(embedded, dict):
+            return []
+        source = source_url_from_download(data)
+        entries = []
+        for i, entry in enumerate(embedded.get("files") or []):
+            if isinstance(entry, dict) and entry.get("url"):
+                key = TIER_SOURCE if entry["url"] == source else f"file{entry.get('item_number', i)}"
+                entries.append((entry, key))
+        for entry, key in self._variation_keys(embedded.get("variations") or [], source):
+            entries.append((entry, key))
+        return entries
+
+    def _variation_keys(self, variations, source=None):
+        variations = [v for v in variations if isinstance(v, dict) and v.get("url")]
+        if source is None:
+            found = select_variation(variations, TIER_SOURCE)
+            source = found["url"] if found else None
+        keys = []
+        for v in variations:
+            if v["url"] == source:
+                keys.append((v, TIER_SOURCE))
+            else:
+                keys.append((v, _safe(f"{variation_tier(v)}-{v.get('height') or 0}")))
+        return keys
+
+    def _rewrite(self, media_id, keyed, base):
+        media_id = str(media_id)
+        expires = int(time.time()) + LINK_TTL
+        for entry, key in keyed:
+            with self._lock:
+                self._links[(media_id, key)] = entry["url"]
+            entry["url"] = (f"{base}/cache/{quote(media_id, safe='')}/{quote(key, safe='')}"
+                            f"?Expires={expires}&Signature={self._sign(media_id, key, expires)}")
+
+    def cloud_url(self, media_id, key, refresh=False):
+        with self._lock:
+            url = None if refresh else self._links.get((media_id, key))
+        if url:
+            return url
+        # Unknown (e.g. after a restart) or expired: look it up with the node's token
+        data = self.client.get_media_download(media_id)
+        found = None
+        for entry, entry_key in self._keyed_urls(data):
+            with self._lock:
+                self._links[(media_id, entry_key)] = entry["url"]
+            if entry_key == key:
+                found = entry["url"]
+        if not found:
+            raise DownloadError(f"{media_id} has no file {key}", 404)
+        return found
+
+    # API
+
+    def forward(self, path, headers, stream=False):
+        headers = {name: headers[name] for name in FORWARDED_HEADERS if headers.get(name)}
+        if stream:
+            # Passed through as is, so Content-Length stays valid
+            headers["Accept-Encoding"] = "identity"
+        return requests.get(self.cloud + path, headers=headers, stream=stream, timeout=60)
+
+    def listing(self, path, headers, base):
+        key = (hashlib.sha256(f"{headers.get('Authorization')}|{headers.get('Cookie')}".encode()).hexdigest(), path)
+        now = time.monotonic()
+        with self._lock:
+            cached = self._listings.get(key)
+        if cached and cached[0] > now:
+            return cached[1], cached[2]
+
+        resp = self.forward(path, headers)
+        body = resp.content
+        if resp.status_code == 200:
+            data = resp.json()
+            for item in (data.get("_embedded") or {}).get("media") or []:
+                self.store.remember(item)
+                if item.get("variations"):
+                    self._rewrite(item["id"], self._variation_keys(item["variations"]), base)
+            body = json.dumps(data).encode()
+            with self._lock:
+                self._listings = {k: v for k, v in self._listings.items() if v[0] > now}
+                self._listings[key] = (now + LISTING_TTL, resp.status_code, body)
+        return resp.status_code, body
+
+    def download_info(self, media_id, path, headers, base):
+        resp = self.forward(path, headers)
+        if resp.status_code != 200:
+            return resp.status_code, resp.content
+        data = resp.json()
+        self._rewrite(media_id, self._keyed_urls(data), base)
+        return resp.status_code, json.dumps(data).encode()
+
+    # Media
+
+    def locate(self, media_id, key):
+        """(path, None) for media on disk, or (None, fill) for a transfer from the cloud."""
+        if key == TIER_SOURCE:
+            path = self.store.synced_path(media_id)
+            if path:
+                self._count("hits")
+                return path, None
+        path = self.store.blob_path(media_id, key)
+        with self._lock:
+            if os.path.exists(path):
+                self.stats["hits"] += 1
+                return path, None
+            fill = self._fills.get(path)
+            if fill is None:
+                self.stats["misses"] += 1
+                fill = self._fills[path] = _Fill(path)
+                threading.Thread(target=self._fill, args=(media_id, key, fill), name="cache-fill", daemon=True).start()
+        return None, fill
+
+    def _fill(self, media_id, key, fill):
+        os.makedirs(os.path.dirname(fill.path), exist_ok=True)
+
+        def attempt(n):
+            refresh = n > 0
+            while True:
+                offset = os.path.getsize(fill.part) if os.path.exists(fill.part) else 0
+                headers = {"Range": f"bytes={offset}-"} if offset else {}
+                r = requests.get(self.cloud_url(media_id, key, refresh), headers=headers, stream=True, timeout=30)
+                if r.status_code in (401, 403, 404) and not refresh:
+                    # The link we were handed has expired
+                    r.close()
+                    refresh = True
+                    continue
+                break
+            with r:
+                if r.status_code not in (200, 206):
+                    raise DownloadError(f"HTTP {r.status_code}", r.status_code, retry_after_seconds(r.headers.get('Retry-After')))
+                if r.status_code == 200:
+                    offset = 0
+                length = r.headers.get("Content-Length")
+                with open(fill.part, 'ab' if offset else 'wb') as f:
+                    with fill.cond:
+                        fill.written = offset
+                        fill.size = offset + int(length) if length and length.isdigit() else None
+                        fill.cond.notify_all()
+                    for chunk in r.iter_content(chunk_size=SERVE_CHUNK):
+                        if not chunk:
+                            continue
+                        f.write(chunk)
+                        f.flush()
+                        self._count("bytes_fetched", len(chunk))
+                        with fill.cond:
+                            fill.written += len(chunk)
+                            fill.cond.notify_all()
+                if fill.size is not None and fill.written < fill.size:
+                    raise ConnectionError(f"Cloud stream of {media_id} ended at {fill.written} of {fill.size} bytes")
+
+        ok = False
+        try:
+            logging.info(f"Fetching {media_id} ({key}) from the cloud for the cache")
+            ok = self.client.retry_policy.run(attempt, f"cache fill of {media_id}")
+        finally:
+            with self._lock, fill.cond:
+                if ok:
+                    os.replace(fill.part, fill.path)
+                    fill.size = fill.written
+                    fill.done = True
+                else:
+                    fill.error = DownloadError(f"Could not fetch {media_id} from the cloud", 502)
+                del self._fills[fill.path]
+                fill.cond.notify_all()
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "gopro-sync-cache"
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        logging.debug("Media cache: " + format % args)
+
+    def _reply(self, code, body, content_type="application/json"):
+        self.send_response(code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _base(self):
+        return f"http://{self.headers.get('Host') or '%s:%d' % self.server.server_address[:2]}"
+
+    def do_HEAD(self):
+        self._media(head=True)
+
+    def do_GET(self):
+        cache = self.server.cache
+        url = urlsplit(self.path)
+        try:
+            if _CACHE_PATH.match(url.path):
+                return self._media()
+            if url.path == "/cache-status":
+                return self._reply(200, json.dumps(cache.stats).encode())
+            if url.path == "/media/search":
+                return self._reply(*cache.listing(self.path, self.headers, self._base()))
+            match = _DOWNLOAD_PATH.match(url.path)
+            if match:
+                return self._reply(*cache.download_info(unquote(match.group(1)), self.path, self.headers, self._base()))
+            self._pass_through()
+        except (requests.RequestException, DownloadError, ValueError) as e:
+            logging.warning(f"Media cache could not answer {url.path}: {e}")
+            self._reply(502, json.dumps({"error": str(e)}).encode())
+
+    def _pass_through(self):
+        with self.server.cache.forward(self.path, self.headers, stream=True) as r:
+            self.send_response(r.status_code)
+            for name in ("Content-Type", "Content-Length", "Content-Disposition"):
+                if r.headers.get(name):
+                    self.send_header(name, r.headers[name])
+            if not r.headers.get("Content-Length"):
+                self.close_connection = True
+            self.end_headers()
+            for chunk in r.raw.stream(SERVE_CHUNK, decode_content=False):
+                self.wfile.write(chunk)
+
+    def _media(self, head=False):
+        cache = self.server.cache
+        url = urlsplit(self.path)
+        match = _CACHE_PATH.match(url.path)
+        if not match:
+            return self._reply(404, b'{"error": "not found"}')
+        media_id, key = unquote(match.group(1)), unquote(match.group(2))
+        if not cache.verify(media_id, key, parse_qs(url.query)):
+            return self._reply(403, b'{"error": "link expired or invalid"}')
+
+        path, fill = cache.locate(media_id, key)
+        try:
+            size = os.path.getsize(path) if path else fill.wait_for_size()
+        except DownloadError as e:
+            return self._reply(e.status_code or 502, json.dumps({"error": str(e)}).encode())
+        try:
+            span = parse_range(self.headers.get("Range"), size)
+        except ValueError:
+            self.send_response(416)
+            self.send_header("Content-Range", f"bytes */{size}")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        start, end = span or (0, size - 1)
+        self.send_response(206 if span else 200)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Length", str(end - start + 1))
+        if span:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        self.end_headers()
+        if head:
+            return
+
+        with (open(path, 'rb') if path else fill.open()) as f:
+            f.seek(start)
+            position = start
+            while position <= end:
+                if fill is not None:
+                    try:
+                        fill.wait_for(position + 1)
+                    except DownloadError:
+                        # Headers are out already; a short body tells the client to resume
+                        self.close_connection = True
+                        return
+                chunk = f.read(min(SERVE_CHUNK, end + 1 - position))
+                if not chunk:
+                    if fill is None or fill.done:
+                        # Shorter than announced
+                        self.close_connection = True
+                        return
+                    continue
+                self.wfile.write(chunk)
+                position += len(chunk)
+                cache._count("bytes_served", len(chunk))
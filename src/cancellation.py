@@ -0,0 +1,33 @@
+import threading
+
+class SyncCancelled(Exception):
+    """Raised from inside download, listing and extraction loops once a sync is cancelled."""
+
+class CancelToken:
+    """
+    Cooperative cancellation shared by everything taking part in a sync.
+    Loops call raise_if_cancelled() once per chunk/page/entry, so a cancel
+    takes effect within one chunk. poll is an optional extra callable
+    (e.g. the old is_cancelled callback) that is consulted as well.
+    """
+    def __init__(self, poll=None):
+        self._event = threading.Event()
+        self._poll = poll
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self):
+        if not self._event.is_set() and self._poll and self._poll():
+            self._event.set()
+        return self._event.is_set()
+
+    def raise_if_cancelled(self):
+        if self.cancelled:
+            raise SyncCancelled()
+
+    def sleep(self, seconds):
+        """Sleeps like time.sleep, but wakes up (and raises) on cancel."""
+        if self._event.wait(seconds) or self.cancelled:
+            raise SyncCancelled()
@@ -1,6 +1,7 @@
 import argparse
 import os
 import sys
+import signal
 import logging
 # Ensure project root is in path
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -8,23 +9,42 @@ project_root = os.path.dirname(current_dir)
 if project_root not in sys.path:
     sys.path.insert(0, project_root)
 
-try:
-    import keyring
-except ImportError:
-    keyring = None
-
-from src.sync import sync_account
+# Only light modules are imported up front. keyring (which probes its backends),
+# requests and the sync stack are loaded on first use, so --help, argument
+# errors and the token lookup stay fast for frequent cron/daemon runs
+from src.progress import format_snapshot, format_bytes
+from src.cancellation import CancelToken, SyncCancelled
+from src.profiling import SyncProfiler
+from src.filters import MediaFilter, parse_types, parse_date, parse_size
+from src.reconcile import ON_DELETED_ACTIONS, ON_DELETED_REPORT
+from src.fingerprint import VERIFY_MODES, VERIFY_QUICK
 
 SERVICE_ID = "gopro-cloud-sync"
 ACCOUNT_ID = "auth_token"
 
+def _keyring():
+    try:
+        import keyring
+    except ImportError:
+        return None
+    return keyring
+
+def sync_account(*args, **kwargs):
+    from src.sync import sync_account as run
+    return run(*args, **kwargs)
+
+def plan_sync(*args, **kwargs):
+    from src.sync import plan_sync as run
+    return run(*args, **kwargs)
+
 def get_token():
     # 1. Env Var
     token = os.environ.get("GO_PRO_AUTH_TOKEN")
     if token:
         return token
         
-    # 2. Keyring (if available)
+    # 2. Keyring (if available); only imported when the environment has no token
+    keyring = _keyring()
     if keyring:
         try:
             token = keyring.get_password(SERVICE_ID, ACCOUNT_ID)
@@ -38,6 +58,7 @@ def get_token():
     return None
 
 def set_token(token):
+    keyring = _keyring()
     if not keyring:
         logging.error("Keyring module not installed. Cannot save token.")
         return
@@ -48,17 +69,111 @@ def set_token(token):
     except Exception as e:
         logging.error(f"Failed to save token to keyring: {e}")
 
+def print_progress(snapshot):
+    # Single self-overwriting status line on stderr
+    sys.stderr.write("\r\033[K" + format_snapshot(snapshot))
+    sys.stderr.flush()
+
+def print_plan(plan):
+    for action in ("download", "unpack"):
+        for item in plan[action]:
+            size = int(item.get("file_size") or 0)
+            print(f"{action} {item.get('filename') or item['id']} ({format_bytes(size)})")
+    size = sum(int(item.get("file_size") or 0) for item in plan["download"])
+    print(f"{len(plan['download'])} to download ({format_bytes(size)}), {len(plan['unpack'])} to unpack, "
+          f"{len(plan['skip'])} already synced")
+
 def main():
     parser = argparse.ArgumentParser(description="GoPro Cloud Sync")
-    parser.add_argument("--folder", help="Target folder for sync")
+    parser.add_argument("--folder", help="Target folder for sync, or an s3://bucket/prefix URL")
     parser.add_argument("--token", help="GoPro Cloud Auth Token")
     parser.add_argument("--save-token", action="store_true", help="Save the provided token to keyring")
     parser.add_argument("--verbose", action="store_true", help="Enable verbose logging")
-    
+    parser.add_argument("--batch-small", action="store_true", help="Fetch small items (e.g. photos) in multi-id zip batches")
+    parser.add_argument("--batch-threshold-mb", type=float, default=20, help="Largest item size in MB that may be batched")
+    parser.add_argument("--batch-max-mb", type=float, default=200, help="Maximum combined size in MB of one batch")
+    parser.add_argument("--quality", default="source",
+                        help="Tier to download: 'source' (default), 'smallest'/'largest' proxy or a variation label")
+    parser.add_argument("--upgrade", nargs="*", metavar="MEDIA_ID",
+                        help="Only upgrade proxies from earlier runs to source (all, or the given media ids)")
+    parser.add_argument("--no-resolve-urls", action="store_true",
+                        help="Don't resolve signed direct download links ahead of time (always allow zip/source)")
+    parser.add_argument("--auth-ttl", type=int, default=3600, metavar="SECONDS",
+                        help="Trust a token validated less than SECONDS ago without checking it again (0 = every run)")
+    parser.add_argument("--list-fields", default="minimal", metavar="FIELDS",
+                        help="Item fields requested when listing: 'minimal' (default, variations are fetched only "
+                             "for items that get downloaded), 'full', or a comma separated list")
+    parser.add_argument("--plan", action="store_true",
+                        help="Only list what a sync would download, without downloading or changing anything")
+    parser.add_argument("--progress", action="store_true", help="Show a live byte level progress line on stderr")
+    parser.add_argument("--max-attempts", type=int, default=3, help="Attempts per download before an item is deferred")
+    parser.add_argument("--max-concurrency", type=int, default=1,
+                        help="Most parallel downloads (default 1, sequential); above 1 the number in use adapts "
+                             "to throughput and errors")
+    parser.add_argument("--min-concurrency", type=int, default=1, help="Fewest parallel downloads the adaptive control may go down to")
+    parser.add_argument("--on-deleted", choices=ON_DELETED_ACTIONS, default=ON_DELETED_REPORT,
+                        help="What to do with local files whose media was deleted from the cloud: "
+                             "report them (default), move them to deleted-from-cloud/, or delete them")
+    parser.add_argument("--verify", choices=VERIFY_MODES, default=VERIFY_QUICK,
+                        help="How existing files are checked: size only, quick sampled fingerprints (default), "
+                             "or rescan every file's samples")
+    parser.add_argument("--dedup", action="store_true",
+                        help="Store footage the cloud holds under several media ids once, as reflinks or hardlinks")
+    parser.add_argument("--dedup-index", metavar="FILE",
+                        help="Dedup index shared by several targets (default: .gopro-sync/dedup.json in the target)")
+    parser.add_argument("--hook", action="append", default=[], metavar="COMMAND",
+                        help="Run COMMAND on every newly synced file while the sync goes on ({path}, {id} and "
+                             "{filename} are replaced; without {path} the path is appended); repeatable, run in order")
+    parser.add_argument("--hook-workers", type=int, default=2, help="Files processed by hooks at the same time")
+    parser.add_argument("--control", metavar="[HOST:]PORT", default=os.environ.get("GOPRO_SYNC_CONTROL"),
+                        help="Serve a JSON status and control API (pause, resume, cancel, bandwidth, concurrency) "
+                             "on PORT, on 127.0.0.1 unless HOST is given; GOPRO_SYNC_CONTROL_TOKEN requires a bearer token")
+    parser.add_argument("--limit-rate", type=parse_size, metavar="SIZE",
+                        help="Cap the combined download rate at SIZE per second (e.g. 20MB); changeable through --control")
+    nodes = parser.add_argument_group("multiple nodes", "Share one sync between several machines or containers")
+    nodes.add_argument("--coordinate", metavar="PATH", default=os.environ.get("GOPRO_SYNC_COORDINATE"),
+                       help="Shared lease store: a SQLite file (*.db) or a directory on storage all nodes can reach")
+    nodes.add_argument("--node-id", help="Name of this node in the lease store (default: hostname-pid)")
+    nodes.add_argument("--lease-ttl", type=int, default=300,
+                       help="Seconds after which items of a node that stopped renewing are taken over")
+    nodes.add_argument("--serve-cache", metavar="[HOST:]PORT", default=os.environ.get("GOPRO_SYNC_SERVE_CACHE"),
+                       help="Serve this node's synced media to other machines as a read-through cache of the cloud "
+                            "on PORT (all interfaces unless HOST is given), and keep serving after the sync")
+    nodes.add_argument("--upstream", metavar="URL", default=os.environ.get("GOPRO_SYNC_UPSTREAM"),
+                       help="Sync through the --serve-cache node at URL (e.g. http://nas:8766) instead of "
+                            "straight from the cloud")
+    filters = parser.add_argument_group("selective sync", "Only sync cloud items matching all given filters")
+    filters.add_argument("--type", type=parse_types, metavar="TYPES",
+                         help="Comma separated media types: 'videos', 'photos' or API types such as Video,TimeLapse")
+    filters.add_argument("--since", type=parse_date, metavar="DATE",
+                         help="Captured on or after DATE (YYYY-MM-DD, ISO datetime, or an age like 90d, 12h, 2w)")
+    filters.add_argument("--until", type=parse_date, metavar="DATE", help="Captured before DATE")
+    filters.add_argument("--min-size", type=parse_size, metavar="SIZE", help="Skip files smaller than SIZE (e.g. 10MB)")
+    filters.add_argument("--max-size", type=parse_size, metavar="SIZE", help="Skip files larger than SIZE (e.g. 20GB)")
+    filters.add_argument("--include", action="append", default=[], metavar="PATTERN",
+                         help="Only filenames matching this pattern (e.g. 'GX*.MP4'); repeatable")
+    filters.add_argument("--exclude", action="append", default=[], metavar="PATTERN",
+                         help="Skip filenames matching this pattern; repeatable")
+    filters.add_argument("--camera", action="append", default=[], metavar="NAME",
+                         help="Only media from cameras whose model contains NAME (e.g. 'HERO11'); repeatable")
+    parser.add_argument("--events", metavar="FILE",
+                        help="Append a JSON lines record of the run (per item bytes, duration, method, retries) to FILE")
+    parser.add_argument("--report", metavar="FILE", help="Summarize the runs recorded in an --events FILE and exit")
+    parser.add_argument("--profile", metavar="DIR",
+                        help="Record per-phase timings of the run and write a Chrome trace (trace.json) to DIR")
+    parser.add_argument("--profile-cpu", action="store_true", help="With --profile, also capture a cProfile (cpu.pstats) of the main thread")
+    parser.add_argument("--profile-memory", action="store_true",
+                        help="With --profile, also capture a tracemalloc snapshot (memory.txt)")
+
     args = parser.parse_args()
     
     level = logging.DEBUG if args.verbose else logging.INFO
     logging.basicConfig(level=level, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    if args.report:
+        from src.report import main as report
+        report([args.report])
+        return
     
     token = args.token
     if token and args.save_token:
@@ -77,8 +192,110 @@ def main():
         folder = os.getcwd()
         logging.info(f"No folder specified. Using current directory: {folder}")
         
+    media_filter = MediaFilter(types=args.type or [], since=args.since, until=args.until,
+                               min_size=args.min_size, max_size=args.max_size,
+                               include=args.include, exclude=args.exclude, cameras=args.camera)
+
+    upstream = args.upstream
+
+    if args.plan:
+        plan = plan_sync(token, folder, quality=args.quality, media_filter=media_filter or None, verify=args.verify,
+                         auth_ttl=args.auth_ttl, upstream=upstream)
+        if plan is None:
+            sys.exit(1)
+        print_plan(plan)
+        return
+
+    # SIGTERM (docker stop) and Ctrl+C stop within one chunk and keep partial
+    # files, so the next run resumes instead of starting over
+    cancel_token = CancelToken()
+    def request_stop(signum, frame):
+        logging.info("Stop requested, finishing the current chunk...")
+        cancel_token.cancel()
+    previous_handlers = {sig: signal.signal(sig, request_stop) for sig in (signal.SIGINT, signal.SIGTERM)}
+
+    # --profile, or GOPRO_SYNC_PROFILE in the environment (e.g. for the Docker image)
+    profiler = SyncProfiler.from_env(args.profile, args.profile_cpu, args.profile_memory)
+    if profiler:
+        logging.info(f"Profiling this run into {profiler.out_dir}")
+        profiler.start()
+
+    from src.retry import RetryPolicy
+    from src.events import EventLog
+
+    control = server = None
+    if args.control or args.limit_rate:
+        from src.control import SyncControl, ControlServer, parse_address
+        control = SyncControl(args.limit_rate)
+        if args.control:
+            host, port = parse_address(args.control)
+            server = ControlServer(control, host, port, token=os.environ.get("GOPRO_SYNC_CONTROL_TOKEN"))
+            server.start()
+
+    cache_server = None
+    if args.serve_cache:
+        from src.cache_server import CacheServer, CACHE_PORT
+        from src.control import parse_address
+        host, port = parse_address(args.serve_cache, "0.0.0.0", CACHE_PORT)
+        cache_server = CacheServer(token, folder, host, port)
+        cache_server.start()
+        # This node's own sync goes through its cache too, so files other
+        # machines already pulled through it are not fetched again
+        upstream = upstream or cache_server.address
+
     logging.info(f"Syncing to {folder}...")
-    success = sync_account(token, folder)
+    try:
+        success = sync_account(
+            token, folder,
+            batch_small_files=args.batch_small,
+            batch_threshold=int(args.batch_threshold_mb * 1024 * 1024),
+            batch_max_bytes=int(args.batch_max_mb * 1024 * 1024),
+            quality=args.quality,
+            upgrade_ids=args.upgrade,
+            retry_policy=RetryPolicy(max_attempts=args.max_attempts),
+            resolve_urls=not args.no_resolve_urls,
+            on_progress=print_progress if args.progress else None,
+            progress_hz=2,
+            cancel_token=cancel_token,
+            tracer=profiler.tracer if profiler else None,
+            media_filter=media_filter or None,
+            on_deleted=args.on_deleted,
+            min_concurrency=args.min_concurrency,
+            max_concurrency=args.max_concurrency,
+            coordinate=args.coordinate,
+            node_id=args.node_id,
+            lease_ttl=args.lease_ttl,
+            verify=args.verify,
+            events=EventLog(args.events) if args.events else None,
+            list_fields=args.list_fields,
+            auth_ttl=args.auth_ttl,
+            dedup=args.dedup,
+            dedup_index=args.dedup_index,
+            hooks=args.hook or None,
+            hook_workers=args.hook_workers,
+            control=control,
+            upstream=upstream,
+        )
+        if cache_server is not None and success:
+            cache_server.prune()
+            logging.info(f"Sync finished, serving the media cache on {cache_server.address} until stopped")
+            try:
+                while True:
+                    cancel_token.sleep(3600)
+            except SyncCancelled:
+                pass
+    finally:
+        if cache_server is not None:
+            cache_server.stop()
+        if server:
+            server.stop()
+        for sig, handler in previous_handlers.items():
+            signal.signal(sig, handler)
+        if profiler:
+            for path in profiler.stop():
+                logging.info(f"Wrote {path}")
+    if args.progress:
+        sys.stderr.write("\n")
     if not success:
         sys.exit(1)
 
@@ -0,0 +1,162 @@
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from .progress import format_bytes
+from .retry import _status_of
+
+# How often the controller looks at aggregate throughput
+CONTROL_INTERVAL = 5.0
+# Aggregate throughput has to grow by this share to count as improving
+IMPROVEMENT = 0.05
+# A per-stream rate falling by this share (without the total growing) counts as congestion
+STREAM_DROP = 0.5
+# Multiplicative decrease on congestion
+DECREASE_FACTOR = 0.5
+# Intervals on a plateau before probing one level higher again
+PROBE_AFTER = 6
+# How long the engine waits for a download to finish before checking in with the controller
+ENGINE_TICK = 0.5
+# Threads the engine may start when the ceiling is raised during a run (they are only started as needed)
+MAX_WORKERS = 64
+
+class AimdController:
+    """
+    Additive-increase, multiplicative-decrease control of the number of
+    parallel downloads, between floor and ceiling. Every interval the
+    aggregate throughput is compared with the previous one: while it keeps
+    improving one more stream is added; retryable errors (timeouts, 5xx,
+    429) or a collapsing per-stream rate halve the level. On a plateau the
+    level is held, with an occasional probe upwards.
+    """
+    def __init__(self, floor=1, ceiling=8, initial=None, interval=CONTROL_INTERVAL, tracer=None, on_change=None):
+        self.floor = max(1, int(floor))
+        self.ceiling = max(self.floor, int(ceiling))
+        self.level = min(self.ceiling, max(self.floor, int(initial or self.floor)))
+        self.interval = interval
+        self.tracer = tracer
+        self.on_change = on_change # on_change(level), e.g. to publish it as a metric
+        self.rate = 0.0
+        self._errors = 0
+        self._throttled = 0
+        self._last_time = None
+        self._last_bytes = 0
+        self._prev_rate = None
+        self._prev_per_stream = None
+        self._plateau = 0
+        self._lock = threading.Lock()
+
+    def record_error(self, error=None):
+        """Reports a failed attempt that is worth backing off for."""
+        with self._lock:
+            self._errors += 1
+            if _status_of(error) == 429:
+                self._throttled += 1
+
+    def update(self, bytes_total, now=None):
+        """
+        Feeds the aggregate number of bytes transferred so far; adjusts the
+        level once per interval. Returns the level to run at.
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            if self._last_time is None:
+                self._last_time, self._last_bytes = now, bytes_total
+                return self.level
+            elapsed = now - self._last_time
+            if elapsed < self.interval:
+                return self.level
+
+            rate = (bytes_total - self._last_bytes) / elapsed
+            errors, throttled = self._errors, self._throttled
+            self._errors = self._throttled = 0
+            self._last_time, self._last_bytes = now, bytes_total
+            self.rate = rate
+            per_stream = rate / self.level
+
+            if errors:
+                reason = f"{throttled} throttled" if throttled else f"{errors} errors"
+                self._set(max(self.floor, int(self.level * DECREASE_FACTOR)), reason)
+            elif rate <= 0:
+                # Nothing moved (listing, extracting, retry waits): no signal either way
+                return self.level
+            elif (self._prev_rate is not None and rate <= self._prev_rate
+                  and per_stream < self._prev_per_stream * (1 - STREAM_DROP)):
+                self._set(max(self.floor, int(self.level * DECREASE_FACTOR)), "per-stream rate fell")
+            elif self._prev_rate is None or rate > self._prev_rate * (1 + IMPROVEMENT):
+                self._plateau = 0
+                self._set(min(self.ceiling, self.level + 1), "throughput improving")
+            else:
+                self._plateau += 1
+                if self._plateau >= PROBE_AFTER:
+                    self._plateau = 0
+                    self._set(min(self.ceiling, self.level + 1), "probing")
+
+            self._prev_rate = rate
+            self._prev_per_stream = rate / self.level
+            return self.level
+
+    def set_limits(self, floor=None, ceiling=None):
+        """Changes the range during a run (e.g. from the control API); the level is moved into it."""
+        with self._lock:
+            floor = self.floor if floor is None else max(1, int(floor))
+            ceiling = self.ceiling if ceiling is None else int(ceiling)
+            if ceiling < floor or ceiling > MAX_WORKERS:
+                raise ValueError(f"concurrency must satisfy 1 <= min <= max <= {MAX_WORKERS}")
+            self.floor, self.ceiling = floor, ceiling
+            self._set(min(ceiling, max(floor, self.level)), "limits changed")
+
+    def _set(self, level, reason):
+        if level == self.level:
+            return
+        logging.info(f"Concurrency {self.level} -> {level} ({reason}, {format_bytes(self.rate)}/s)")
+        self.level = level
+        if self.tracer:
+            self.tracer.counter("concurrency", level)
+        if self.on_change:
+            self.on_change(level)
+
+def run_concurrently(items, start, work, finish, controller, cancel_token, transferred):
+    """
+    Download engine: work(item) runs on up to controller.level worker threads,
+    while start(item) and finish(item, result) run on the calling thread, so
+    bookkeeping needs no locking. transferred() returns the aggregate bytes
+    moved so far and drives the controller. Without a controller items are
+    processed inline, one after the other. The controller's range may change
+    while items run (AimdController.set_limits).
+    Raises SyncCancelled once the token is cancelled; downloads in flight
+    stop within one chunk and keep their partial files.
+    """
+    if controller is None:
+        for item in items:
+            cancel_token.raise_if_cancelled()
+            start(item)
+            finish(item, work(item))
+        return
+
+    pending = iter(items)
+    in_flight = {}
+    exhausted = False
+    with ThreadPoolExecutor(max_workers=max(controller.ceiling, MAX_WORKERS), thread_name_prefix="download") as pool:
+        try:
+            while True:
+                cancel_token.raise_if_cancelled()
+                level = controller.update(transferred())
+                while not exhausted and len(in_flight) < level:
+                    item = next(pending, None)
+                    if item is None:
+                        exhausted = True
+                        break
+                    start(item)
+                    in_flight[pool.submit(work, item)] = item
+                if not in_flight:
+                    return
+
+                done, _ = wait(in_flight, timeout=ENGINE_TICK, return_when=FIRST_COMPLETED)
+                for future in done:
+                    item = in_flight.pop(future)
+                    finish(item, future.result())
+        except BaseException:
+            # Workers see the cancel within one chunk, so the pool shuts down quickly
+            cancel_token.cancel()
+            raise
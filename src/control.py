@@ -0,0 +1,226 @@
+import hmac
+import json
+import time
+import logging
+import threading
+from dataclasses import asdict
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from .progress import ProgressSnapshot, FileProgress
+from .filters import parse_size
+
+# Default port of the control endpoint
+CONTROL_PORT = 8765
+# How often a paused download checks for resume or cancel
+PAUSE_POLL = 0.2
+
+class SyncControl:
+    """
+    Runtime knobs of one sync run: pause/resume, cancel, a bandwidth limit
+    shared by all downloads and the concurrency range. The client consults it
+    per network chunk (throttle) and the download loop before each item
+    (wait_if_paused); sync_account attaches its tracker, cancel token and
+    concurrency controller so status() can describe the run.
+    """
+    def __init__(self, bytes_per_second=None):
+        self.phase = "starting" # listing, downloading, hooks, finished, cancelled, failed
+        self.tracker = None
+        self.cancel_token = None
+        self.controller = None
+        self.bytes_per_second = bytes_per_second or None
+        self._running = threading.Event()
+        self._running.set()
+        self._allowance = 0.0
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def attach(self, tracker, cancel_token, controller=None):
+        self.tracker = tracker
+        self.cancel_token = cancel_token
+        self.controller = controller
+
+    @property
+    def paused(self):
+        return not self._running.is_set()
+
+    def pause(self):
+        if not self.paused:
+            logging.info("Sync paused.")
+        self._running.clear()
+
+    def resume(self):
+        if self.paused:
+            logging.info("Sync resumed.")
+        self._running.set()
+
+    def cancel(self):
+        if self.cancel_token is not None:
+            self.cancel_token.cancel()
+        self._running.set()
+
+    def set_bandwidth(self, bytes_per_second):
+        # Sizes such as "20MB" are accepted as well
+        if isinstance(bytes_per_second, str):
+            bytes_per_second = parse_size(bytes_per_second)
+        if bytes_per_second is not None and bytes_per_second < 0:
+            raise ValueError(f"Invalid bandwidth limit: {bytes_per_second}")
+        with self._lock:
+            self.bytes_per_second = int(bytes_per_second) if bytes_per_second else None
+            self._allowance = 0.0
+            self._last = time.monotonic()
+        logging.info(f"Bandwidth limit set to {self.bytes_per_second or 'unlimited'} bytes/s")
+
+    def set_concurrency(self, maximum=None, minimum=None):
+        if self.controller is None:
+            raise ValueError("concurrency can't be changed before downloads start")
+        self.controller.set_limits(minimum, maximum)
+
+    def wait_if_paused(self, cancel_token=None):
+        cancel_token = cancel_token or self.cancel_token
+        while not self._running.wait(PAUSE_POLL):
+            if cancel_token is not None:
+                cancel_token.raise_if_cancelled()
+        if cancel_token is not None:
+            cancel_token.raise_if_cancelled()
+
+    def throttle(self, nbytes, cancel_token=None):
+        """Accounts for nbytes received; blocks while paused or above the bandwidth limit."""
+        self.wait_if_paused(cancel_token)
+        with self._lock:
+            rate = self.bytes_per_second
+            if not rate:
+                return
+            now = time.monotonic()
+            # Token bucket holding at most one second of burst
+            self._allowance = min(rate, self._allowance + (now - self._last) * rate) - nbytes
+            self._last = now
+            delay = -self._allowance / rate if self._allowance < 0 else 0
+        if delay:
+            cancel_token = cancel_token or self.cancel_token
+            if cancel_token is not None:
+                cancel_token.sleep(delay)
+            else:
+                time.sleep(delay)
+
+    def status(self):
+        state = self.phase
+        if self.cancel_token is not None and self.cancel_token.cancelled and state not in ("finished", "failed"):
+            state = "cancelling"
+        elif self.paused and state not in ("finished", "failed", "cancelled"):
+            state = "paused"
+        status = {"state": state, "bandwidth_limit": self.bytes_per_second}
+        if self.tracker is not None:
+            snapshot = self.tracker.snapshot()
+            status.update(asdict(snapshot))
+            status["queued"] = max(0, snapshot.files_total - snapshot.files_done - len(snapshot.active))
+        if self.controller is not None:
+            status["concurrency"] = self.controller.level
+            status["concurrency_limits"] = {"min": self.controller.floor, "max": self.controller.ceiling}
+        return status
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "gopro-sync-control"
+
+    def log_message(self, format, *args):
+        logging.debug("Control API: " + format % args)
+
+    def _reply(self, code, body):
+        data = json.dumps(body).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _authorized(self):
+        token = self.server.token
+        if not token:
+            return True
+        given = self.headers.get("Authorization", "")
+        return hmac.compare_digest(given.encode(), f"Bearer {token}".encode())
+
+    def do_GET(self):
+        if not self._authorized():
+            return self._reply(401, {"error": "unauthorized"})
+        if self.path.rstrip("/") in ("", "/status"):
+            return self._reply(200, self.server.control.status())
+        self._reply(404, {"error": "not found"})
+
+    def do_POST(self):
+        if not self._authorized():
+            return self._reply(401, {"error": "unauthorized"})
+        control = self.server.control
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            body = json.loads(self.rfile.read(length) or b"{}") if length else {}
+            action = self.path.strip("/")
+            if action == "pause":
+                control.pause()
+            elif action == "resume":
+                control.resume()
+            elif action == "cancel":
+                control.cancel()
+            elif action == "bandwidth":
+                control.set_bandwidth(body.get("bytes_per_second"))
+            elif action == "concurrency":
+                control.set_concurrency(body.get("max"), body.get("min"))
+            else:
+                return self._reply(404, {"error": "not found"})
+        except (ValueError, TypeError) as e:
+            return self._reply(400, {"error": str(e)})
+        self._reply(200, control.status())
+
+class ControlServer:
+    """
+    Local HTTP/JSON endpoint for a SyncControl, served from a background thread:
+      GET  /status       state, transfers, queue, bytes/s, ETA, concurrency
+      POST /pause, /resume, /cancel
+      POST /bandwidth    {"bytes_per_second": N}  (null or 0 lifts the limit)
+      POST /concurrency  {"max": N, "min": M}
+    With a token every request needs "Authorization: Bearer <token>".
+    """
+    def __init__(self, control, host="127.0.0.1", port=CONTROL_PORT, token=None):
+        self.httpd = ThreadingHTTPServer((host, port), _Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.control = control
+        self.httpd.token = token
+        self._thread = None
+
+    @property
+    def address(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="control", daemon=True)
+        self._thread.start()
+        logging.info(f"Control API listening on {self.address}")
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+def fetch_snapshot(url, token=None, timeout=5):
+    """
+    Reads /status of a running sync (e.g. a headless one on a NAS) as a
+    ProgressSnapshot, so progress views can show it like a local run.
+    Returns (snapshot, status dict); the snapshot is None before downloads start.
+    """
+    from urllib.request import Request, urlopen
+    request = Request(url.rstrip("/") + "/status", headers={"Authorization": f"Bearer {token}"} if token else {})
+    with urlopen(request, timeout=timeout) as response:
+        status = json.load(response)
+    if "files_total" not in status:
+        return None, status
+    fields = {name: status.get(name) for name in ProgressSnapshot.__dataclass_fields__}
+    fields["active"] = [FileProgress(**entry) for entry in status.get("active") or []]
+    return ProgressSnapshot(**fields), status
+
+def parse_address(text, default_host="127.0.0.1", default_port=CONTROL_PORT):
+    """'PORT', 'HOST:PORT' or 'HOST' -> (host, port)."""
+    host, _, port = str(text).rpartition(":")
+    if not host and not port.isdigit():
+        return port, default_port
+    return host or default_host, int(port)
@@ -0,0 +1,127 @@
+import os
+import shutil
+import logging
+import threading
+from .state import load_json, update_json
+
+# Linux ioctl that makes a file share another file's extents (btrfs, XFS, ...)
+FICLONE = 0x40049409
+
+# How a duplicate shares the data of the copy already on disk
+LINK_REFLINK = "reflink" # copy-on-write clone: one payload, files stay independent
+LINK_HARDLINK = "hardlink" # same inode: one payload, an edit in place changes both
+LINK_COPY = "copy" # local copy, only saves the download
+
+def dedup_key(item):
+    """
+    Metadata that identifies likely copies of the same footage across media
+    ids: size, capture time and filename. None when any of them is missing.
+    """
+    try:
+        size = int(item.get("file_size") or 0)
+    except (TypeError, ValueError):
+        size = 0
+    when = item.get("captured_at") or item.get("created_at")
+    name = item.get("filename")
+    if not (size and when and name):
+        return None
+    return f"{size}|{when}|{name.lower()}"
+
+def _reflink(src, dst):
+    try:
+        import fcntl
+    except ImportError:
+        raise OSError("reflinks are not supported on this platform")
+    with open(src, 'rb') as s, open(dst, 'wb') as d:
+        fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+
+def link_file(src, dst):
+    """
+    Makes dst a copy of src that stores no new data where the filesystem
+    allows it: a reflink, else a hardlink, else a plain copy. Returns how.
+    """
+    try:
+        _reflink(src, dst)
+        return LINK_REFLINK
+    except OSError:
+        if os.path.exists(dst):
+            os.remove(dst)
+    try:
+        os.link(src, dst)
+        return LINK_HARDLINK
+    except OSError:
+        # Different filesystems or no link support
+        shutil.copyfile(src, dst)
+        return LINK_COPY
+
+class DedupIndex:
+    """
+    Where each payload already is on disk, by dedup_key. Before an item is
+    downloaded, files with the same key are candidates; the client confirms one
+    by comparing its sampled hash with the same ranges of the remote file (see
+    GoProPlus._link_duplicate) and links it instead of downloading.
+    Paths are absolute, so one index may be shared by sibling targets (e.g.
+    two accounts synced side by side); saving merges with what others wrote.
+    """
+    FILENAME = "dedup.json"
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = load_json(path, {}) # key -> [path, ...]
+        self._added = {} # key -> paths recorded since the last save
+        self._lock = threading.Lock()
+
+    def candidates(self, item, exclude=None):
+        """Files on disk that likely hold the same payload as item."""
+        key = dedup_key(item)
+        if key is None:
+            return []
+        size = int(item["file_size"])
+        exclude = os.path.abspath(exclude) if exclude else None
+        with self._lock:
+            paths = list(self.entries.get(key, []))
+        found = []
+        for path in paths:
+            try:
+                if path != exclude and os.path.getsize(path) == size:
+                    found.append(path)
+            except OSError:
+                continue
+        return found
+
+    def record(self, item, path):
+        key = dedup_key(item)
+        if key is None:
+            return
+        path = os.path.abspath(path)
+        with self._lock:
+            paths = self.entries.setdefault(key, [])
+            if path not in paths:
+                paths.append(path)
+                self._added.setdefault(key, []).append(path)
+
+    @property
+    def dirty(self):
+        return bool(self._added)
+
+    def save(self):
+        with self._lock:
+            if not self._added:
+                return
+            added = self._added
+
+            def changes(current):
+                # Merged with what others saved meanwhile; paths that are gone
+                # are dropped, whoever recorded them
+                result = {}
+                for key in set(current) | set(added):
+                    known = current.get(key) or []
+                    paths = known + [p for p in added.get(key, []) if p not in known]
+                    paths = [p for p in paths if os.path.exists(p)]
+                    if paths != known:
+                        result[key] = paths or None
+                return result
+
+            self.entries = update_json(self.path, changes)
+            self._added = {}
+        logging.debug(f"Saved dedup index with {len(self.entries)} payloads")
@@ -0,0 +1,73 @@
+import os
+import json
+import time
+import uuid
+import threading
+
+# Buffered events are written out by a background thread once this many have
+# piled up, and at flush()/close()
+FLUSH_EVERY = 256
+
+class EventLog:
+    """
+    Machine-readable journal of sync runs: one JSON object per line, appended
+    to path across runs. Every event carries the event name, a timestamp and
+    the run id. emit() only appends to an in-memory buffer, which a writer
+    thread drains once it fills up, so the download path never waits for the
+    disk; see report.py for reading it back.
+
+    Events: run_start, listed, item_start, item_end (status, bytes, seconds,
+    method, retries, reason, error) and run_end (per-run totals).
+    """
+    def __init__(self, path, run_id=None):
+        self.path = path
+        self.run_id = run_id or uuid.uuid4().hex[:12]
+        self._buffer = []
+        self._lock = threading.Lock() # guards the buffer; never held while writing
+        self._write_lock = threading.Lock() # keeps batches in order in the file
+        self._full = threading.Event()
+        self._closing = False
+        self._writer = None
+
+    def emit(self, event, **fields):
+        record = {"event": event, "ts": round(time.time(), 3), "run": self.run_id}
+        record.update(fields)
+        with self._lock:
+            self._buffer.append(record)
+            if len(self._buffer) < FLUSH_EVERY:
+                return
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._run, name="events", daemon=True)
+                self._writer.start()
+        self._full.set()
+
+    def _run(self):
+        while True:
+            self._full.wait()
+            self._full.clear()
+            if self._closing:
+                return
+            self.flush()
+
+    def flush(self):
+        with self._write_lock:
+            with self._lock:
+                records, self._buffer = self._buffer, []
+            if not records:
+                return
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                # default=str keeps odd values (exceptions, paths) from losing a whole batch
+                f.write("".join(json.dumps(r, default=str) + "\n" for r in records))
+
+    def close(self):
+        with self._lock:
+            writer, self._writer = self._writer, None
+        if writer is not None:
+            self._closing = True
+            self._full.set()
+            writer.join()
+            self._closing = False
+        self.flush()
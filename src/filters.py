@@ -0,0 +1,154 @@
+import re
+import fnmatch
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+
+# Media types as reported in the "type" field of /media/search
+VIDEO_TYPES = ("Video", "TimeLapseVideo", "BurstVideo", "LoopedVideo", "MultiClipEdit")
+PHOTO_TYPES = ("Photo", "TimeLapse", "Burst", "Continuous")
+# Shorthands accepted wherever types are given
+TYPE_GROUPS = {"videos": VIDEO_TYPES, "photos": PHOTO_TYPES}
+
+SIZE_UNITS = {"": 1, "B": 1, "KB": 1024, "MB": 1024 ** 2, "GB": 1024 ** 3, "TB": 1024 ** 4}
+
+def parse_types(text):
+    """'videos,Photo' -> ['Video', 'TimeLapseVideo', ..., 'Photo']"""
+    types = []
+    for name in str(text).split(","):
+        name = name.strip()
+        if not name:
+            continue
+        for t in TYPE_GROUPS.get(name.lower(), (name,)):
+            if t not in types:
+                types.append(t)
+    return types
+
+def parse_date(text):
+    """
+    An ISO date/datetime ("2024-05-01", "2024-05-01T12:00:00Z") or an age
+    relative to now ("90d", "12h", "2w"). Naive values are taken as UTC.
+    """
+    text = str(text).strip()
+    match = re.fullmatch(r"(\d+)\s*([hdw])", text.lower())
+    if match:
+        amount, unit = int(match.group(1)), match.group(2)
+        delta = {"h": timedelta(hours=amount), "d": timedelta(days=amount), "w": timedelta(weeks=amount)}[unit]
+        return datetime.now(timezone.utc) - delta
+    value = datetime.fromisoformat(text.replace("Z", "+00:00"))
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value
+
+def parse_size(text):
+    """'20GB', '500 MB', '1048576' -> bytes (binary units)."""
+    match = re.fullmatch(r"([\d.]+)\s*([KMGT]?B?)", str(text).strip().upper())
+    if not match:
+        raise ValueError(f"Invalid size: {text}")
+    unit = match.group(2)
+    if unit and not unit.endswith("B"):
+        unit += "B"
+    return int(float(match.group(1)) * SIZE_UNITS[unit])
+
+def item_time(item):
+    """When an item was captured (falling back to upload time), or None."""
+    value = item.get("captured_at") or item.get("created_at")
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+def _format_time(value):
+    return value.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+@dataclass
+class MediaFilter:
+    """
+    Which cloud items to sync. Empty fields don't filter. types are API type
+    names (see parse_types), since/until aware datetimes on the capture time,
+    min_size/max_size bytes, include/exclude fnmatch patterns on the filename
+    (case-insensitive) and cameras substrings of the camera model.
+    """
+    types: list = field(default_factory=list)
+    since: datetime = None
+    until: datetime = None
+    min_size: int = None
+    max_size: int = None
+    include: list = field(default_factory=list)
+    exclude: list = field(default_factory=list)
+    cameras: list = field(default_factory=list)
+
+    def __bool__(self):
+        return bool(self.types or self.since or self.until or self.min_size is not None
+                    or self.max_size is not None or self.include or self.exclude or self.cameras)
+
+    def search_params(self):
+        """
+        The part of the filter /media/search can apply itself. Whatever the
+        API ignores is still caught by matches(), so this only saves traffic.
+        """
+        params = {}
+        if self.types:
+            params["type"] = ",".join(self.types)
+        if self.since or self.until:
+            start = _format_time(self.since) if self.since else ""
+            end = _format_time(self.until) if self.until else ""
+            params["captured_range"] = f"{start},{end}"
+            # Newest first, which lets the listing stop once it is past `since`
+            params["order_by"] = "captured_at"
+        return params
+
+    def matches(self, item):
+        if self.types and item.get("type") not in self.types:
+            return False
+
+        if self.since or self.until:
+            captured = item_time(item)
+            if captured is None:
+                return False
+            if self.since and captured < self.since:
+                return False
+            if self.until and captured > self.until:
+                return False
+
+        if self.min_size is not None or self.max_size is not None:
+            try:
+                size = int(item.get("file_size") or 0)
+            except (TypeError, ValueError):
+                size = 0
+            # Unknown sizes can't be checked, so they are kept
+            if size and self.min_size is not None and size < self.min_size:
+                return False
+            if size and self.max_size is not None and size > self.max_size:
+                return False
+
+        filename = (item.get("filename") or "").lower()
+        if self.include and not any(fnmatch.fnmatch(filename, p.lower()) for p in self.include):
+            return False
+        if any(fnmatch.fnmatch(filename, p.lower()) for p in self.exclude):
+            return False
+
+        if self.cameras:
+            camera = str(item.get("camera_model") or "").lower()
+            if not any(c.lower() in camera for c in self.cameras):
+                return False
+        return True
+
+    def past_range(self, page, previous=None):
+        """
+        True when a newest-first page lies entirely before `since`, so no
+        later page can match. previous is the oldest capture time of the page
+        before; the first page has none, which means the order can't be
+        confirmed yet and the listing goes on. Listings that turn out not to
+        be sorted never end early.
+        """
+        if not self.since or not page or previous is None:
+            return False
+        times = [previous] + [item_time(item) for item in page]
+        if any(t is None for t in times):
+            return False
+        if any(newer < older for older, newer in zip(times[1:], times)):
+            return False
+        return times[1] < self.since
@@ -0,0 +1,112 @@
+import os
+import hashlib
+import logging
+import threading
+from .state import state_path, load_json, update_json
+
+# How files already on disk are trusted
+VERIFY_SIZE = "size" # size equality only
+VERIFY_QUICK = "quick" # size, plus sampled fingerprints re-hashed only when size or mtime changed
+VERIFY_RESCAN = "rescan" # re-hash the samples of every file, e.g. for a periodic scrub
+VERIFY_MODES = (VERIFY_SIZE, VERIFY_QUICK, VERIFY_RESCAN)
+
+# Samples hashed per file: the head, the tail and SAMPLE_BLOCKS evenly spaced blocks in between
+SAMPLE_SIZE = 64 * 1024
+SAMPLE_BLOCKS = 4
+
+def sample_ranges(size):
+    """(offset, length) of every sample hashed for a file of size bytes."""
+    if size <= SAMPLE_SIZE * (SAMPLE_BLOCKS + 2):
+        return [(0, size)]
+    stride = (size - SAMPLE_SIZE) // (SAMPLE_BLOCKS + 1)
+    return [(i * stride, SAMPLE_SIZE) for i in range(SAMPLE_BLOCKS + 1)] + [(size - SAMPLE_SIZE, SAMPLE_SIZE)]
+
+def hash_samples(size, read):
+    # read(offset, length) returns those bytes, from a local file or a remote one
+    digest = hashlib.blake2b(str(size).encode(), digest_size=16)
+    for offset, length in sample_ranges(size):
+        digest.update(read(offset, length))
+    return digest.hexdigest()
+
+def sample_hash(path, size=None):
+    """
+    Fingerprint of a file from fixed-size samples plus its size, so a 4 GB
+    video costs six small reads. Files smaller than the samples combined
+    are hashed in full.
+    """
+    size = os.path.getsize(path) if size is None else size
+    with open(path, 'rb') as f:
+        def read(offset, length):
+            f.seek(offset)
+            return f.read(length)
+        return hash_samples(size, read)
+
+class FingerprintCache:
+    """
+    Sampled fingerprints of synced files, recorded when they are written
+    and persisted in the target folder together with size and mtime. A file
+    whose size and mtime are unchanged is trusted after a single stat; any
+    other file has its samples hashed again and compared, so silent
+    corruption or a truncated file triggers a new download.
+    """
+    FILENAME = "fingerprints.json"
+
+    def __init__(self, target_folder, rescan=False):
+        self.path = state_path(target_folder, self.FILENAME)
+        self.entries = load_json(self.path, {})
+        self.rescan = rescan
+        self._changes = {} # media id -> entry set since the last save
+        self._fresh = set() # ids verified during this run
+        self._lock = threading.Lock()
+
+    @property
+    def dirty(self):
+        return bool(self._changes)
+
+    def verify(self, media_id, path, size):
+        """True when the file at path has the expected size and matches its fingerprint."""
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return False
+        if st.st_size != size:
+            return False
+
+        entry = self.entries.get(str(media_id))
+        known = bool(entry) and entry["path"] == path and entry["size"] == size
+        if known and entry["mtime_ns"] == st.st_mtime_ns and not self.rescan:
+            self._fresh.add(str(media_id))
+            return True
+
+        sample = sample_hash(path, size)
+        if known and entry["sample"] != sample:
+            logging.warning(f"{os.path.basename(path)} does not match its fingerprint, downloading it again")
+            return False
+        # First sight of a file from before fingerprints, or only its mtime changed
+        self._set(media_id, path, st, sample)
+        return True
+
+    def record(self, media_id, path):
+        """Fingerprints a file that was just written."""
+        if str(media_id) in self._fresh and self.entries[str(media_id)]["path"] == path:
+            return
+        try:
+            st = os.stat(path)
+            sample = sample_hash(path, st.st_size)
+        except OSError as e:
+            logging.debug(f"Not fingerprinting {path}: {e}")
+            return
+        self._set(media_id, path, st, sample)
+
+    def _set(self, media_id, path, st, sample):
+        with self._lock:
+            self.entries[str(media_id)] = self._changes[str(media_id)] = {
+                "path": path, "size": st.st_size, "mtime_ns": st.st_mtime_ns, "sample": sample}
+            self._fresh.add(str(media_id))
+
+    def save(self):
+        # Merged with what other nodes sharing the target saved meanwhile
+        with self._lock:
+            if self._changes:
+                self.entries = update_json(self.path, self._changes)
+                self._changes = {}
@@ -3,16 +3,88 @@ import sys
 import time
 import requests
 import logging
-import zipfile
+import threading
+from urllib3.util import make_headers
+from .tiers import TIER_SOURCE, select_variation, variation_tier
+from .retry import RetryPolicy, DownloadError, retry_after_seconds
+from .cancellation import SyncCancelled
+from .storage import LocalStorage
+from .profiling import span
+from .filters import item_time
+from .journal import RESUME, SCRATCH, UNPACK
+from .url_resolver import source_url_from_download
+from .auth_cache import AUTH_BEARER, AUTH_COOKIE, token_expiry
+from .fingerprint import hash_samples, sample_hash
+from .dedup import link_file
+# zipfile and zipstream are imported where they are used, so runs with nothing
+# to extract (and the CLI's startup) never pay for them
 
 # Rate limiting: minimum seconds between API calls
 API_DELAY = 0.5
 
+# Read size used when streaming downloads and zip entries to disk
+CHUNK_SIZE = 8192
+
+# Page sizes tried for the listing, largest first. The API has always accepted
+# 30; the largest one it accepts is kept for the rest of the run
+PAGE_SIZES = (200, 100, 50, 30)
+
+# Fields requested per item when listing. variations carry signed URLs for every
+# proxy and are the bulk of each page, so they are left out and fetched per item
+# (ensure_variations) only for items that get downloaded
+LIST_FIELDS = "id,created_at,captured_at,camera_model,filename,file_extension,file_size,type"
+LIST_FIELDS_FULL = LIST_FIELDS + ",content_title,variations"
+# Names accepted for fields in place of a comma separated list
+LIST_FIELD_SETS = {"minimal": LIST_FIELDS, "full": LIST_FIELDS_FULL}
+
+# Every compression urllib3 can decode here: gzip and deflate, plus br and zstd
+# when brotli or zstandard are installed
+ACCEPT_ENCODING = make_headers(accept_encoding=True)["accept-encoding"]
+
+ALREADY_UNPACKED = "already unpacked"
+
+def _int_or_none(value):
+    try:
+        return int(value) if value else None
+    except (TypeError, ValueError):
+        return None
+
+def _wire_bytes(response):
+    # Bytes as received, before urllib3 decompressed them
+    if response.raw is None:
+        return len(response.content or b"")
+    return response.raw.tell()
+
 class GoProPlus:
     def __init__(self, auth_token):
         self.base = "api.gopro.com"
         self.host = "https://{}".format(self.base)
         self.auth_token = auth_token
+        self.tier_manifest = None # optional TierManifest, records source/proxy per item
+        self.retry_policy = RetryPolicy()
+        self.url_resolver = None # optional UrlResolver, keeps signed direct links fresh
+        self.progress = None # optional ProgressTracker, receives byte counts per media id
+        self.cancel_token = None # optional CancelToken, checked per chunk, page and zip entry
+        self.storage = LocalStorage() # where files are written, e.g. an S3Storage
+        self.tracer = None # optional profiling.Tracer, receives per-phase spans
+        self.local_index = None # optional reconcile.LocalIndex, records where each item is stored
+        self.listing_complete = False # set by get_media_list when every page was read
+        self.journal = None # optional journal.WriteJournal, makes local writes crash safe
+        self.fingerprints = None # optional fingerprint.FingerprintCache, quick content check of local files
+        self.notes = None # optional dict, filled with how each item was handled (method, bytes, retries, ...)
+        self._unpacked = {} # .360 path -> media file unpacked from it
+        self.page_size = None # largest listing page size the API accepted
+        self.listing_stats = {} # requests, wire bytes and page size of the last listing
+        self.auth_cache = None # optional auth_cache.AuthCache, skips validating a recently validated token
+        self.auth_method = None # AUTH_BEARER or AUTH_COOKIE, whichever validated the token
+        self.token_rejected = False # set when the API refused the token mid-run and it no longer validates
+        self._revalidated = False
+        self._auth_lock = threading.Lock()
+        self.dedup = None # optional dedup.DedupIndex, links copies of footage already on disk instead of downloading
+        self.control = None # optional control.SyncControl, pauses and rate limits transfers per chunk
+        self._api_next = 0.0 # earliest start of the next paced per-item API call
+        self._api_hold = 0.0 # no paced call starts before this, after a 429
+        self._pace_lock = threading.Lock()
         self.user_id = None # derived or optional, strictly speaking auth_token is often enough but cookies might need it.
         # However, the previous code used `gp_access_token` cookie.
         # I will fetch user info to get the user_id if needed or just use the token.
@@ -25,6 +97,34 @@ class GoProPlus:
         }
 
     def validate(self):
+        # A validation cached by an earlier run (see auth_cache.py) is trusted
+        # without asking the API; a 401 later in the run validates again
+        cache = self.auth_cache
+        entry = cache.get(self.auth_token) if cache is not None else None
+        if entry and entry.get("page_size") and not self.page_size:
+            self.page_size = entry["page_size"]
+        if cache is not None and cache.fresh(self.auth_token):
+            self.user_id, self.auth_method = entry.get("user_id"), entry.get("method")
+            logging.debug(f"Token validated {int(time.time() - entry['validated_at'])}s ago, not checking it again")
+            return True
+
+        # The style that worked last time goes first
+        methods = [(AUTH_BEARER, self._validate_me), (AUTH_COOKIE, self._validate_legacy)]
+        if entry and entry.get("method") == AUTH_COOKIE:
+            methods.reverse()
+        for method, check in methods:
+            if check():
+                self.auth_method = method
+                if cache is not None:
+                    cache.update(self.auth_token, user_id=self.user_id, method=method, validated_at=time.time(),
+                                 expires_at=token_expiry(self.auth_token))
+                return True
+        logging.error("Validation failed.")
+        if cache is not None:
+            cache.forget(self.auth_token)
+        return False
+
+    def _validate_me(self):
         # We can also get self.user_id here if we call a user endpoint
         url = f"{self.host}/me"
         # The previous code used /media/user with cookies.
@@ -39,55 +139,115 @@ class GoProPlus:
                 return True
         except Exception as e:
             logging.debug(f"Validation via /me failed: {e}")
+        return False
 
+    def _validate_legacy(self):
         # Fallback to the method from the referenced repo
         # It used cookies: gp_access_token=<token>
         # And endpoint /media/user
-        return self._validate_legacy()
-
-    def _validate_legacy(self):
         url = f"{self.host}/media/user"
         cookies = {"gp_access_token": self.auth_token}
         resp = requests.get(url, headers=self._headers(), cookies=cookies)
         if resp.status_code == 200:
             return True
-        logging.error(f"Validation failed. Status: {resp.status_code}, Body: {resp.text}")
+        logging.debug(f"Validation via /media/user failed. Status: {resp.status_code}, Body: {resp.text}")
         return False
 
-    def get_media_list(self, pages=sys.maxsize, per_page=30):
+    def _api_get(self, url, **kwargs):
+        # GET against the API. The first 401 of a run validates the token again
+        # (a cached validation may be stale) and repeats the request if it still is valid
+        resp = requests.get(url, **kwargs)
+        if resp.status_code != 401:
+            return resp
+        with self._auth_lock:
+            if self._revalidated:
+                return resp
+            self._revalidated = True
+            logging.info("Token was refused, validating it again...")
+            if self.auth_cache is not None:
+                self.auth_cache.forget(self.auth_token)
+            if not self.validate():
+                self.token_rejected = True
+                return resp
+        return requests.get(url, **kwargs)
+
+    def save_session(self):
+        # Lets the next run start with what this one learned (listing page size)
+        if self.auth_cache is not None and self.page_size and not self.token_rejected:
+            self.auth_cache.update(self.auth_token, page_size=self.page_size)
+
+    def get_media_list(self, pages=sys.maxsize, per_page=None, media_filter=None, fields=LIST_FIELDS):
+        # media_filter (a filters.MediaFilter) is sent along as search parameters
+        # where the API supports them, and applied to each page as it arrives.
+        # Without per_page the first page probes PAGE_SIZES, stepping down
+        # whenever the API refuses a size. fields is a comma separated list or
+        # a name from LIST_FIELD_SETS.
         url = f"{self.host}/media/search"
         media_items = []
         current_page = 1
+        oldest = None
+        self.listing_complete = False
+        sizes = [per_page] if per_page else [size for size in PAGE_SIZES if not self.page_size or size <= self.page_size]
+        stats = self.listing_stats = {"requests": 0, "bytes": 0, "per_page": None}
+        headers = dict(self._headers(), **{"Accept-Encoding": ACCEPT_ENCODING})
         
         while True:
+            self._check_cancelled()
             params = {
-                "per_page": per_page,
+                "per_page": sizes[0],
                 "page": current_page,
-                "fields": "id,created_at,content_title,filename,file_extension,file_size,variations,type", 
-                # Request variations to see if we have direct links
+                "fields": LIST_FIELD_SETS.get(fields, fields),
             }
+            if media_filter:
+                params.update(media_filter.search_params())
             
             # Using cookies as the reference implementation did, just to be safe
             cookies = {"gp_access_token": self.auth_token}
             
-            resp = requests.get(url, params=params, headers=self._headers(), cookies=cookies)
+            with span(self.tracer, "list_page", page=current_page, per_page=sizes[0]):
+                resp = self._api_get(url, params=params, headers=headers, cookies=cookies)
+            stats["requests"] += 1
+            stats["bytes"] += _wire_bytes(resp)
+
+            if resp.status_code in (400, 422) and current_page == 1 and len(sizes) > 1:
+                logging.debug(f"Page size {sizes[0]} refused ({resp.status_code}), trying {sizes[1]}")
+                sizes.pop(0)
+                continue
             
             if resp.status_code != 200:
                 logging.error(f"Failed to get media list: {resp.status_code} - {resp.text}")
                 break
                 
             data = resp.json()
+            if current_page == 1:
+                # The API may also cap a size silently; its paging then follows its own size
+                reported = _int_or_none(data.get("_pages", {}).get("per_page"))
+                self.page_size = stats["per_page"] = min(sizes[0], reported) if reported else sizes[0]
             embedded = data.get("_embedded", {})
             page_media = embedded.get("media", [])
             
             if not page_media:
+                self.listing_complete = True
                 break
                 
-            media_items.extend(page_media)
-            logging.info(f"Fetched page {current_page}, found {len(page_media)} items.")
+            if media_filter:
+                matching = [item for item in page_media if media_filter.matches(item)]
+                media_items.extend(matching)
+                logging.info(f"Fetched page {current_page}, found {len(page_media)} items, {len(matching)} match the filter.")
+                if media_filter.past_range(page_media, oldest):
+                    logging.info("The rest of the listing was captured before the filter's start date, stopping.")
+                    break
+                oldest = item_time(page_media[-1])
+            else:
+                media_items.extend(page_media)
+                logging.info(f"Fetched page {current_page}, found {len(page_media)} items.")
             
             # Rate limiting: delay between API calls
-            time.sleep(API_DELAY)
+            with span(self.tracer, "rate_limit_sleep"):
+                if self.cancel_token:
+                    self.cancel_token.sleep(API_DELAY)
+                else:
+                    time.sleep(API_DELAY)
             
             current_page += 1
             if current_page > pages:
@@ -97,35 +257,88 @@ class GoProPlus:
             # The reference code checked _pages.total_pages
             total_pages = data.get("_pages", {}).get("total_pages", 0)
             if current_page > total_pages:
+                # Every item of the account was seen (filters aside)
+                self.listing_complete = True
                 break
 
+        logging.debug(f"Listing took {stats['requests']} requests, {stats['bytes']} bytes at {stats['per_page']} per page")
         return media_items
 
-    def get_download_url(self, media_item):
-        # Try to find a direct high-res download URL
-        # 'variations' usually contains different qualities.
-        # We want 'source' or highest quality.
-        variations = media_item.get("variations", [])
-        
-        # Sort or find the best one.
-        # Often 'source' is the type.
-        for v in variations:
-            if v.get("type") == "source" or v.get("label") == "source":
-                 return v.get("url")
-        
-        # Fallback: check other variations
-        # If no source, take the 'high_res' or similar?
-        # Let's inspect variations structure in future if needed.
-        # For now, if no variations, we might rely on ids.
-        
-        if variations:
-             # Return the first one if source not found??
-             # Better safe than sorry, maybe return None and fall back to zip/source
-             pass
-             
-        return None
+    def get_download_url(self, media_item, quality=TIER_SOURCE):
+        # Try to find a direct download URL in 'variations'.
+        # The default "source" quality only accepts the original file; anything
+        # else selects a lower-resolution proxy (see tiers.select_variation).
+        # Without a match we return None and fall back to zip/source.
+        variation = select_variation(media_item.get("variations", []), quality)
+        return variation.get("url") if variation else None
 
-    def download_file(self, media_id, target_path, max_retries=3):
+    def ensure_variations(self, item):
+        """
+        Fills in item["variations"] from /media/{id}/download when the listing
+        left them out (see LIST_FIELDS). The source file is added as a "source"
+        variation, so get_download_url finds it. Returns the variations.
+        """
+        if "variations" not in item:
+            try:
+                data = self.get_media_download(item["id"])
+            except (DownloadError, requests.RequestException, ValueError) as e:
+                # Without variations the item still downloads through zip/source
+                logging.debug(f"Could not fetch variations for {item['id']}: {e}")
+                data = {}
+            embedded = data.get("_embedded") if isinstance(data, dict) else None
+            variations = list((embedded or {}).get("variations") or [])
+            source = source_url_from_download(data)
+            if source and not select_variation(variations, TIER_SOURCE):
+                variations.append({"type": TIER_SOURCE, "url": source})
+            item["variations"] = variations
+        return item["variations"]
+
+    def _pace(self):
+        # Starts per-item API calls at least API_DELAY apart, whichever thread
+        # (URL resolver, download workers) makes them
+        while True:
+            with self._pace_lock:
+                now = time.monotonic()
+                start = max(now, self._api_next)
+                self._api_next = start + API_DELAY
+            if start > now:
+                if self.cancel_token:
+                    self.cancel_token.sleep(start - now)
+                else:
+                    time.sleep(start - now)
+            with self._pace_lock:
+                if self._api_hold <= time.monotonic():
+                    return
+            # Rate limited while this call waited its turn: queue up behind the hold
+
+    def _hold_off(self, seconds):
+        # A 429 delays every paced call, not just the one that got it
+        with self._pace_lock:
+            self._api_hold = max(self._api_hold, time.monotonic() + seconds)
+            self._api_next = max(self._api_next, self._api_hold)
+
+    def get_media_download(self, media_id):
+        # Per-media download info, with signed URLs for the files and variations.
+        # Paced like the listing; a 429 backs off (Retry-After if given) and asks again
+        url = f"{self.host}/media/{media_id}/download"
+        cookies = {"gp_access_token": self.auth_token}
+        for attempt in range(max(1, self.retry_policy.max_attempts)):
+            self._pace()
+            with span(self.tracer, "resolve_url", media_id=media_id):
+                resp = self._api_get(url, headers=self._headers(), cookies=cookies, timeout=30)
+            if resp.status_code != 429:
+                break
+            retry_after = retry_after_seconds(resp.headers.get('Retry-After'))
+            delay = min(self.retry_policy.max_delay, retry_after) if retry_after else self.retry_policy.backoff(attempt + 1)
+            logging.debug(f"Download info for {media_id} was rate limited, holding off {delay:.1f}s")
+            self._hold_off(delay)
+        if resp.status_code != 200:
+            raise DownloadError(f"Resolving download URL failed: {resp.status_code}", resp.status_code,
+                                retry_after_seconds(resp.headers.get('Retry-After')))
+        return resp.json()
+
+    def download_file(self, media_id, target_path, max_retries=None):
+        import zipfile
         # Fallback method using the zip/source endpoint which seems reliable
         url = f"{self.host}/media/x/zip/source"
         params = {
@@ -133,167 +346,609 @@ class GoProPlus:
             "access_token": self.auth_token
         }
         cookies = {"gp_access_token": self.auth_token}
+        if not self.storage.is_local:
+            # Object stores can't hold a resumable partial zip, so unpack on the fly
+            def attempt_streamed(n):
+                if n: self._note_add(media_id, "retries", 1)
+                logging.info(f"Downloading {media_id} to {target_path} (streamed zip mode, attempt {n + 1})...")
+                self._stream_zip(url, target_path, media_id, params=params, headers=self._headers(), cookies=cookies)
+            return self.retry_policy.run(attempt_streamed, f"download of {media_id}", max_retries, self.cancel_token)
+
+        # Save to temporary file first; it is kept on cancel so the next run can resume
+        temp_file = target_path + ".temp"
+        self._stage(temp_file, RESUME, media_id)
+
+        def attempt(n):
+            if n: self._note_add(media_id, "retries", 1)
+            logging.info(f"Downloading {media_id} to {target_path} (zip mode, attempt {n + 1})...")
+            headers = self._stream_to(url, temp_file, media_id, params=params, headers=self._headers(), cookies=cookies)
+
+            # Check content type to determine if it's a ZIP or direct file
+            content_type = headers.get('Content-Type', '')
+            if content_type:
+                is_zip = 'zip' in content_type or 'application/zip' in content_type
+            else:
+                # Nothing was transferred (the partial file was complete), so look at it
+                is_zip = zipfile.is_zipfile(temp_file)
+
+            self._finish_download(temp_file, target_path, is_zip)
+
+        return self.retry_policy.run(attempt, f"download of {media_id}", max_retries, self.cancel_token)
+
+    def _stage(self, path, kind, media_id=None):
+        if self.journal is not None:
+            self.journal.stage(path, kind, media_id)
+
+    def _unstage(self, path):
+        if self.journal is not None:
+            self.journal.unstage(path)
+
+    def _note(self, media_id, **fields):
+        if self.notes is not None:
+            self.notes.setdefault(str(media_id), {}).update(fields)
+
+    def _note_add(self, media_id, key, amount):
+        if self.notes is not None:
+            notes = self.notes.setdefault(str(media_id), {})
+            notes[key] = notes.get(key, 0) + amount
+
+    def pop_notes(self, media_id):
+        """How the item was handled, as noted while handling it (empty when notes are off)."""
+        return self.notes.pop(str(media_id), {}) if self.notes is not None else {}
+
+    def _check_cancelled(self):
+        if self.cancel_token:
+            self.cancel_token.raise_if_cancelled()
+
+    def _stream_to(self, url, path, media_id, headers=None, **kwargs):
+        """
+        Streams url into path. A partial file left behind by an interrupted
+        attempt or a cancelled run is resumed with a Range request; servers
+        that ignore the range simply restart it. Raises DownloadError for
+        HTTP errors and returns the response headers.
+        """
+        storage = self.storage
+        offset = storage.getsize(path) if storage.supports_append and storage.exists(path) else 0
+        headers = dict(headers or {})
+        if offset:
+            headers["Range"] = f"bytes={offset}-"
+
+        # Connect covers DNS, TLS and waiting for the response headers
+        with span(self.tracer, "connect", media_id=media_id):
+            r = requests.get(url, headers=headers, stream=True, timeout=30, **kwargs)
+        with r:
+            if r.status_code == 416 and offset:
+                # Range starts at the end: the partial file is already complete
+                logging.info(f"{os.path.basename(path)} was already fully downloaded")
+                return {}
+            if r.status_code not in (200, 206):
+                raise DownloadError(f"HTTP {r.status_code}", r.status_code, retry_after_seconds(r.headers.get('Retry-After')))
+
+            resumed = r.status_code == 206 and offset and str(r.headers.get('Content-Range', '')).startswith(f"bytes {offset}-")
+            if offset and resumed:
+                logging.info(f"Resuming {os.path.basename(path)} at byte {offset}")
+            self._write_stream(r, path, media_id, offset if resumed else 0)
+            return r.headers
+
+    def _write_stream(self, response, path, media_id, offset=0):
+        if self.progress:
+            self.progress.restart_file(media_id)
+            if offset:
+                self.progress.advance(media_id, offset, transferred=False)
+        reader = _ResponseReader(self, response, media_id)
+        with span(self.tracer, "transfer", media_id=media_id, offset=offset) as s:
+            if not self.storage.is_local and path.lower().endswith('.360'):
+                # No local copy to unpack later, so unpack while it arrives
+                self._store_360(reader, path)
+            else:
+                s.args.update(self._write_file(reader, path, append=bool(offset)))
+
+    def _write_file(self, src, path, append=False):
+        # Chunked copy from any readable object into storage, checking for cancel per chunk.
+        # Returns byte and write time counts for profiling spans.
+        written = 0
+        write_ns = 0
+        with self.storage.open_write(path, append=append) as dst:
+            while True:
+                self._check_cancelled()
+                chunk = src.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                started = time.perf_counter_ns()
+                dst.write(chunk)
+                write_ns += time.perf_counter_ns() - started
+                written += len(chunk)
+        return {"bytes": written, "write_ms": write_ns / 1e6}
+
+    def _copy_to(self, src, dest_path):
+        # Staged so a cancelled copy never looks like a complete file
+        partial = self.storage.staging_path(dest_path, ".extract")
+        if partial != dest_path:
+            self._stage(partial, SCRATCH)
+        try:
+            self._write_file(src, partial)
+            if partial != dest_path:
+                self._replace(partial, dest_path)
+        finally:
+            if partial != dest_path and self.storage.exists(partial):
+                self.storage.remove(partial)
+                self._unstage(partial)
+
+    def _extract_entry(self, z, name, dest_path):
+        # Chunked copy instead of ZipFile.extract, so a cancel stops mid-entry
+        with span(self.tracer, "extract", entry=name), z.open(name) as src:
+            self._copy_to(src, dest_path)
+
+    def _store(self, src, dest_path):
+        # A streamed entry that is itself a .360 archive is unpacked as well
+        with span(self.tracer, "extract", entry=os.path.basename(dest_path)):
+            if not self.storage.is_local and dest_path.lower().endswith('.360'):
+                self._store_360(src, dest_path)
+            else:
+                self._copy_to(src, dest_path)
+
+    def _replace(self, src, dst):
+        with span(self.tracer, "rename"):
+            if self.journal is not None:
+                # Data made durable before the rename, so a power loss never leaves a torn file
+                self.journal.commit(src, dst)
+            else:
+                self.storage.replace(src, dst)
+
+    def _stream_zip(self, url, target_path, media_id, headers=None, **kwargs):
+        """
+        zip/source download for storage without local files: the first media
+        entry is unpacked from the response as it arrives and written straight
+        to target_path. Responses that are not a ZIP are stored as they are.
+        """
+        from .zipstream import ZipStream
+        with span(self.tracer, "connect", media_id=media_id):
+            r = requests.get(url, headers=headers, stream=True, timeout=30, **kwargs)
+        with r, span(self.tracer, "transfer", media_id=media_id, streamed_zip=True):
+            if r.status_code != 200:
+                raise DownloadError(f"HTTP {r.status_code}", r.status_code, retry_after_seconds(r.headers.get('Retry-After')))
+            if self.progress:
+                self.progress.restart_file(media_id)
+
+            stream = ZipStream(_ResponseReader(self, r, media_id))
+            if not stream.is_zip():
+                self._store(stream.source, target_path)
+                return
+            for entry in stream:
+                if entry.name.startswith('__') or entry.name.startswith('.') or '/' in entry.name:
+                    continue
+                self._store(entry, target_path)
+                return
+            raise DownloadError("ZIP contained no media files")
 
-        for attempt in range(max_retries):
+    def _store_360(self, src, file_path):
+        """
+        Streaming counterpart of _handle_360_file: unpacks a .360 archive as it
+        is read, naming the first media file after the .360.
+        """
+        from .zipstream import ZipStream
+        stream = ZipStream(src)
+        if not stream.is_zip():
+            logging.warning(f"{os.path.basename(file_path)} is not a ZIP, storing it as is")
+            self._copy_to(stream.source, file_path)
+            return
+        target_dir = os.path.dirname(file_path)
+        renamed = False
+        for entry in stream:
+            dest = self._safe_extract_path(target_dir, entry.name)
+            if dest is None:
+                continue
+            if not renamed and not entry.name.startswith('__') and not entry.name.startswith('.'):
+                dest = os.path.splitext(file_path)[0] + os.path.splitext(entry.name)[1]
+                self._unpacked[file_path] = dest
+                renamed = True
+            self._copy_to(entry, dest)
+        logging.info(f"Extracted {os.path.basename(file_path)} while streaming")
+
+    def _finish_download(self, temp_file, target_path, is_zip):
+        import zipfile
+        if is_zip:
+            # Handle ZIP format (for videos)
             try:
-                logging.info(f"Downloading {media_id} to {target_path} (zip mode, attempt {attempt + 1}/{max_retries})...")
+                with zipfile.ZipFile(temp_file, 'r') as z:
+                    names = z.namelist()
+                    # Filter for likely media files (ignore __MACOSX, hidden files)
+                    media_files = [n for n in names if not n.startswith('__') and not n.startswith('.') and '/' not in n]
+
+                    if not media_files:
+                        raise DownloadError("ZIP contained no media files")
+
+                    # Extract only the first valid media file, straight to our target path
+                    self._extract_entry(z, media_files[0], target_path)
+                os.remove(temp_file)
+                self._unstage(temp_file)
+                return
+            except zipfile.BadZipFile:
+                logging.warning("File was not a valid ZIP, treating as direct download")
+                # Fall through to direct file handling
+            except SyncCancelled:
+                # The downloaded zip stays, the next run only has to extract it
+                raise
+            except Exception:
+                if os.path.exists(temp_file):
+                    os.remove(temp_file)
+                self._unstage(temp_file)
+                raise
+
+        # Handle direct file download (for photos), or a ZIP that was really the media
+        self._replace(temp_file, target_path)
+
+    def download_batch(self, batch):
+        """
+        Download several small items with a single multi-id zip/source request.
+        batch is a list of (item, target_path) tuples. Each zip entry is streamed
+        straight to the target path of the item with the matching filename.
+        Returns the set of media ids that were written; the caller should fetch
+        anything else individually.
+        """
+        import zipfile
+        from .zipstream import ZipStream
+        if not batch:
+            return set()
 
-                with requests.get(url, params=params, headers=self._headers(), cookies=cookies, stream=True, timeout=30) as r:
-                    if r.status_code != 200:
-                        logging.error(f"Download failed for {media_id}: {r.status_code}")
-                        if attempt < max_retries - 1:
-                            logging.info(f"Retrying download for {media_id}...")
-                            continue
-                        return False
-
-                    # Check content type to determine if it's a ZIP or direct file
-                    content_type = r.headers.get('Content-Type', '')
-                    is_zip = 'zip' in content_type or 'application/zip' in content_type
-
-                    # Save to temporary file first
-                    temp_file = target_path + ".temp"
-                    with open(temp_file, 'wb') as f:
-                        for chunk in r.iter_content(chunk_size=8192):
-                            f.write(chunk)
-
-                    if is_zip:
-                        # Handle ZIP format (for videos)
-                        try:
-                            with zipfile.ZipFile(temp_file, 'r') as z:
-                                names = z.namelist()
-                                # Filter for likely media files (ignore __MACOSX, hidden files)
-                                media_files = [n for n in names if not n.startswith('__') and not n.startswith('.') and '/' not in n]
-
-                                if media_files:
-                                    # Extract only the first valid media file
-                                    extracted_name = media_files[0]
-                                    target_dir = os.path.dirname(target_path)
-                                    z.extract(extracted_name, target_dir)
-
-                                    extracted_full_path = os.path.join(target_dir, extracted_name)
-
-                                    # Rename if the extracted filename doesn't match our target specific path
-                                    if extracted_full_path != target_path:
-                                        if os.path.exists(target_path):
-                                            os.remove(target_path)
-                                        os.rename(extracted_full_path, target_path)
-                                    return True
-
-                        except zipfile.BadZipFile:
-                            logging.warning("File was not a valid ZIP, treating as direct download")
-                            # Fall through to direct file handling
-                            pass
-                        finally:
-                            if os.path.exists(temp_file):
-                                os.remove(temp_file)
-                    else:
-                        # Handle direct file download (for photos)
-                        if os.path.exists(target_path):
-                            os.remove(target_path)
-                        os.rename(temp_file, target_path)
-                        return True
-
-                    # If we get here, ZIP extraction failed but we have the temp file
-                    # Try to use it as a direct file (might be the actual media)
-                    if os.path.exists(temp_file):
-                        if os.path.exists(target_path):
-                            os.remove(target_path)
-                        os.rename(temp_file, target_path)
-                        return True
-
-                # Success - return True
-                return True
+        url = f"{self.host}/media/x/zip/source"
+        params = {
+            "ids": ",".join(str(item["id"]) for item, _ in batch),
+            "access_token": self.auth_token
+        }
+        cookies = {"gp_access_token": self.auth_token}
 
-            except (requests.exceptions.RequestException, OSError) as e:
-                logging.warning(f"Download attempt {attempt + 1} failed for {media_id}: {e}")
-                if attempt < max_retries - 1:
-                    logging.info(f"Retrying download for {media_id}...")
-                    continue
+        # Zip entries are named after the original filenames, so match on those
+        by_name = {}
+        for item, target_path in batch:
+            by_name.setdefault(os.path.basename(target_path).lower(), []).append((item, target_path))
+
+        target_dir = os.path.dirname(batch[0][1])
+        temp_zip = os.path.join(target_dir, f".batch-{batch[0][0]['id']}.zip.temp")
+        if self.storage.is_local:
+            self._stage(temp_zip, SCRATCH)
+        written = set()
+
+        def target_for(name):
+            base = os.path.basename(name)
+            if not base or base.startswith('.') or name.startswith('__'):
+                return None
+            candidates = by_name.get(base.lower())
+            if not candidates:
+                logging.debug(f"Ignoring unexpected zip entry {name}")
+                return None
+            return candidates.pop(0)
+
+        logging.info(f"Downloading batch of {len(batch)} items (zip mode)...")
+        try:
+            with requests.get(url, params=params, headers=self._headers(), cookies=cookies, stream=True, timeout=30) as r:
+                if r.status_code != 200:
+                    logging.error(f"Batch download failed: {r.status_code}")
+                    return written
+
+                # Progress of a batch is reported under its first item's id
+                if self.storage.is_local:
+                    self._write_stream(r, temp_zip, batch[0][0]["id"])
                 else:
-                    logging.error(f"All download attempts failed for {media_id}")
-                    return False
-
-        return False
+                    # Unpacked while it arrives, nothing is staged
+                    if self.progress:
+                        self.progress.restart_file(batch[0][0]["id"])
+                    for entry in ZipStream(_ResponseReader(self, r, batch[0][0]["id"])):
+                        match = target_for(entry.name)
+                        if match:
+                            self._store(entry, match[1])
+                            self._batched(*match)
+                            written.add(match[0]["id"])
+
+            if self.storage.is_local:
+                with zipfile.ZipFile(temp_zip, 'r') as z:
+                    for name in z.namelist():
+                        match = target_for(name)
+                        if not match:
+                            continue
 
-    def download_media_item(self, item, target_dir):
-        # Wrapper that handles filename and checks
+                        item, target_path = match
+                        self._extract_entry(z, name, target_path)
+
+                        if target_path.endswith('.360'):
+                            self._handle_360_file(target_path)
+                        self._batched(item, target_path)
+                        written.add(item["id"])
+
+        except zipfile.BadZipFile:
+            logging.warning("Batch response was not a valid ZIP")
+        except (requests.exceptions.RequestException, OSError) as e:
+            logging.warning(f"Batch download failed: {e}")
+        finally:
+            if self.storage.is_local and os.path.exists(temp_zip):
+                os.remove(temp_zip)
+            self._unstage(temp_zip)
+
+        missing = len(batch) - len(written)
+        if missing:
+            logging.info(f"{missing} items of the batch were not delivered, they will be fetched individually")
+        return written
+
+    def get_target_path(self, item, target_dir):
         filename = item.get("filename")
         if not filename:
              # construct from id + extension
              ext = item.get("file_extension", "mp4")
              filename = f"{item['id']}.{ext}"
-
-        final_path = os.path.join(target_dir, filename)
-
-        if os.path.exists(final_path):
+        return os.path.join(target_dir, filename)
+
+    def is_synced(self, item, final_path):
+        if self.fingerprints is not None and self.storage.is_local:
+            # One stat for files unchanged since they were fingerprinted, sampled hashes otherwise
+            remote_size = _int_or_none(item.get("file_size"))
+            return bool(remote_size) and self.fingerprints.verify(item["id"], final_path, remote_size)
+        if self.storage.exists(final_path):
             # Check integrity? Size?
             remote_size = item.get("file_size")
             if remote_size:
-                local_size = os.path.getsize(final_path)
+                local_size = self.storage.getsize(final_path)
                 if local_size == int(remote_size):
-                    logging.info(f"Skipping {filename}, exists and size matches")
-                    return "skipped"
+                    return True
+        return False
+
+    def _download_direct(self, url, final_path, media_id=None, part_suffix=".part", expected_size=None):
+        # Written to a .part file that survives cancels and crashes for resuming
+        part_path = self.storage.staging_path(final_path, part_suffix)
+        if part_path != final_path:
+            self._stage(part_path, RESUME, media_id)
+
+        def attempt(n):
+            if n: self._note_add(media_id, "retries", 1)
+            self._stream_to(url, part_path, media_id)
+            if expected_size and self.storage.supports_append and self.storage.getsize(part_path) < expected_size:
+                # A stream that ended early is resumed by the next attempt instead of being kept
+                raise ConnectionError(f"{os.path.basename(final_path)} ended at {self.storage.getsize(part_path)} "
+                                      f"of {expected_size} bytes")
+            if part_path != final_path:
+                self._replace(part_path, final_path)
+
+        # A fatal answer (e.g. 403 on an expired link) gives up at once so the
+        # caller can fall back to zip/source
+        return self.retry_policy.run(attempt, f"direct download of {os.path.basename(final_path)}",
+                                     cancel_token=self.cancel_token)
+
+    def download_media_item(self, item, target_dir, quality=TIER_SOURCE):
+        # Wrapper that handles filename and checks
+        final_path = self.get_target_path(item, target_dir)
+        filename = os.path.basename(final_path)
+        tiers = self.tier_manifest
+        current_tier = tiers.get(item["id"]) if tiers else None
+
+        if filename.endswith('.360') and self.storage.is_local and not current_tier and self.is_synced(item, final_path):
+            # Downloaded earlier but not unpacked yet, e.g. the run was cancelled
+            if self._handle_360_file(final_path):
+                self._note(item["id"], method="unpack")
+                self._indexed(item, final_path)
+                return "downloaded"
+
+        reason = self._present(item, final_path, quality, current_tier)
+        if reason:
+            logging.info(f"Skipping {filename}, {reason}")
+            self._note(item["id"], reason=reason)
+            if reason != ALREADY_UNPACKED:
+                self._indexed(item, final_path)
+            return "skipped"
+
+        if quality != TIER_SOURCE or not self.url_resolver:
+            # The resolver looks source links up itself
+            self.ensure_variations(item)
+
+        # Partial files that must not outlive the item once it is stored some other way
+        partials = [".part"]
+
+        if self.dedup is not None and quality == TIER_SOURCE and self.storage.is_local:
+            if self._link_duplicate(item, final_path):
+                if tiers: tiers.set(item["id"], TIER_SOURCE, final_path)
+                self._indexed(item, final_path)
+                self._drop_partials(final_path, partials)
+                return "downloaded"
+
+        if quality != TIER_SOURCE:
+            variation = select_variation(item.get("variations", []), quality)
+            if variation:
+                tier = variation_tier(variation)
+                logging.info(f"Downloading {filename} as {tier} proxy...")
+                # Proxies get their own partial file so a source run never resumes one
+                self._note(item["id"], method="proxy", tier=tier)
+                if self._download_direct(variation["url"], final_path, item["id"], f".{tier}.part"):
+                    if tiers: tiers.set(item["id"], tier, final_path)
+                    self._indexed(item, final_path)
+                    self._drop_partials(final_path, partials)
+                    return "downloaded"
+                partials.append(f".{tier}.part")
+            else:
+                logging.info(f"No {quality} variation for {filename}, fetching source instead")
 
         # Try direct link first (optimization)
-        direct_url = self.get_download_url(item)
+        if self.url_resolver:
+            direct_url = self.url_resolver.get(item)
+        else:
+            direct_url = self.get_download_url(item)
         if direct_url:
             logging.info(f"Downloading {filename} via direct link...")
-            try:
-                with requests.get(direct_url, stream=True, timeout=30) as r:
-                    r.raise_for_status()
-                    with open(final_path, 'wb') as f:
-                        for chunk in r.iter_content(chunk_size=8192):
-                            f.write(chunk)
+            self._note(item["id"], method="direct")
+            if self._download_direct(direct_url, final_path, item["id"], expected_size=_int_or_none(item.get("file_size"))):
+                if tiers: tiers.set(item["id"], TIER_SOURCE, final_path)
+                self._indexed(item, final_path)
+                self._drop_partials(final_path, partials[1:])
                 return "downloaded"
-            except Exception as e:
-                logging.warning(f"Direct download failed: {e}. Falling back to zip method.")
+            if self.url_resolver:
+                self.url_resolver.invalidate(item["id"])
+            logging.warning("Falling back to zip method.")
 
         # Fallback to zip method
+        self._note(item["id"], method="zip" if self.storage.is_local else "zip-stream")
         if self.download_file(item["id"], final_path):
-            # Handle .360 files that are actually ZIP files
-            if filename.endswith('.360'):
+            # Handle .360 files that are actually ZIP files (streamed downloads unpack them on the way)
+            if filename.endswith('.360') and self.storage.is_local:
                 self._handle_360_file(final_path)
+                self._note(item["id"], method="zip-360")
+            if tiers: tiers.set(item["id"], TIER_SOURCE, final_path)
+            self._indexed(item, final_path)
+            self._drop_partials(final_path, partials)
             return "downloaded"
 
         return "failed"
 
+    def _drop_partials(self, final_path, suffixes):
+        # A partial file of a direct download that another method finished would
+        # otherwise stay on disk and be reported as resumable on every later run
+        for suffix in suffixes:
+            part_path = self.storage.staging_path(final_path, suffix)
+            if part_path == final_path:
+                continue
+            if self.storage.exists(part_path):
+                self.storage.remove(part_path)
+            self._unstage(part_path)
+
+    def _present(self, item, final_path, quality, current_tier):
+        # Why the item needs no download (for the log), or None
+        if current_tier:
+            # A proxy is on disk: keep it on a proxy pass, replace it on a source pass
+            if quality != TIER_SOURCE and self.storage.exists(final_path):
+                return f"{current_tier} proxy already present"
+        elif self.is_synced(item, final_path):
+            return "exists and size matches"
+        elif final_path.endswith('.360') and self._unpacked_present(item, final_path):
+            # The .360 itself is gone once unpacked; the index knows what it became
+            return ALREADY_UNPACKED
+        return None
+
+    def plan_item(self, item, target_dir, quality=TIER_SOURCE):
+        """What download_media_item would do, without doing it: "download", "unpack" or "skip"."""
+        final_path = self.get_target_path(item, target_dir)
+        current_tier = self.tier_manifest.get(item["id"]) if self.tier_manifest else None
+        if final_path.endswith('.360') and self.storage.is_local and not current_tier and self.is_synced(item, final_path):
+            return "unpack"
+        return "skip" if self._present(item, final_path, quality, current_tier) else "download"
+
+    def _link_duplicate(self, item, final_path):
+        # Another media id may hold the same footage on disk already (see dedup.py).
+        # A candidate is linked only when its sampled hash matches the same
+        # ranges of the remote file, which costs a few small range requests
+        candidates = self.dedup.candidates(item, exclude=final_path)
+        if not candidates:
+            return False
+        url = self.url_resolver.get(item) if self.url_resolver else self.get_download_url(item)
+        if not url:
+            return False
+        size = int(item["file_size"])
+        try:
+            with span(self.tracer, "dedup_check", media_id=item["id"]):
+                remote = hash_samples(size, lambda offset, length: self._read_range(url, offset, length, item["id"]))
+        except (DownloadError, requests.RequestException) as e:
+            logging.debug(f"Could not sample {item['id']} for deduplication: {e}")
+            return False
+
+        for candidate in candidates:
+            link_path = final_path + ".link"
+            try:
+                if sample_hash(candidate, size) != remote:
+                    continue
+                self.storage.makedirs(os.path.dirname(final_path))
+                self._stage(link_path, SCRATCH)
+                how = link_file(candidate, link_path)
+                self._replace(link_path, final_path)
+            except OSError as e:
+                logging.warning(f"Could not link {candidate} to {final_path}: {e}")
+                if os.path.exists(link_path):
+                    os.remove(link_path)
+                self._unstage(link_path)
+                continue
+            logging.info(f"{os.path.basename(final_path)} is a copy of {candidate}, stored as a {how}")
+            self._note(item["id"], method="dedup", link=how)
+            return True
+        logging.debug(f"{os.path.basename(final_path)} only looks like a copy of {candidates[0]}, downloading it")
+        return False
+
+    def _read_range(self, url, offset, length, media_id):
+        headers = {"Range": f"bytes={offset}-{offset + length - 1}"}
+        with requests.get(url, headers=headers, stream=True, timeout=30) as r:
+            if r.status_code != 206:
+                # A server that ignores Range would send the whole file
+                raise DownloadError(f"Range request answered with {r.status_code}", r.status_code)
+            data = r.content
+        if len(data) != length:
+            raise DownloadError(f"Range request returned {len(data)} of {length} bytes")
+        self._note_add(media_id, "bytes", length)
+        return data
+
+    def _indexed(self, item, final_path):
+        # Records where the item ended up, which for a .360 is the media unpacked from it
+        path = self._unpacked.pop(final_path, final_path)
+        if self.local_index is not None:
+            self.local_index.record(item["id"], path)
+        if self.fingerprints is not None and path == final_path:
+            self.fingerprints.record(item["id"], path)
+        if self.dedup is not None and path == final_path and self.storage.is_local:
+            self.dedup.record(item, path)
+
+    def _batched(self, item, final_path):
+        # Batches fetch the source, which replaces any proxy recorded for the item
+        if self.tier_manifest:
+            self.tier_manifest.set(item["id"], TIER_SOURCE, final_path)
+        self._indexed(item, final_path)
+
+    def _unpacked_present(self, item, final_path):
+        path = self.local_index.get(item["id"]) if self.local_index is not None else None
+        return bool(path) and path != final_path and self.storage.exists(path)
+
     def _handle_360_file(self, file_path):
         """
         Handle .360 files that are actually ZIP files.
         Renames to .zip and extracts the contents.
         """
+        with span(self.tracer, "extract", entry=os.path.basename(file_path)):
+            return self._unpack_360(file_path)
+
+    def _unpack_360(self, file_path):
+        import zipfile
+        zip_path = file_path + '.zip'
+        target_dir = os.path.dirname(file_path)
         try:
             logging.info(f"Processing .360 file as ZIP: {file_path}")
 
-            # Rename .360 to .zip
-            zip_path = file_path + '.zip'
+            # Rename .360 to .zip; the journal puts it back if the unpack never finishes
+            self._stage(zip_path, UNPACK)
             os.rename(file_path, zip_path)
 
             # Extract the ZIP file
             with zipfile.ZipFile(zip_path, 'r') as z:
-                # Extract all files to the same directory
-                z.extractall(os.path.dirname(zip_path))
-
-                # Find the extracted media file (usually the first non-metadata file)
+                # Find the media files (usually the first non-metadata file)
                 extracted_files = z.namelist()
                 media_files = [f for f in extracted_files
                               if not f.startswith('__') and not f.startswith('.')]
 
+                # Extract all files to the same directory
+                for name in extracted_files:
+                    dest = self._safe_extract_path(target_dir, name)
+                    if dest is None:
+                        continue
+                    os.makedirs(os.path.dirname(dest), exist_ok=True)
+                    self._extract_entry(z, name, dest)
+
                 if media_files:
                     # Get the first media file
                     first_media = media_files[0]
-                    extracted_path = os.path.join(os.path.dirname(zip_path), first_media)
+                    extracted_path = os.path.join(target_dir, first_media)
 
                     # Rename the extracted file to the original .360 name (but with proper extension)
                     final_name = os.path.splitext(file_path)[0] + os.path.splitext(first_media)[1]
-                    final_path = os.path.join(os.path.dirname(file_path), final_name)
+                    final_path = os.path.join(target_dir, final_name)
+                    self._unpacked[file_path] = final_path
 
                     # Remove original .360.zip file
                     os.remove(zip_path)
+                    self._unstage(zip_path)
 
                     # Rename extracted file to final name
                     if extracted_path != final_path:
-                        os.rename(extracted_path, final_path)
+                        self._replace(extracted_path, final_path)
                         logging.info(f"Extracted and renamed: {final_path}")
                     else:
                         logging.info(f"Extracted: {final_path}")
@@ -303,12 +958,64 @@ class GoProPlus:
             # Clean up the zip file if extraction failed
             if os.path.exists(zip_path):
                 os.remove(zip_path)
+            self._unstage(zip_path)
 
+        except SyncCancelled:
+            # Put the .360 back; the next run picks up the extraction from there
+            if os.path.exists(zip_path):
+                os.rename(zip_path, file_path)
+            self._unstage(zip_path)
+            raise
         except Exception as e:
             logging.error(f"Failed to process .360 file {file_path}: {e}")
             # Restore original file if possible
-            if os.path.exists(file_path + '.zip'):
-                os.rename(file_path + '.zip', file_path)
+            if os.path.exists(zip_path):
+                os.rename(zip_path, file_path)
+            self._unstage(zip_path)
             return False
 
         return False
+
+    @staticmethod
+    def _safe_extract_path(target_dir, name):
+        # Same protection as ZipFile.extract: no absolute paths or escaping via ..
+        parts = [p for p in name.replace('\\', '/').split('/') if p not in ('', '.', '..')]
+        if not parts or name.endswith('/'):
+            return None
+        return os.path.join(target_dir, *parts)
+
+class _ResponseReader:
+    """
+    File-like view of a streamed response. Like a socket, read() may return
+    less than asked for: at most one network chunk is pulled per call, and a
+    cancel is noticed before that chunk is handed on.
+    """
+    def __init__(self, client, response, media_id):
+        self._client = client
+        self._chunks = iter(response.iter_content(chunk_size=CHUNK_SIZE))
+        self._media_id = media_id
+        self._buffer = b""
+
+    def _next_chunk(self):
+        chunk = b""
+        while chunk == b"": # keep-alive chunks are empty, only None ends the stream
+            chunk = next(self._chunks, None)
+            self._client._check_cancelled()
+        if chunk and self._client.control is not None:
+            self._client.control.throttle(len(chunk), self._client.cancel_token)
+        if chunk and self._client.progress:
+            self._client.progress.advance(self._media_id, len(chunk))
+        if chunk:
+            self._client._note_add(self._media_id, "bytes", len(chunk))
+        return chunk
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            data, self._buffer = self._buffer, b""
+            for chunk in iter(self._next_chunk, None):
+                data += chunk
+            return data
+        if not self._buffer:
+            self._buffer = self._next_chunk() or b""
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
@@ -13,6 +13,9 @@ if project_root not in sys.path:
 
 import keyring
 from src.sync import sync_account
+from src.progress import format_snapshot
+from src.cancellation import CancelToken
+from src.filters import MediaFilter, parse_types, parse_date, parse_size
 
 SERVICE_ID = "gopro-cloud-sync"
 ACCOUNT_ID = "auth_token"
@@ -21,8 +24,8 @@ class GoProSyncApp(toga.App):
     def startup(self):
         self.main_window = toga.MainWindow(title="GoPro Cloud Sync")
         self.is_syncing = False
-        self.stop_requested = False
-        
+        self.cancel_token = None
+
         # Token UI
         self.token_input = toga.PasswordInput(placeholder="Auth Token", style=Pack(flex=1))
         
@@ -49,24 +52,40 @@ class GoProSyncApp(toga.App):
         self.folder_input.value = os.path.join(os.getcwd(), "GoProMedia") # Default
         
         folder_btn = toga.Button("Select Folder", on_press=self.select_folder)
+
+        # Quality UI: a proxy pass first, source later replaces the proxies
+        self.quality_select = toga.Selection(items=["source", "smallest"], style=Pack(flex=1))
+
+        # Selective sync: only matching items are listed and downloaded
+        self.type_select = toga.Selection(items=["all", "videos", "photos"], style=Pack(flex=1))
+        self.since_input = toga.TextInput(placeholder="Since (e.g. 90d or 2024-01-31)", style=Pack(flex=1, margin_left=5))
+        self.max_size_input = toga.TextInput(placeholder="Max size (e.g. 20GB)", style=Pack(flex=1, margin_left=5))
+        self.pattern_input = toga.TextInput(placeholder="Filename pattern (e.g. GX*.MP4)", style=Pack(flex=1, margin_left=5))
         
         # Controls
         self.progress_bar = toga.ProgressBar(max=100)
         self.status_label = toga.Label("Ready", style=Pack(margin_top=10))
+        self.detail_label = toga.Label("", style=Pack(margin_top=5))
         
         self.start_stop_btn = toga.Button("Start Sync", on_press=self.toggle_sync, style=Pack(margin_top=10, flex=1))
         
         # Layout
         token_box = toga.Box(children=[toga.Label(token_label_text), self.token_input, self.delete_token_btn], style=Pack(direction=ROW, margin=5, align_items="center"))
         folder_box = toga.Box(children=[self.folder_input, folder_btn], style=Pack(direction=ROW, margin=5))
+        quality_box = toga.Box(children=[toga.Label("Quality:"), self.quality_select], style=Pack(direction=ROW, margin=5, align_items="center"))
+        filter_box = toga.Box(children=[toga.Label("Only:"), self.type_select, self.since_input, self.max_size_input, self.pattern_input],
+                              style=Pack(direction=ROW, margin=5, align_items="center"))
         
         box = toga.Box(
             children=[
                 token_box,
                 folder_box,
+                quality_box,
+                filter_box,
                 self.start_stop_btn,
                 self.progress_bar,
-                self.status_label
+                self.status_label,
+                self.detail_label
             ],
             style=Pack(direction=COLUMN, margin=10)
         )
@@ -91,7 +110,9 @@ class GoProSyncApp(toga.App):
 
     async def toggle_sync(self, widget):
         if self.is_syncing:
-            self.stop_requested = True
+            # Stops the running download within one chunk; partial files are resumed next time
+            if self.cancel_token:
+                self.cancel_token.cancel()
             self.start_stop_btn.text = "Stopping..."
             self.start_stop_btn.enabled = False # Prevent double clicks
             return
@@ -99,10 +120,17 @@ class GoProSyncApp(toga.App):
         # START SYNC
         token = self.token_input.value
         folder = self.folder_input.value
-        
+        quality = self.quality_select.value
+
         if not token:
             await self.main_window.dialog(toga.ErrorDialog("Error", "Please enter an Auth Token."))
             return
+
+        try:
+            media_filter = self.build_filter()
+        except ValueError as e:
+            await self.main_window.dialog(toga.ErrorDialog("Error", f"Invalid filter: {e}"))
+            return
             
         # Save token only if not from Env (simple check: if matches env, don't save, else save)
         env_token = os.environ.get("GO_PRO_AUTH_TOKEN")
@@ -113,36 +141,55 @@ class GoProSyncApp(toga.App):
                 print(f"Keyring error: {e}")
             
         self.is_syncing = True
-        self.stop_requested = False
+        self.cancel_token = CancelToken()
         self.start_stop_btn.text = "Stop Sync"
         self.status_label.text = "Starting..."
+        self.detail_label.text = ""
         self.progress_bar.value = 0
         
         # Run in thread
-        thread = threading.Thread(target=self.run_sync_thread, args=(token, folder))
+        thread = threading.Thread(target=self.run_sync_thread, args=(token, folder, quality, media_filter))
         thread.start()
+
+    def build_filter(self):
+        media_filter = MediaFilter()
+        if self.type_select.value and self.type_select.value != "all":
+            media_filter.types = parse_types(self.type_select.value)
+        if self.since_input.value.strip():
+            media_filter.since = parse_date(self.since_input.value)
+        if self.max_size_input.value.strip():
+            media_filter.max_size = parse_size(self.max_size_input.value)
+        if self.pattern_input.value.strip():
+            media_filter.include = [self.pattern_input.value.strip()]
+        return media_filter or None
         
-    def run_sync_thread(self, token, folder):
+    def run_sync_thread(self, token, folder, quality="source", media_filter=None):
         def update_ui(msg, progress):
             def _update():
                 self.status_label.text = msg
-                if progress is not None:
+                # Byte level snapshots drive the bar while downloading
+                if progress is not None and (progress >= 100 or not self.detail_label.text):
                      self.progress_bar.value = progress
             self.app.loop.call_soon_threadsafe(_update)
-            
-        def check_cancelled():
-            return self.stop_requested
 
+        def update_progress(snapshot):
+            # Already coalesced to a few updates per second by the sync
+            def _update():
+                self.progress_bar.value = snapshot.percent
+                self.detail_label.text = format_snapshot(snapshot)
+            self.app.loop.call_soon_threadsafe(_update)
+            
         # Run sync
         try:
-            sync_account(token, folder, callback=update_ui, is_cancelled=check_cancelled)
+            sync_account(token, folder, callback=update_ui, quality=quality,
+                         on_progress=update_progress, cancel_token=self.cancel_token,
+                         media_filter=media_filter)
         finally:
             self.reset_ui_state()
     
     def reset_ui_state(self):
         def _reset():
             self.is_syncing = False
-            self.stop_requested = False
             self.start_stop_btn.text = "Start Sync"
             self.start_stop_btn.enabled = True
             
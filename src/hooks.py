@@ -0,0 +1,185 @@
+import os
+import json
+import time
+import queue
+import shlex
+import logging
+import threading
+import subprocess
+from .state import state_path, load_json, update_json
+from .cancellation import SyncCancelled
+
+# Items handled at once, and completed items that may wait for a free worker
+# before downloads are held back
+HOOK_WORKERS = 2
+HOOK_QUEUE = 32
+# A command still running after this many seconds counts as failed
+HOOK_TIMEOUT = 3600
+
+class HookError(Exception):
+    pass
+
+class Hook:
+    """
+    One post-download step. action is a command line or a callable taking
+    (path, item). In a command, {path}, {id} and {filename} are replaced per
+    item; without {path} the path is appended as the last argument. Commands
+    also get GOPRO_SYNC_PATH, GOPRO_SYNC_MEDIA_ID and GOPRO_SYNC_ITEM (the
+    item's metadata as JSON) in their environment.
+    """
+    def __init__(self, action, name=None, timeout=HOOK_TIMEOUT):
+        self.action = action
+        self.name = name or (action if isinstance(action, str) else getattr(action, "__name__", repr(action)))
+        self.timeout = timeout
+
+    def run(self, path, item):
+        if not isinstance(self.action, str):
+            self.action(path, item)
+            return
+
+        fields = {"{path}": path, "{id}": str(item["id"]), "{filename}": item.get("filename") or ""}
+        args = shlex.split(self.action)
+        if not any("{path}" in arg for arg in args):
+            args.append(path)
+        for placeholder, value in fields.items():
+            args = [arg.replace(placeholder, value) for arg in args]
+        env = dict(os.environ, GOPRO_SYNC_PATH=path, GOPRO_SYNC_MEDIA_ID=str(item["id"]),
+                   GOPRO_SYNC_ITEM=json.dumps(item, default=str))
+        result = subprocess.run(args, env=env, capture_output=True, text=True, timeout=self.timeout)
+        if result.returncode != 0:
+            output = (result.stderr or result.stdout or "").strip().splitlines()
+            raise HookError(f"exit status {result.returncode}" + (f": {output[-1]}" if output else ""))
+
+class HookPipeline:
+    """
+    Runs hooks on each item as soon as it is synced, on a few worker threads
+    next to the downloads. Hooks of one item run in the order given, so a
+    later step can rely on an earlier one. When the workers fall behind by
+    more than queue_size items, submit() blocks, holding back downloads.
+
+    Outcomes per item and hook are kept in .gopro-sync/hooks.json. Items whose
+    hooks failed or never ran (cancelled run) get them again when a later run
+    finds the item already synced; items synced before hooks were set up are
+    left alone.
+    """
+    FILENAME = "hooks.json"
+
+    def __init__(self, hooks, target_folder, workers=HOOK_WORKERS, queue_size=HOOK_QUEUE,
+                 events=None, cancel_token=None):
+        self.hooks = [hook if isinstance(hook, Hook) else Hook(hook) for hook in hooks]
+        self.path = state_path(target_folder, self.FILENAME)
+        self.records = load_json(self.path, {}) # media id -> hook name -> outcome
+        self.workers = workers
+        self.events = events
+        self.cancel_token = cancel_token
+        self.succeeded = 0
+        self.failed = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._threads = []
+        self._pending = 0
+        self._lock = threading.Condition()
+        self._changed = set() # media ids whose record changed since the last save
+        self._stopping = False
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"hooks-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, item, path, new=True):
+        """
+        Queues the hooks for a synced item: all of them for a new download,
+        and for an item that was already there only those that did not succeed.
+        """
+        media_id = str(item["id"])
+        with self._lock:
+            record = self.records.get(media_id)
+            if new:
+                hooks = self.hooks
+            elif record is None:
+                return
+            else:
+                hooks = [hook for hook in self.hooks if (record.get(hook.name) or {}).get("ok") is not True]
+            if not hooks:
+                return
+            record = self.records.setdefault(media_id, {})
+            for hook in hooks:
+                record[hook.name] = {"ok": None}
+            self._pending += 1
+            self._changed.add(media_id)
+
+        while True:
+            if self.cancel_token is not None:
+                self.cancel_token.raise_if_cancelled()
+            try:
+                self._queue.put((item, path, hooks), timeout=0.2)
+                return
+            except queue.Full:
+                continue
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            try:
+                if not self._stopping:
+                    self._run(*job)
+            finally:
+                with self._lock:
+                    self._pending -= 1
+                    self._lock.notify_all()
+
+    def _run(self, item, path, hooks):
+        for hook in hooks:
+            started = time.perf_counter()
+            error = None
+            try:
+                hook.run(path, item)
+            except Exception as e:
+                error = e
+                logging.warning(f"Hook {hook.name} failed for {os.path.basename(path)}: {e}")
+            seconds = round(time.perf_counter() - started, 3)
+            with self._lock:
+                self.records.setdefault(str(item["id"]), {})[hook.name] = {
+                    "ok": error is None, "at": round(time.time()), "seconds": seconds,
+                    "error": str(error) if error else None}
+                if error is None:
+                    self.succeeded += 1
+                else:
+                    self.failed += 1
+                self._changed.add(str(item["id"]))
+            if self.events is not None:
+                self.events.emit("hook", id=item["id"], hook=hook.name, ok=error is None, seconds=seconds,
+                                 error=str(error) if error else None)
+
+    def wait(self):
+        """Blocks until every queued item went through its hooks, or the sync is cancelled."""
+        with self._lock:
+            while self._pending:
+                if self.cancel_token is not None and self.cancel_token.cancelled:
+                    raise SyncCancelled()
+                self._lock.wait(0.2)
+
+    def close(self):
+        # Stops after the hooks that are running; queued items stay pending for the next run
+        self._stopping = True
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        self.save()
+        if self.succeeded or self.failed:
+            logging.info(f"Post-download hooks: {self.succeeded} succeeded, {self.failed} failed.")
+
+    def save(self):
+        # Only the items handled here are written, merged with what other nodes
+        # sharing the target saved meanwhile
+        with self._lock:
+            if not self._changed:
+                return
+            changes = json.loads(json.dumps({media_id: self.records[media_id] for media_id in self._changed}))
+            self._changed = set()
+        update_json(self.path, changes)
@@ -0,0 +1,183 @@
+import os
+import re
+import json
+import logging
+import threading
+from dataclasses import dataclass, field
+from .state import state_path
+
+# Kinds of staged files
+RESUME = "resume" # partial download (.part, .temp), kept so the next run resumes it
+SCRATCH = "scratch" # extraction or batch staging, worthless after a crash
+UNPACK = "unpack" # a .360 renamed to .360.zip while it is unpacked
+
+# Directory entries and the compacted journal are fsynced every this many commits
+SYNC_INTERVAL = 16
+
+@dataclass
+class RecoveryReport:
+    resumable: list = field(default_factory=list) # media ids with a partial download to resume
+    removed: list = field(default_factory=list) # scratch files deleted
+    restored: list = field(default_factory=list) # .360 files put back from .360.zip
+
+class WriteJournal:
+    """
+    Write-ahead journal of the staging files in the target folder. Every
+    file is written under a staging name, recorded here first, and moved to
+    its final name by commit(), which makes its data durable before the
+    rename. Directory fsyncs and the journal itself are synced in batches
+    (checkpoint()), since a lost commit record only means the next run
+    finds the staging file gone. recover() settles whatever the previous
+    run left behind, from the journal alone, without walking the folder.
+    """
+    FILENAME = "journal.jsonl"
+
+    def __init__(self, target_folder, node_id=None):
+        # Nodes sharing a target keep separate journals, so one never cleans up after a live other
+        name = self.FILENAME if not node_id else "journal-" + re.sub(r"[^A-Za-z0-9._-]+", "_", node_id) + ".jsonl"
+        self.path = state_path(target_folder, name)
+        self.staged = {} # path -> {"kind", "id"}
+        self._dirs = set() # directories with renames not yet fsynced
+        self._file = None
+        self._commits = 0
+        self._dirty = False
+        self._lock = threading.Lock()
+
+    def _append(self, record):
+        # Appended and flushed, not fsynced: checkpoint() does that in batches
+        if self._file is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._file = open(self.path, 'a', encoding='utf-8')
+        self._file.write(json.dumps(record) + "\n")
+        self._file.flush()
+        self._dirty = True
+
+    def stage(self, path, kind, media_id=None):
+        with self._lock:
+            if self.staged.get(path) == {"kind": kind, "id": media_id}:
+                return
+            self.staged[path] = {"kind": kind, "id": media_id}
+            self._append({"op": "stage", "path": path, "kind": kind, "id": media_id})
+
+    def unstage(self, path):
+        with self._lock:
+            if self.staged.pop(path, None) is not None:
+                self._append({"op": "done", "path": path})
+
+    def commit(self, src, dst):
+        """Durably moves the staged src to dst."""
+        _fsync_file(src)
+        os.replace(src, dst)
+        self.unstage(src)
+        with self._lock:
+            self._dirs.add(os.path.dirname(dst) or ".")
+            self._commits += 1
+            due = self._commits % SYNC_INTERVAL == 0
+        if due:
+            self.checkpoint()
+
+    def checkpoint(self):
+        """Syncs pending renames and rewrites the journal with only the open entries."""
+        with self._lock:
+            dirs, self._dirs = self._dirs, set()
+            for directory in dirs:
+                _fsync_dir(directory)
+            if not self._dirty:
+                return
+            if self._file:
+                self._file.close()
+                self._file = None
+            temp_path = f"{self.path}.{os.getpid()}.temp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                for path, entry in self.staged.items():
+                    f.write(json.dumps({"op": "stage", "path": path, "kind": entry["kind"], "id": entry["id"]}) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.path)
+            _fsync_dir(os.path.dirname(self.path))
+            self._dirty = False
+
+    def close(self):
+        self.checkpoint()
+
+    def recover(self):
+        """
+        Replays the journal of an earlier run in one pass: scratch files are
+        deleted, .360 files caught mid-unpack are put back so they get
+        unpacked again, and partial downloads stay for resuming.
+        """
+        report = RecoveryReport()
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return report
+        except OSError as e:
+            logging.warning(f"Ignoring unreadable journal {self.path}: {e}")
+            return report
+
+        staged = {}
+        for line in lines:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue # torn last line after a crash
+            if record.get("op") == "stage":
+                staged[record["path"]] = {"kind": record.get("kind"), "id": record.get("id")}
+            elif record.get("op") == "done":
+                staged.pop(record.get("path"), None)
+
+        for path, entry in staged.items():
+            if not os.path.exists(path):
+                continue
+            if entry["kind"] == RESUME:
+                self.staged[path] = entry
+                if entry["id"] is not None:
+                    report.resumable.append(entry["id"])
+            elif entry["kind"] == UNPACK:
+                original = path[:-len(".zip")]
+                if os.path.exists(original):
+                    _remove(path, report)
+                else:
+                    os.replace(path, original)
+                    report.restored.append(original)
+            else:
+                _remove(path, report)
+
+        with self._lock:
+            self._dirty = True
+        self.checkpoint()
+        if report.resumable or report.removed or report.restored:
+            logging.info(f"Recovered from an interrupted run: {len(report.resumable)} partial downloads to resume, "
+                         f"{len(report.removed)} leftovers removed, {len(report.restored)} .360 files restored")
+        return report
+
+def _remove(path, report):
+    try:
+        os.remove(path)
+        report.removed.append(path)
+    except OSError as e:
+        logging.warning(f"Could not remove leftover {path}: {e}")
+
+def _fsync_file(path):
+    # Windows only allows fsync on handles opened for writing
+    fd = os.open(path, os.O_RDWR if os.name == 'nt' else os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def _fsync_dir(path):
+    # Makes renames in the directory durable; not possible (nor needed) on Windows
+    if os.name == 'nt':
+        return
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
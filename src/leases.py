@@ -0,0 +1,255 @@
+import os
+import json
+import time
+import socket
+import logging
+import threading
+
+# A node renews its leases every LEASE_TTL / 3; a crashed node's items are
+# picked up by others once LEASE_TTL has passed
+LEASE_TTL = 300
+# Finished items stay claimed this long, so nodes running at the same time
+# don't redo work the size check can't see (e.g. unpacked .360 files)
+DONE_TTL = 6 * 3600
+# How often a node looks at items other nodes are working on, at the end of its run
+CONTESTED_POLL = 5.0
+
+CLAIMED = "claimed"
+HELD = "held" # another node has a live lease
+DONE = "done" # another node finished it recently
+
+def default_node_id():
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+def open_lease_store(location, node_id=None, ttl=LEASE_TTL):
+    """A .db/.sqlite path gives a SQLite store, anything else a lock directory."""
+    node_id = node_id or default_node_id()
+    if str(location).endswith((".db", ".sqlite", ".sqlite3")):
+        return SqliteLeaseStore(location, node_id, ttl)
+    return LockDirLeaseStore(location, node_id, ttl)
+
+class LeaseStore:
+    """
+    Leases on media ids, shared by several sync nodes working through the
+    same account into the same target. A node downloads an item only while
+    it holds its lease; held leases are renewed in the background until
+    released, and expired ones can be claimed by anyone.
+    """
+    def __init__(self, node_id, ttl=LEASE_TTL):
+        self.node_id = node_id
+        self.ttl = ttl
+        self._held = set()
+        self._held_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def claim(self, media_id):
+        """Returns CLAIMED, HELD or DONE."""
+        result = self._claim(str(media_id), time.time())
+        if result == CLAIMED:
+            with self._held_lock:
+                self._held.add(str(media_id))
+        return result
+
+    def release(self, media_id, done=False):
+        with self._held_lock:
+            self._held.discard(str(media_id))
+        self._release(str(media_id), time.time(), done)
+
+    def renew_all(self):
+        with self._held_lock:
+            held = list(self._held)
+        now = time.time()
+        for media_id in held:
+            try:
+                self._renew(media_id, now)
+            except Exception as e:
+                logging.warning(f"Renewing lease on {media_id} failed: {e}")
+
+    def _run(self):
+        while not self._stop.wait(self.ttl / 3):
+            self.renew_all()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="leases", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        # Whatever is still held (e.g. after a cancel) is free for others at once
+        with self._held_lock:
+            held, self._held = list(self._held), set()
+        for media_id in held:
+            self._release(media_id, time.time(), False)
+
+class SqliteLeaseStore(LeaseStore):
+    """Leases in one SQLite table; every claim is a single atomic upsert."""
+    def __init__(self, path, node_id, ttl=LEASE_TTL):
+        super().__init__(node_id, ttl)
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as db:
+            db.execute("CREATE TABLE IF NOT EXISTS leases ("
+                       "media_id TEXT PRIMARY KEY, node TEXT NOT NULL, expires_at REAL NOT NULL, done INTEGER NOT NULL)")
+
+    def _connect(self):
+        # One connection per thread; waits for other nodes' write locks instead of failing
+        db = getattr(self._local, "db", None)
+        if db is None:
+            import sqlite3
+            db = sqlite3.connect(self.path, timeout=30)
+            self._local.db = db
+        return db
+
+    def _claim(self, media_id, now):
+        with self._connect() as db:
+            changed = db.execute(
+                "INSERT INTO leases (media_id, node, expires_at, done) VALUES (?, ?, ?, 0) "
+                "ON CONFLICT(media_id) DO UPDATE SET node = excluded.node, expires_at = excluded.expires_at, done = 0 "
+                "WHERE leases.expires_at < ? OR (leases.node = excluded.node AND leases.done = 0)",
+                (media_id, self.node_id, now + self.ttl, now)).rowcount
+            if changed:
+                return CLAIMED
+            row = db.execute("SELECT done FROM leases WHERE media_id = ?", (media_id,)).fetchone()
+        return DONE if row and row[0] else HELD
+
+    def _renew(self, media_id, now):
+        with self._connect() as db:
+            db.execute("UPDATE leases SET expires_at = ? WHERE media_id = ? AND node = ? AND done = 0",
+                       (now + self.ttl, media_id, self.node_id))
+
+    def _release(self, media_id, now, done):
+        with self._connect() as db:
+            if done:
+                db.execute("UPDATE leases SET expires_at = ?, done = 1 WHERE media_id = ? AND node = ?",
+                           (now + DONE_TTL, media_id, self.node_id))
+            else:
+                db.execute("DELETE FROM leases WHERE media_id = ? AND node = ? AND done = 0",
+                           (media_id, self.node_id))
+
+class LockDirLeaseStore(LeaseStore):
+    """
+    Leases as files in a shared directory, for storage where SQLite locking
+    is unreliable. Creating a lease is an exclusive create; taking over an
+    expired one is a rename, which only one node can win. Renewing and
+    releasing move the node's own lease aside the same way, so neither can
+    overwrite a lease that another node took over.
+    """
+    def __init__(self, path, node_id, ttl=LEASE_TTL):
+        super().__init__(node_id, ttl)
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    def _file(self, media_id):
+        safe = "".join(c if c.isalnum() or c in "-_." else "_" for c in media_id)
+        return os.path.join(self.path, safe + ".lease")
+
+    def _read(self, path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError):
+            # Still being written by another node, or left half written by one
+            # that crashed; only the latter is as old as an expired lease
+            try:
+                modified = os.path.getmtime(path)
+            except OSError:
+                return None
+            return {"node": None, "expires_at": modified + self.ttl, "done": False}
+
+    def _write(self, path, now, expires_at, done=False):
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump({"node": self.node_id, "expires_at": expires_at, "done": done}, f)
+
+    def _claim(self, media_id, now):
+        path = self._file(media_id)
+        for _ in range(3):
+            try:
+                self._write(path, now, now + self.ttl)
+                return CLAIMED
+            except FileExistsError:
+                pass
+            lease = self._read(path)
+            if lease is None:
+                continue # released in between, try again
+            if lease["expires_at"] >= now:
+                if lease["node"] == self.node_id and not lease["done"]:
+                    return CLAIMED
+                return DONE if lease["done"] else HELD
+            # Expired: move it aside; if another node got there first the rename fails
+            stale = f"{path}.{self.node_id}.stale"
+            try:
+                os.rename(path, stale)
+            except FileNotFoundError:
+                continue
+            if self._read(stale) != lease:
+                # Another node replaced the expired lease with its own since we read
+                # it: that is what we moved, so put it back and leave it to that node
+                self._put_back(stale, path)
+                return HELD
+            os.remove(stale)
+        return HELD
+
+    def _put_back(self, stale, path):
+        try:
+            os.link(stale, path)
+        except FileExistsError:
+            pass
+        os.remove(stale)
+
+    def _move_own(self, path, now, finished=False):
+        """
+        Moves this node's unexpired lease aside, so it can be replaced or
+        dropped without overwriting a lease another node took over after it
+        expired. Returns where it was moved, or None when it isn't ours (any
+        more); finished leases only count when finished is set.
+        """
+        lease = self._read(path)
+        if not lease or lease["node"] != self.node_id or lease["expires_at"] < now:
+            return None
+        if lease["done"] and not finished:
+            return None
+        stale = f"{path}.{self.node_id}.stale"
+        try:
+            os.rename(path, stale)
+        except FileNotFoundError:
+            return None
+        if self._read(stale) != lease:
+            # Taken over between reading and moving it
+            self._put_back(stale, path)
+            return None
+        return stale
+
+    def _replace(self, media_id, now, expires_at, done):
+        path = self._file(media_id)
+        stale = self._move_own(path, now, finished=done)
+        if stale is None:
+            return
+        temp = f"{path}.{self.node_id}.tmp"
+        with open(temp, 'w', encoding='utf-8') as f:
+            json.dump({"node": self.node_id, "expires_at": expires_at, "done": done}, f)
+        try:
+            # Not a replace: a node that claimed it while ours was aside keeps it
+            os.link(temp, path)
+        except FileExistsError:
+            pass
+        os.remove(temp)
+        os.remove(stale)
+
+    def _renew(self, media_id, now):
+        self._replace(media_id, now, now + self.ttl, False)
+
+    def _release(self, media_id, now, done):
+        if done:
+            self._replace(media_id, now, now + DONE_TTL, True)
+            return
+        stale = self._move_own(self._file(media_id), now)
+        if stale is not None:
+            os.remove(stale)
@@ -0,0 +1,173 @@
+import os
+import json
+import time
+import logging
+import threading
+
+# Environment toggles, so the Docker image can be profiled without changing its command
+PROFILE_ENV = "GOPRO_SYNC_PROFILE" # output folder, enables spans
+PROFILE_CPU_ENV = "GOPRO_SYNC_PROFILE_CPU" # "1" adds a cProfile capture
+PROFILE_MEMORY_ENV = "GOPRO_SYNC_PROFILE_MEMORY" # "1" adds a tracemalloc snapshot
+
+TRACE_FILE = "trace.json"
+CPU_FILE = "cpu.pstats"
+MEMORY_FILE = "memory.txt"
+MEMORY_SNAPSHOT_FILE = "memory.tracemalloc"
+
+class Span:
+    """One timed phase. args can be filled in while it runs (bytes, status, ...)."""
+    __slots__ = ("tracer", "name", "args", "start")
+
+    def __init__(self, tracer, name, args):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+        self.start = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        self.tracer.record(self.name, self.start, time.perf_counter_ns() - self.start, self.args)
+        return False
+
+class _NullSpan:
+    # Stand-in when tracing is off, so call sites don't need to check
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    @property
+    def args(self):
+        return {}
+
+_NULL_SPAN = _NullSpan()
+
+def span(tracer, name, **args):
+    """Times the with block as phase `name` on tracer; free when tracer is None."""
+    if tracer is None:
+        return _NULL_SPAN
+    return Span(tracer, name, args)
+
+class Tracer:
+    """
+    Thread-safe recorder of per-phase spans (list page, resolve URL, connect,
+    transfer, extract, rename, ...). Written out as Chrome trace JSON, which
+    chrome://tracing, Perfetto and speedscope can open.
+    """
+    def __init__(self):
+        self.events = []
+        self.counters = [] # (name, ts, value), e.g. the concurrency level over time
+        self._origin = time.perf_counter_ns()
+        self._threads = {}
+        self._lock = threading.Lock()
+
+    def span(self, name, **args):
+        return Span(self, name, args)
+
+    def record(self, name, start_ns, duration_ns, args=None):
+        thread = threading.current_thread()
+        with self._lock:
+            self._threads.setdefault(thread.ident, thread.name)
+            self.events.append((name, start_ns - self._origin, duration_ns, thread.ident, dict(args or {})))
+
+    def counter(self, name, value):
+        with self._lock:
+            self.counters.append((name, time.perf_counter_ns() - self._origin, value))
+
+    def summary(self):
+        """{phase: (count, total seconds)}, for a quick look in the log."""
+        totals = {}
+        with self._lock:
+            for name, _, duration, _, _ in self.events:
+                count, total = totals.get(name, (0, 0.0))
+                totals[name] = (count + 1, total + duration / 1e9)
+        return totals
+
+    def chrome_trace(self):
+        pid = os.getpid()
+        with self._lock:
+            events = [{"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}}
+                      for tid, name in self._threads.items()]
+            for name, start, duration, tid, args in self.events:
+                events.append({"name": name, "cat": "sync", "ph": "X", "pid": pid, "tid": tid,
+                               "ts": start / 1000, "dur": duration / 1000, "args": args})
+            for name, ts, value in self.counters:
+                events.append({"name": name, "cat": "sync", "ph": "C", "pid": pid, "ts": ts / 1000,
+                               "args": {name: value}})
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def write(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.chrome_trace(), f)
+
+class SyncProfiler:
+    """
+    Profiling session for one sync run: spans always, plus optional cProfile
+    (cpu, main thread only) and tracemalloc (memory) captures. Everything is
+    written to out_dir when stop() is called.
+    """
+    def __init__(self, out_dir, cpu=False, memory=False):
+        self.out_dir = out_dir
+        self.cpu = cpu
+        self.memory = memory
+        self.tracer = Tracer()
+        self._profile = None
+
+    @classmethod
+    def from_env(cls, out_dir=None, cpu=False, memory=False):
+        """Merges CLI options with the environment toggles; None when profiling is off."""
+        out_dir = out_dir or os.environ.get(PROFILE_ENV)
+        if not out_dir:
+            return None
+        cpu = cpu or os.environ.get(PROFILE_CPU_ENV) == "1"
+        memory = memory or os.environ.get(PROFILE_MEMORY_ENV) == "1"
+        return cls(out_dir, cpu, memory)
+
+    def start(self):
+        os.makedirs(self.out_dir, exist_ok=True)
+        if self.memory:
+            import tracemalloc
+            tracemalloc.start(25)
+        if self.cpu:
+            import cProfile
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        return self
+
+    def stop(self):
+        """Writes the captures and returns their paths."""
+        written = []
+        if self._profile:
+            self._profile.disable()
+            path = os.path.join(self.out_dir, CPU_FILE)
+            self._profile.dump_stats(path)
+            written.append(path)
+            self._profile = None
+
+        if self.memory:
+            import tracemalloc
+            if tracemalloc.is_tracing():
+                snapshot = tracemalloc.take_snapshot()
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                snapshot.dump(os.path.join(self.out_dir, MEMORY_SNAPSHOT_FILE))
+                path = os.path.join(self.out_dir, MEMORY_FILE)
+                with open(path, 'w', encoding='utf-8') as f:
+                    f.write(f"Peak traced memory: {peak / (1024 * 1024):.1f} MB\n\n")
+                    for stat in snapshot.statistics("lineno")[:30]:
+                        f.write(f"{stat}\n")
+                written.extend([path, os.path.join(self.out_dir, MEMORY_SNAPSHOT_FILE)])
+
+        path = os.path.join(self.out_dir, TRACE_FILE)
+        self.tracer.write(path)
+        written.append(path)
+
+        for name, (count, total) in sorted(self.tracer.summary().items(), key=lambda kv: -kv[1][1]):
+            logging.info(f"Profile: {name}: {count}x, {total:.2f}s")
+        return written
@@ -0,0 +1,190 @@
+import time
+import logging
+import threading
+from collections import deque
+from dataclasses import dataclass, field
+
+# Default rate at which progress snapshots are pushed to the UI/CLI
+PROGRESS_HZ = 10
+# Throughput is averaged over this many seconds
+THROUGHPUT_WINDOW = 5.0
+
+@dataclass
+class FileProgress:
+    media_id: str
+    filename: str
+    bytes_done: int = 0
+    bytes_total: int = 0
+
+@dataclass
+class ProgressSnapshot:
+    files_done: int
+    files_total: int
+    bytes_done: int
+    bytes_total: int
+    bytes_per_second: float
+    eta_seconds: float = None
+    active: list = field(default_factory=list)
+    concurrency: int = None # parallel downloads, when adaptive concurrency is on
+
+    @property
+    def percent(self):
+        if self.bytes_total:
+            return min(100.0, 100.0 * self.bytes_done / self.bytes_total)
+        if self.files_total:
+            return 100.0 * self.files_done / self.files_total
+        return 0.0
+
+def format_bytes(n):
+    for unit in ("B", "KB", "MB", "GB"):
+        if abs(n) < 1024:
+            return f"{n:.1f} {unit}"
+        n /= 1024
+    return f"{n:.1f} TB"
+
+def format_snapshot(snapshot):
+    """One line summary of a snapshot, for status labels and terminals."""
+    text = (f"{snapshot.files_done}/{snapshot.files_total} files, "
+            f"{format_bytes(snapshot.bytes_done)}/{format_bytes(snapshot.bytes_total)} "
+            f"at {format_bytes(snapshot.bytes_per_second)}/s")
+    if snapshot.eta_seconds is not None:
+        minutes, seconds = divmod(int(snapshot.eta_seconds), 60)
+        hours, minutes = divmod(minutes, 60)
+        text += f", ETA {hours}:{minutes:02d}:{seconds:02d}" if hours else f", ETA {minutes}:{seconds:02d}"
+    if snapshot.active:
+        text += f" ({len(snapshot.active)} active)"
+    if snapshot.concurrency:
+        text += f" [concurrency {snapshot.concurrency}]"
+    return text
+
+class ProgressTracker:
+    """
+    Thread-safe byte level progress of a sync run. Download code reports
+    bytes with advance(); snapshot() turns the counters into throughput and ETA.
+    """
+    def __init__(self):
+        self.files_total = 0
+        self.files_done = 0
+        self.bytes_total = 0
+        self.bytes_done = 0
+        self.bytes_transferred = 0 # actually moved over the network, for throughput
+        self.active = {}
+        self.concurrency = None
+        self.version = 0
+        self._samples = deque()
+        self._lock = threading.Lock()
+
+    def set_totals(self, files_total, bytes_total):
+        with self._lock:
+            self.files_total = files_total
+            self.bytes_total = bytes_total
+            self.version += 1
+
+    def set_concurrency(self, level):
+        with self._lock:
+            self.concurrency = level
+            self.version += 1
+
+    def start_file(self, media_id, filename, bytes_total=0):
+        with self._lock:
+            self.active[str(media_id)] = FileProgress(str(media_id), filename, 0, int(bytes_total or 0))
+            self.version += 1
+
+    def advance(self, media_id, nbytes, transferred=True):
+        # transferred=False accounts for bytes already on disk, e.g. a resumed partial file
+        with self._lock:
+            entry = self.active.get(str(media_id))
+            if entry:
+                entry.bytes_done += nbytes
+            self.bytes_done += nbytes
+            if transferred:
+                self.bytes_transferred += nbytes
+            self.version += 1
+
+    def restart_file(self, media_id):
+        # A retried download starts from zero again
+        with self._lock:
+            entry = self.active.get(str(media_id))
+            if entry:
+                self.bytes_done -= entry.bytes_done
+                entry.bytes_done = 0
+                self.version += 1
+
+    def finish_file(self, media_id, size=0, files=1):
+        """
+        Marks a transfer done. size is its expected size: whatever the
+        transfer did not report (skipped or partially resumed files) is
+        accounted for so the overall percentage still reaches 100.
+        files is the number of files it completed (batches complete several).
+        """
+        with self._lock:
+            entry = self.active.pop(str(media_id), None)
+            reported = entry.bytes_done if entry else 0
+            self.bytes_done += int(size or 0) - reported
+            self.files_done += files
+            self.version += 1
+
+    def abandon_file(self, media_id):
+        # A failed transfer gives back its bytes; it may be started again later
+        with self._lock:
+            entry = self.active.pop(str(media_id), None)
+            if entry:
+                self.bytes_done -= entry.bytes_done
+                self.version += 1
+
+    def snapshot(self):
+        with self._lock:
+            now = time.monotonic()
+            self._samples.append((now, self.bytes_transferred))
+            while len(self._samples) > 2 and now - self._samples[0][0] > THROUGHPUT_WINDOW:
+                self._samples.popleft()
+
+            first_time, first_bytes = self._samples[0]
+            elapsed = now - first_time
+            rate = (self.bytes_transferred - first_bytes) / elapsed if elapsed > 0 else 0.0
+
+            remaining = self.bytes_total - self.bytes_done
+            eta = remaining / rate if rate > 0 and remaining > 0 else None
+            active = [FileProgress(f.media_id, f.filename, f.bytes_done, f.bytes_total) for f in self.active.values()]
+            return ProgressSnapshot(self.files_done, self.files_total, self.bytes_done, self.bytes_total,
+                                    rate, eta, active, self.concurrency)
+
+class ProgressReporter:
+    """
+    Pushes snapshots of a tracker to listener(snapshot) at a fixed rate, from
+    its own thread. However many chunks arrive in between, the listener (and
+    the UI event loop behind it) sees at most `hz` updates per second.
+    """
+    def __init__(self, tracker, listener, hz=PROGRESS_HZ):
+        self.tracker = tracker
+        self.listener = listener
+        self.interval = 1.0 / hz
+        self._stop = threading.Event()
+        self._thread = None
+        self._seen = -1
+
+    def _emit(self):
+        version = self.tracker.version
+        if version == self._seen:
+            return
+        self._seen = version
+        try:
+            self.listener(self.tracker.snapshot())
+        except Exception as e:
+            logging.debug(f"Progress listener failed: {e}")
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._emit()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="progress", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        # Final state always reaches the listener
+        self._emit()
@@ -0,0 +1,118 @@
+import os
+import logging
+import threading
+from dataclasses import dataclass, field
+from .state import state_path, load_json, update_json
+
+# What to do with local files whose media was deleted from the cloud
+ON_DELETED_REPORT = "report"
+ON_DELETED_ARCHIVE = "archive"
+ON_DELETED_DELETE = "delete"
+ON_DELETED_ACTIONS = (ON_DELETED_REPORT, ON_DELETED_ARCHIVE, ON_DELETED_DELETE)
+
+# Archived files are moved here, inside the target folder
+ARCHIVE_DIR = "deleted-from-cloud"
+# More orphans than this share of the index looks like a broken listing
+# rather than deletions, so files are then only reported
+MAX_ORPHAN_FRACTION = 0.5
+
+class LocalIndex:
+    """
+    Which media id is stored at which path, persisted in the target folder.
+    Filled in as items are downloaded or found in place, so reconciling
+    never has to walk the target tree.
+    """
+    FILENAME = "index.json"
+
+    def __init__(self, target_folder):
+        self.path = state_path(target_folder, self.FILENAME)
+        self.entries = load_json(self.path, {})
+        self._changes = {} # media id -> entry, or None when forgotten, since the last save
+        self._lock = threading.Lock()
+
+    @property
+    def dirty(self):
+        return bool(self._changes)
+
+    def get(self, media_id):
+        entry = self.entries.get(str(media_id))
+        return entry["path"] if entry else None
+
+    def record(self, media_id, path):
+        with self._lock:
+            entry = self.entries.get(str(media_id))
+            if not entry or entry["path"] != path:
+                self.entries[str(media_id)] = self._changes[str(media_id)] = {"path": path}
+
+    def forget(self, media_id):
+        with self._lock:
+            if self.entries.pop(str(media_id), None) is not None:
+                self._changes[str(media_id)] = None
+
+    def __len__(self):
+        return len(self.entries)
+
+    def save(self):
+        # Merged with what other nodes sharing the target saved meanwhile
+        with self._lock:
+            if self._changes:
+                self.entries = update_json(self.path, self._changes)
+                self._changes = {}
+
+@dataclass
+class ReconcileReport:
+    orphans: list = field(default_factory=list) # (media_id, path) deleted from the cloud
+    missing: list = field(default_factory=list) # media ids whose local file is gone
+    archived: list = field(default_factory=list)
+    deleted: list = field(default_factory=list)
+
+def reconcile(media_list, index, storage, target_folder, on_deleted=ON_DELETED_REPORT):
+    """
+    Diffs the ids of a complete listing against the local index: one set
+    difference for media deleted from the cloud, one existence check per
+    indexed item for files removed locally. Missing items are dropped from
+    the index so the sync fetches them again. Orphans are reported, or
+    archived/deleted according to on_deleted.
+    """
+    remote_ids = {str(item["id"]) for item in media_list}
+    report = ReconcileReport()
+
+    for media_id in set(index.entries) - remote_ids:
+        report.orphans.append((media_id, index.get(media_id)))
+
+    for media_id in remote_ids & set(index.entries):
+        if not storage.exists(index.get(media_id)):
+            report.missing.append(media_id)
+            index.forget(media_id)
+
+    for media_id, path in report.orphans:
+        logging.info(f"{path} was deleted from the cloud")
+
+    if report.orphans and on_deleted != ON_DELETED_REPORT:
+        if len(report.orphans) > MAX_ORPHAN_FRACTION * len(index):
+            logging.warning(f"{len(report.orphans)} of {len(index)} indexed items are no longer listed; "
+                            f"not applying '{on_deleted}', only reporting")
+            return report
+        for media_id, path in report.orphans:
+            if not storage.exists(path):
+                index.forget(media_id)
+                continue
+            try:
+                if on_deleted == ON_DELETED_ARCHIVE:
+                    dest = _archive_path(target_folder, path)
+                    storage.makedirs(os.path.dirname(dest))
+                    storage.replace(path, dest)
+                    report.archived.append(dest)
+                else:
+                    storage.remove(path)
+                    report.deleted.append(path)
+                index.forget(media_id)
+            except OSError as e:
+                logging.error(f"Could not {on_deleted} {path}: {e}")
+    return report
+
+def _archive_path(target_folder, path):
+    # Keeps the layout below the target folder
+    prefix = target_folder.rstrip("/\\") + os.sep
+    relative = path[len(prefix):] if path.startswith(prefix) else os.path.basename(path)
+    return os.path.join(target_folder, ARCHIVE_DIR, relative)
@@ -0,0 +1,72 @@
+import sys
+import json
+import argparse
+from datetime import datetime
+from statistics import median
+from .progress import format_bytes
+
+def load_runs(path):
+    """
+    Reads an events file written by events.EventLog and returns one summary
+    dict per run, oldest first. Runs that never ended (killed) are included
+    with status "incomplete".
+    """
+    runs = {}
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            run = runs.get(record.get("run"))
+            if run is None:
+                run = runs[record.get("run")] = {
+                    "run": record.get("run"), "started": record.get("ts"), "status": "incomplete",
+                    "items": 0, "downloaded": 0, "skipped": 0, "failed": 0, "bytes": 0, "seconds": 0.0,
+                    "bytes_per_second": 0, "retries": 0, "methods": {},
+                }
+            event = record.get("event")
+            if event == "item_end":
+                run["retries"] += record.get("retries", 0)
+                if record.get("status") == "downloaded":
+                    method = record.get("method") or "unknown"
+                    run["methods"][method] = run["methods"].get(method, 0) + 1
+            elif event == "run_end":
+                for key in ("status", "items", "downloaded", "skipped", "failed", "bytes", "seconds", "bytes_per_second"):
+                    if key in record:
+                        run[key] = record[key]
+    return list(runs.values())
+
+def format_report(runs):
+    lines = [f"{'started':<17} {'status':<13} {'items':>6} {'down':>5} {'skip':>5} {'fail':>5} "
+             f"{'retry':>5} {'bytes':>10} {'time':>8} {'rate':>12}  methods"]
+    for run in runs:
+        started = datetime.fromtimestamp(run["started"]).strftime("%Y-%m-%d %H:%M") if run["started"] else "?"
+        methods = ", ".join(f"{name} {count}" for name, count in sorted(run["methods"].items()))
+        lines.append(f"{started:<17} {run['status']:<13} {run['items']:>6} {run['downloaded']:>5} {run['skipped']:>5} "
+                     f"{run['failed']:>5} {run['retries']:>5} {format_bytes(run['bytes']):>10} "
+                     f"{run['seconds']:>7.0f}s {format_bytes(run['bytes_per_second']) + '/s':>12}  {methods}")
+
+    # Trend: the latest run that moved data against the ones before it
+    moving = [run for run in runs if run["bytes"] and run["status"] == "ok"]
+    if len(moving) >= 2:
+        latest, previous = moving[-1]["bytes_per_second"], median(run["bytes_per_second"] for run in moving[:-1])
+        change = 100.0 * (latest - previous) / previous if previous else 0.0
+        lines.append("")
+        lines.append(f"Latest throughput {format_bytes(latest)}/s vs median {format_bytes(previous)}/s "
+                     f"over {len(moving) - 1} earlier runs ({change:+.0f}%)")
+    return "\n".join(lines)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Summarize sync runs from an --events file")
+    parser.add_argument("events", help="JSON lines file written with --events")
+    parser.add_argument("--last", type=int, default=20, help="Number of most recent runs to show")
+    args = parser.parse_args(argv)
+    runs = load_runs(args.events)
+    if not runs:
+        print("No runs recorded.")
+        return
+    print(format_report(runs[-args.last:]))
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,153 @@
+import time
+import random
+import logging
+import threading
+import requests
+from .state import state_path, load_json, update_json
+from .cancellation import SyncCancelled
+
+# Statuses worth another attempt: timeouts, throttling and server side trouble
+RETRYABLE_STATUS = {408, 425, 429}
+
+class DownloadError(Exception):
+    """A failed HTTP exchange, carrying the status code when there was one."""
+    def __init__(self, message, status_code=None, retry_after=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+def retry_after_seconds(value):
+    # Only the delta-seconds form of Retry-After is honoured
+    if isinstance(value, str) and value.strip().isdigit():
+        return float(value)
+    return None
+
+def _status_of(error):
+    status = getattr(error, "status_code", None)
+    if status is None:
+        response = getattr(error, "response", None)
+        status = getattr(response, "status_code", None)
+    return status
+
+def is_retryable(error):
+    """
+    Sorts errors into retryable (5xx, 408/429, timeouts, connection resets,
+    broken streams) and fatal (other 4xx, local disk errors, bugs).
+    """
+    status = _status_of(error)
+    if isinstance(status, int):
+        return status >= 500 or status in RETRYABLE_STATUS
+    if isinstance(error, (requests.exceptions.Timeout, requests.exceptions.ConnectionError,
+                          requests.exceptions.ChunkedEncodingError)):
+        return True
+    return isinstance(error, (ConnectionError, TimeoutError))
+
+class RetryPolicy:
+    """
+    Central retry policy: exponential backoff with full jitter, capped at max_delay.
+    A Retry-After given by the server (e.g. with a 429) takes precedence.
+    """
+    def __init__(self, max_attempts=3, base_delay=1.0, max_delay=60.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.on_error = None # on_error(error) for each retryable failure, e.g. an AimdController
+
+    def backoff(self, attempt):
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def wait(self, attempt, error=None, cancel_token=None):
+        delay = self.backoff(attempt)
+        retry_after = getattr(error, "retry_after", None)
+        if retry_after:
+            delay = min(self.max_delay, float(retry_after))
+        if delay > 0:
+            logging.debug(f"Backing off {delay:.1f}s before attempt {attempt + 2}")
+            if cancel_token:
+                cancel_token.sleep(delay)
+            else:
+                time.sleep(delay)
+
+    def run(self, attempt_fn, description, max_attempts=None, cancel_token=None):
+        """
+        Calls attempt_fn(attempt) until it returns without raising.
+        Retryable errors back off and try again; fatal errors and the last
+        failure are logged and turn into a False return. Cancellation is
+        never retried and propagates as SyncCancelled.
+        """
+        attempts = max_attempts or self.max_attempts
+        for attempt in range(attempts):
+            try:
+                attempt_fn(attempt)
+                return True
+            except SyncCancelled:
+                raise
+            except Exception as e:
+                if not is_retryable(e):
+                    logging.error(f"{description} failed permanently: {e}")
+                    return False
+                if self.on_error:
+                    self.on_error(e)
+                if attempt == attempts - 1:
+                    logging.error(f"All {attempts} attempts failed for {description}: {e}")
+                    return False
+                logging.warning(f"Attempt {attempt + 1}/{attempts} failed for {description}: {e}")
+                self.wait(attempt, e, cancel_token)
+        return False
+
+class RetryQueue:
+    """
+    Items that failed during a run, retried once more at the end of it.
+    Whatever still fails is persisted and retried first on the next run.
+    """
+    FILENAME = "retry_queue.json"
+
+    def __init__(self, target_folder):
+        self.path = state_path(target_folder, self.FILENAME)
+        self.previous = load_json(self.path, {})
+        self.deferred = {}
+        self._dropped = set() # earlier failures resolved or no longer listed
+        self._lock = threading.Lock()
+
+    def defer(self, item, reason):
+        with self._lock:
+            self.deferred[str(item["id"])] = (item, str(reason))
+
+    def take(self):
+        with self._lock:
+            return [item for item, _ in self.deferred.values()]
+
+    def resolve(self, media_id):
+        with self._lock:
+            self.deferred.pop(str(media_id), None)
+            if self.previous.pop(str(media_id), None) is not None:
+                self._dropped.add(str(media_id))
+
+    def prioritize(self, media_list, prune=False):
+        """
+        Moves items that failed on earlier runs to the front. prune drops the
+        failures of media missing from media_list, so only pass it when the
+        list is the complete, unfiltered listing of the account.
+        """
+        if not self.previous:
+            return media_list
+        listed = {str(item["id"]) for item in media_list}
+        if prune:
+            self._dropped.update(k for k in self.previous if k not in listed)
+            self.previous = {k: v for k, v in self.previous.items() if k in listed}
+        first = [item for item in media_list if str(item["id"]) in self.previous]
+        rest = [item for item in media_list if str(item["id"]) not in self.previous]
+        logging.info(f"Retrying {len(first)} items that failed on previous runs first.")
+        return first + rest
+
+    def save(self):
+        # Earlier failures this run never got to (e.g. cancelled) stay queued, and
+        # so do failures of other nodes sharing the target
+        with self._lock:
+            changes = {media_id: None for media_id in self._dropped}
+            for media_id, (item, reason) in self.deferred.items():
+                runs = self.previous.get(media_id, {}).get("runs", 0) + 1
+                changes[media_id] = {"filename": item.get("filename"), "reason": reason, "runs": runs}
+            if changes:
+                update_json(self.path, changes)
+                self._dropped = set()
@@ -0,0 +1,85 @@
+import os
+import re
+import json
+import logging
+from contextlib import contextmanager
+
+# Bookkeeping files live in a hidden folder inside the sync target
+STATE_DIR = ".gopro-sync"
+# Remote targets (s3://...) keep theirs in a local folder per target instead
+REMOTE_STATE_ROOT = os.path.join(os.path.expanduser("~"), ".cache", "gopro-cloud-sync")
+
+def state_root():
+    # Local folder for state that doesn't belong to one target (remote targets, token cache)
+    return os.environ.get("GOPRO_SYNC_STATE_DIR") or REMOTE_STATE_ROOT
+
+def state_path(target_folder, name):
+    if "://" in str(target_folder):
+        return os.path.join(state_root(), re.sub(r"[^A-Za-z0-9._-]+", "_", target_folder), name)
+    return os.path.join(target_folder, STATE_DIR, name)
+
+def load_json(path, default=None):
+    """
+    Loads a JSON state file. Missing or unreadable files return default,
+    so a damaged state file only costs the optimisation it was backing.
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return default
+    except (OSError, ValueError) as e:
+        logging.warning(f"Ignoring unreadable state file {path}: {e}")
+        return default
+
+def save_json(path, data):
+    # Write to a temp file and rename so a crash never leaves half a file behind.
+    # The temp name is per process, as nodes sharing a target may save at the same time
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.temp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+    os.replace(temp_path, path)
+
+@contextmanager
+def file_lock(path):
+    """
+    Exclusive lock on path + ".lock" held across processes (and nodes sharing
+    the folder), where the platform has flock; elsewhere a no-op.
+    """
+    try:
+        import fcntl
+    except ImportError:
+        yield
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".lock", 'a') as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+def update_json(path, changes):
+    """
+    Applies changes (key -> value, None removes the key) to the JSON object
+    saved at path, re-reading it under file_lock first, so processes sharing
+    a state file keep each other's entries. changes may also be a function
+    that computes them from the object read. Returns the merged object; the
+    file is only written when something changed.
+    """
+    with file_lock(path):
+        current = load_json(path, {})
+        if not isinstance(current, dict):
+            current = {}
+        if callable(changes):
+            changes = changes(current)
+        merged = dict(current)
+        for key, value in changes.items():
+            if value is None:
+                merged.pop(key, None)
+            else:
+                merged[key] = value
+        if merged != current:
+            save_json(path, merged)
+    return merged
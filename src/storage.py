@@ -0,0 +1,232 @@
+import os
+import logging
+import threading
+from urllib.parse import urlparse
+
+# Multipart uploads hold one part in memory; S3 needs at least 5 MiB per part
+S3_PART_SIZE = 8 * 1024 * 1024
+
+class LocalStorage:
+    """
+    Files on the local filesystem. Paths are plain OS paths. Partial files
+    can be appended to, so interrupted downloads resume, and anything that
+    needs random access (zipfile) can work on the files directly.
+    """
+    is_local = True
+    supports_append = True
+
+    def exists(self, path):
+        return os.path.exists(path)
+
+    def getsize(self, path):
+        return os.path.getsize(path)
+
+    def open_read(self, path):
+        return open(path, 'rb')
+
+    def open_write(self, path, append=False):
+        return open(path, 'ab' if append else 'wb')
+
+    def staging_path(self, path, suffix):
+        # Written next to the target and renamed over it once complete
+        return path + suffix
+
+    def replace(self, src, dst):
+        os.replace(src, dst)
+
+    def remove(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def makedirs(self, path):
+        os.makedirs(path, exist_ok=True)
+
+class S3Storage:
+    """
+    An S3-compatible bucket (AWS, MinIO, ...). Paths are s3://bucket/key
+    URLs, so the usual os.path.join/basename handling of the target folder
+    keeps working. Files are streamed up as multipart uploads holding at most
+    one part in memory; an upload only becomes visible when it completes, so
+    no staging objects are needed. Sizes come from one listing of the prefix
+    instead of a HEAD request per item.
+    Needs boto3; credentials and the endpoint (AWS_ENDPOINT_URL for MinIO)
+    are taken from the usual AWS environment variables and config files.
+    """
+    is_local = False
+    supports_append = False
+
+    def __init__(self, url, client=None, part_size=S3_PART_SIZE, **client_kwargs):
+        parsed = urlparse(url)
+        if parsed.scheme != "s3" or not parsed.netloc:
+            raise ValueError(f"Not an s3:// URL: {url}")
+        if client is None:
+            # Imported here: boto3 takes longer to import than the rest of the sync together
+            try:
+                import boto3
+            except ImportError:
+                raise RuntimeError("boto3 is required for s3:// targets (pip install boto3)")
+            client = boto3.client("s3", **client_kwargs)
+        self.client = client
+        self.bucket = parsed.netloc
+        self.prefix = parsed.path.strip("/")
+        self.part_size = part_size
+        self._sizes = None # key -> size, loaded from one listing of the prefix
+        self._lock = threading.Lock()
+
+    def key(self, path):
+        parsed = urlparse(path.replace("\\", "/"))
+        if parsed.scheme != "s3" or parsed.netloc != self.bucket:
+            raise ValueError(f"{path} is not in bucket {self.bucket}")
+        return "/".join(p for p in parsed.path.split("/") if p)
+
+    def _load_sizes(self):
+        with self._lock:
+            if self._sizes is None:
+                sizes = {}
+                paginator = self.client.get_paginator("list_objects_v2")
+                prefix = self.prefix + "/" if self.prefix else ""
+                for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix):
+                    for obj in page.get("Contents", []):
+                        sizes[obj["Key"]] = obj["Size"]
+                logging.debug(f"Listed {len(sizes)} objects under s3://{self.bucket}/{prefix}")
+                self._sizes = sizes
+            return self._sizes
+
+    def _record(self, key, size):
+        with self._lock:
+            if self._sizes is not None:
+                if size is None:
+                    self._sizes.pop(key, None)
+                else:
+                    self._sizes[key] = size
+
+    def _stat(self, path):
+        key = self.key(path)
+        if not self.prefix or key.startswith(self.prefix + "/"):
+            return self._load_sizes().get(key)
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=key)["ContentLength"]
+        except Exception as e:
+            if _is_not_found(e):
+                return None
+            raise
+
+    def exists(self, path):
+        return self._stat(path) is not None
+
+    def getsize(self, path):
+        size = self._stat(path)
+        if size is None:
+            raise FileNotFoundError(path)
+        return size
+
+    def open_read(self, path):
+        return self.client.get_object(Bucket=self.bucket, Key=self.key(path))["Body"]
+
+    def open_write(self, path, append=False):
+        if append:
+            raise OSError("S3 objects can't be appended to")
+        return _MultipartWriter(self, self.key(path))
+
+    def staging_path(self, path, suffix):
+        return path
+
+    def replace(self, src, dst):
+        src_key, dst_key = self.key(src), self.key(dst)
+        if src_key == dst_key:
+            return
+        # Managed copy, switches to multipart copy for objects over 5 GB
+        self.client.copy({"Bucket": self.bucket, "Key": src_key}, self.bucket, dst_key)
+        self.client.delete_object(Bucket=self.bucket, Key=src_key)
+        with self._lock:
+            if self._sizes is not None:
+                self._sizes[dst_key] = self._sizes.pop(src_key, 0)
+
+    def remove(self, path):
+        key = self.key(path)
+        self.client.delete_object(Bucket=self.bucket, Key=key)
+        self._record(key, None)
+
+    def makedirs(self, path):
+        # Prefixes exist implicitly
+        pass
+
+class _MultipartWriter:
+    """Write-only file object that uploads each full part as it is filled."""
+    def __init__(self, storage, key):
+        self.storage = storage
+        self.key = key
+        self.size = 0
+        self._buffer = bytearray()
+        self._upload_id = None
+        self._parts = []
+        self._closed = False
+
+    def write(self, data):
+        self._buffer += data
+        self.size += len(data)
+        while len(self._buffer) >= self.storage.part_size:
+            part = bytes(self._buffer[:self.storage.part_size])
+            del self._buffer[:self.storage.part_size]
+            self._upload_part(part)
+        return len(data)
+
+    def _upload_part(self, data):
+        client = self.storage.client
+        if self._upload_id is None:
+            self._upload_id = client.create_multipart_upload(Bucket=self.storage.bucket, Key=self.key)["UploadId"]
+        number = len(self._parts) + 1
+        response = client.upload_part(Bucket=self.storage.bucket, Key=self.key, UploadId=self._upload_id,
+                                      PartNumber=number, Body=data)
+        self._parts.append({"ETag": response["ETag"], "PartNumber": number})
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        client = self.storage.client
+        if self._upload_id is None:
+            # Small enough for a single request
+            client.put_object(Bucket=self.storage.bucket, Key=self.key, Body=bytes(self._buffer))
+        else:
+            if self._buffer:
+                self._upload_part(bytes(self._buffer))
+            client.complete_multipart_upload(Bucket=self.storage.bucket, Key=self.key, UploadId=self._upload_id,
+                                             MultipartUpload={"Parts": self._parts})
+        self._buffer = bytearray()
+        self.storage._record(self.key, self.size)
+
+    def abort(self):
+        # Nothing becomes visible; uploaded parts are discarded
+        if self._closed:
+            return
+        self._closed = True
+        self._buffer = bytearray()
+        if self._upload_id is not None:
+            try:
+                self.storage.client.abort_multipart_upload(Bucket=self.storage.bucket, Key=self.key,
+                                                           UploadId=self._upload_id)
+            except Exception as e:
+                logging.warning(f"Aborting upload of {self.key} failed: {e}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+def _is_not_found(error):
+    response = getattr(error, "response", None) or {}
+    return str(response.get("Error", {}).get("Code")) in ("404", "NoSuchKey", "NotFound")
+
+def storage_for(target):
+    """Picks the backend for a sync target: s3:// URLs or a local folder."""
+    if str(target).startswith("s3://"):
+        return S3Storage(target)
+    return LocalStorage()
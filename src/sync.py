@@ -1,62 +1,554 @@
-import os
+import time
 import logging
 from .gopro_client import GoProPlus
+from .batching import plan_batches, BATCH_THRESHOLD, BATCH_MAX_BYTES
+from .tiers import TierManifest, TIER_SOURCE
+from .retry import RetryPolicy, RetryQueue
+from .url_resolver import UrlResolver
+from .progress import ProgressTracker, ProgressReporter, PROGRESS_HZ
+from .cancellation import CancelToken, SyncCancelled
+from .storage import storage_for
+from .profiling import span
+from .reconcile import LocalIndex, reconcile, ON_DELETED_REPORT
+from .concurrency import AimdController, run_concurrently
+from .journal import WriteJournal
+from .fingerprint import FingerprintCache, VERIFY_QUICK, VERIFY_SIZE, VERIFY_RESCAN
+from .auth_cache import AuthCache, AUTH_TTL
+from .dedup import DedupIndex
+from .hooks import HookPipeline, HOOK_WORKERS
+from .state import state_path
+from .leases import open_lease_store, LEASE_TTL, CONTESTED_POLL, CLAIMED, HELD, DONE
 
-def sync_account(auth_token, target_folder, callback=None, is_cancelled=None):
+# Persist bookkeeping every this many items so a crash loses little
+STATE_SAVE_INTERVAL = 50
+
+def sync_account(auth_token, target_folder, callback=None, is_cancelled=None,
+                 batch_small_files=False, batch_threshold=BATCH_THRESHOLD, batch_max_bytes=BATCH_MAX_BYTES,
+                 quality=TIER_SOURCE, upgrade_ids=None, retry_policy=None, resolve_urls=True,
+                 on_progress=None, progress_hz=PROGRESS_HZ, cancel_token=None, storage=None,
+                 tracer=None, media_filter=None, on_deleted=ON_DELETED_REPORT,
+                 min_concurrency=1, max_concurrency=1, coordinate=None, node_id=None, lease_ttl=LEASE_TTL,
+                 verify=VERIFY_QUICK, events=None, list_fields="minimal", auth_ttl=AUTH_TTL,
+                 dedup=False, dedup_index=None, hooks=None, hook_workers=HOOK_WORKERS,
+                 control=None, upstream=None):
     """
     Syncs the GoPro Cloud account to the target folder.
     callback(message, progress_percent) is an optional function for GUI updates.
     is_cancelled() is an optional function that returns True if the sync should stop.
+    batch_small_files groups items up to batch_threshold bytes into multi-id zip
+    requests of at most batch_max_bytes; items of a failed batch are retried individually.
+    quality selects the tier to fetch: "source" (default), or a proxy variation
+    such as "smallest" for a fast first pass. Proxies already on disk are kept on
+    proxy passes and replaced on source passes. upgrade_ids restricts the run to
+    upgrading those proxied items to source (see upgrade_to_source).
+    retry_policy (a RetryPolicy) controls backoff between attempts. Items that
+    still fail are retried once more at the end of the run and then persisted,
+    so the next run tries them first.
+    resolve_urls keeps signed direct download links resolved ahead of the
+    download loop, so most items skip the zip/source wrapper.
+    on_progress(snapshot) receives byte level ProgressSnapshots (bytes done/total,
+    throughput, ETA, active transfers), coalesced to at most progress_hz per second.
+    cancel_token (a CancelToken) stops the sync within one chunk of the current
+    download, listing page or extraction; it replaces is_cancelled when given.
+    Partial files are kept so the next run resumes them.
+    storage is where files are written (see storage.py); by default a local
+    folder, or an S3-compatible bucket when target_folder is an s3:// URL.
+    tracer (a profiling.Tracer) records per-phase spans of the run: listing
+    pages, URL resolving, connects, transfers, extraction and renames per item.
+    media_filter (a filters.MediaFilter) limits the sync to matching items; it
+    is pushed into the listing request where possible, so filtered out items
+    are neither listed in full nor downloaded.
+    After a complete, unfiltered listing the media ids are diffed against the
+    local index (.gopro-sync/index.json): files whose media was deleted from the
+    cloud are handled according to on_deleted ("report", "archive" or "delete"),
+    and indexed files that were removed locally are downloaded again first.
+    max_concurrency above 1 downloads items in parallel, with the number of
+    streams adapted between min_concurrency and max_concurrency (AIMD: up while
+    throughput improves, halved on errors, 429s or a collapsing per-stream rate).
+    coordinate shares the work with other nodes syncing the same account into
+    the same target: a SQLite file (.db) or a directory on shared storage, see
+    leases.py. Each item is downloaded by whichever node claims its lease first;
+    leases of crashed nodes expire after lease_ttl seconds and are taken over,
+    and items other nodes are still working on are waited for at the end, so
+    together the nodes produce the same result as a single one.
+    Local targets keep a write-ahead journal of staging files (see journal.py):
+    files are only renamed into place once their data is on disk, and leftovers
+    of a crashed run are cleaned up at startup, its partial downloads resumed first.
+    verify is how files already on local disk are trusted: "size" compares sizes
+    only, "quick" (default) also checks sampled fingerprints, re-hashing a file
+    only when its size or mtime changed since it was fingerprinted, and "rescan"
+    re-hashes every file. Files that don't match are downloaded again.
+    events (an events.EventLog) receives a machine-readable record of the run:
+    per-item start/end with bytes, duration, method, retries and skip reason,
+    and the run's totals (see report.py).
+    list_fields are the item fields requested when listing: "minimal" (default)
+    leaves out variations, which are then fetched only for items that get
+    downloaded; "full" lists them for every item, or give a comma separated list.
+    A token that validated less than auth_ttl seconds ago (and is not about to
+    expire) is not validated again; a 401 during the run validates it then.
+    auth_ttl 0 validates on every run.
+    dedup stores footage that the cloud holds under several media ids once:
+    an item whose size, capture time and filename match a file already on
+    local disk, and whose sampled hash matches the same ranges of the remote
+    file, is reflinked or hardlinked to it instead of downloaded (see dedup.py).
+    dedup_index is the index file; share one between sibling targets to
+    deduplicate across them (default: .gopro-sync/dedup.json in the target).
+    hooks are post-download steps (command lines or callables taking
+    (path, item), see hooks.py) run on each newly synced file by hook_workers
+    threads while the sync goes on. Outcomes are kept per item and hook, and
+    hooks that failed are run again when a later sync finds the file present.
+    control (a control.SyncControl) lets another thread, e.g. the HTTP control
+    API, watch the run and pause, resume or cancel it, limit its bandwidth
+    and change the concurrency range while it runs.
+    upstream is the URL of a LAN cache node (cache_server.py) used in place
+    of the GoPro Cloud API, so machines syncing the same account fetch each
+    file from the cloud only once between them.
     """
-    if not os.path.exists(target_folder):
-        os.makedirs(target_folder)
-        
+    storage = storage or storage_for(target_folder)
+    if not storage.exists(target_folder):
+        storage.makedirs(target_folder)
+
     client = GoProPlus(auth_token)
-    
+    if upstream:
+        client.host = upstream.rstrip("/")
+    client.storage = storage
+    client.tracer = tracer
+    client.auth_cache = AuthCache(ttl=auth_ttl) if auth_ttl else None
+    cancel_token = cancel_token or CancelToken(is_cancelled)
+    client.cancel_token = cancel_token
+    tiers = TierManifest(target_folder)
+    client.tier_manifest = tiers
+    index = LocalIndex(target_folder)
+    client.local_index = index
+    retry_policy = retry_policy or RetryPolicy()
+    client.retry_policy = retry_policy
+    retry_queue = RetryQueue(target_folder)
+    tracker = ProgressTracker()
+    client.progress = tracker
+    controller = None
+    if max_concurrency > 1 or control is not None:
+        controller = AimdController(min_concurrency, max_concurrency, tracer=tracer,
+                                    on_change=tracker.set_concurrency)
+        tracker.set_concurrency(controller.level)
+        retry_policy.on_error = controller.record_error
+    leases = None
+    if coordinate:
+        leases = open_lease_store(coordinate, node_id, lease_ttl)
+        logging.info(f"Coordinating with other nodes through {coordinate} as {leases.node_id}")
+    journal = None
+    resumable = set()
+    if storage.is_local:
+        journal = WriteJournal(target_folder, leases.node_id if leases is not None else None)
+        resumable = {str(media_id) for media_id in journal.recover().resumable}
+        client.journal = journal
+    fingerprints = None
+    if storage.is_local and verify != VERIFY_SIZE:
+        fingerprints = FingerprintCache(target_folder, rescan=verify == VERIFY_RESCAN)
+        client.fingerprints = fingerprints
+    dedup_store = None
+    if dedup and storage.is_local:
+        dedup_store = DedupIndex(dedup_index or state_path(target_folder, DedupIndex.FILENAME))
+        client.dedup = dedup_store
+    if control is not None:
+        control.attach(tracker, cancel_token, controller)
+        client.control = control
+    hook_pipeline = None
+    if hooks:
+        hook_pipeline = HookPipeline(hooks, target_folder, hook_workers, events=events, cancel_token=cancel_token)
+
+    run_started = time.perf_counter()
+    def end_run(status, **totals):
+        if control is not None:
+            control.phase = {"ok": "finished", "cancelled": "cancelled"}.get(status, "failed")
+        if events is None:
+            return
+        seconds = time.perf_counter() - run_started
+        events.emit("run_end", status=status, seconds=round(seconds, 3), bytes=tracker.bytes_transferred,
+                    bytes_per_second=round(tracker.bytes_transferred / seconds) if seconds else 0, **totals)
+        events.flush()
+    if events is not None:
+        client.notes = {}
+        events.emit("run_start", target=target_folder, quality=quality, filtered=bool(media_filter),
+                    upgrade=upgrade_ids is not None, max_concurrency=max_concurrency,
+                    node=leases.node_id if leases is not None else None)
+
     if callback: callback("Validating token...", 0)
-    if not client.validate():
+    with span(tracer, "validate"):
+        valid = client.validate()
+    if not valid:
         logging.error("Invalid token.")
         if callback: callback("Invalid token.", 0)
+        end_run("invalid_token")
         return False
 
     if callback: callback("Fetching media list...", 5)
-    
-    if is_cancelled and is_cancelled():
+
+    if cancel_token.cancelled:
         if callback: callback("Sync cancelled.", 0)
+        end_run("cancelled")
         return False
 
-    media_list = client.get_media_list()
-    logging.info(f"Found {len(media_list)} items in cloud.")
-    
+    try:
+        listing_started = time.perf_counter()
+        if control is not None:
+            control.phase = "listing"
+        with span(tracer, "list"):
+            media_list = client.get_media_list(media_filter=media_filter, fields=list_fields)
+    except SyncCancelled:
+        if callback: callback("Sync cancelled.", 0)
+        logging.info("Sync cancelled by user.")
+        end_run("cancelled")
+        return False
+    if client.token_rejected:
+        logging.error("Invalid token.")
+        if callback: callback("Invalid token.", 0)
+        end_run("invalid_token")
+        return False
+    client.save_session()
+    logging.info(f"Found {len(media_list)} {'matching ' if media_filter else ''}items in cloud.")
+    if events is not None:
+        events.emit("listed", items=len(media_list), seconds=round(time.perf_counter() - listing_started, 3),
+                    **client.listing_stats)
+
+    if upgrade_ids is not None:
+        quality = TIER_SOURCE
+        wanted = {str(media_id) for media_id in upgrade_ids}
+        media_list = [item for item in media_list
+                      if tiers.get(item["id"]) and (not wanted or str(item["id"]) in wanted)]
+        logging.info(f"Upgrading {len(media_list)} proxied items to source.")
+
+    orphans = 0
+    if media_filter or upgrade_ids is not None:
+        logging.debug("Listing is filtered, not reconciling deletions.")
+    elif not client.listing_complete:
+        logging.warning("Listing was incomplete, not reconciling deletions.")
+    else:
+        with span(tracer, "reconcile"):
+            report = reconcile(media_list, index, storage, target_folder, on_deleted)
+        index.save()
+        orphans = len(report.orphans)
+        if orphans:
+            if callback: callback(f"{orphans} local files were deleted from the cloud.", 8)
+        if report.missing:
+            # Files removed locally go first, like earlier failures
+            missing = set(report.missing)
+            logging.info(f"{len(missing)} indexed files were removed locally, downloading them again.")
+            media_list = ([item for item in media_list if str(item["id"]) in missing] +
+                          [item for item in media_list if str(item["id"]) not in missing])
+
+    if resumable:
+        # Interrupted downloads of a crashed run pick up where they stopped
+        media_list = ([item for item in media_list if str(item["id"]) in resumable] +
+                      [item for item in media_list if str(item["id"]) not in resumable])
+
+    # Failures of media that is gone are only dropped when the listing shows all of it
+    media_list = retry_queue.prioritize(media_list, prune=client.listing_complete and not media_filter
+                                        and upgrade_ids is None)
+
     total_items = len(media_list)
+    tracker.set_totals(total_items, sum(_item_size(item) for item in media_list))
+    if control is not None:
+        control.phase = "downloading"
     downloaded = 0
     skipped = 0
     failed = 0
-    
-    for i, item in enumerate(media_list):
-        if is_cancelled and is_cancelled():
-            if callback: callback("Sync cancelled.", 0)
-            logging.info("Sync cancelled by user.")
-            return False
-
-        progress = 10 + int((i / total_items) * 90)
-        filename = item.get("filename") or f"{item['id']}.mp4" # fallback
-        if callback: callback(f"Processing {filename}...", progress)
-        
-        logging.info(f"Processing {i+1}/{total_items}: {filename}")
-        
-        try:
-            status = client.download_media_item(item, target_folder)
+    others = 0 # handled by other nodes
+    done = 0
+    contested = [] # leased by other nodes at the time
+
+    resolver = None
+    reporter = None
+    if on_progress:
+        reporter = ProgressReporter(tracker, on_progress, progress_hz)
+        reporter.start()
+    if leases is not None:
+        leases.start()
+    if hook_pipeline is not None:
+        hook_pipeline.start()
+    try:
+        pending = media_list
+        # Batches come from zip/source, so they only make sense on source passes
+        if batch_small_files and quality == TIER_SOURCE:
+            pending = []
+            to_batch = []
+            for item in media_list:
+                # Already synced items stay in the normal loop so they are reported as skipped
+                if client.is_synced(item, client.get_target_path(item, target_folder)):
+                    pending.append(item)
+                elif leases is not None and leases.claim(item["id"]) != CLAIMED:
+                    # The normal loop sorts out whether another node has it or finished it
+                    pending.append(item)
+                else:
+                    to_batch.append(item)
+
+            batches, singles = plan_batches(to_batch, batch_threshold, batch_max_bytes)
+            pending.extend(singles)
+
+            for batch in batches:
+                cancel_token.raise_if_cancelled()
+                if control is not None:
+                    control.wait_if_paused(cancel_token)
+
+                progress = 10 + int((done / total_items) * 90)
+                if callback: callback(f"Downloading batch of {len(batch)} items...", progress)
+
+                key = batch[0]["id"]
+                tracker.start_file(key, f"batch of {len(batch)} items", sum(_item_size(item) for item in batch))
+                batch_started = time.perf_counter()
+                with span(tracer, "batch", items=len(batch)):
+                    written = client.download_batch([(item, client.get_target_path(item, target_folder)) for item in batch])
+                if events is not None:
+                    # Bytes of a batch are counted under its first item
+                    events.emit("batch", items=len(batch), written=len(written),
+                                seconds=round(time.perf_counter() - batch_started, 3), **client.pop_notes(key))
+                    for item in batch:
+                        if item["id"] in written:
+                            events.emit("item_end", id=item["id"], filename=item.get("filename"),
+                                        status="downloaded", method="batch", size=_item_size(item))
+                if hook_pipeline is not None:
+                    for item in batch:
+                        if item["id"] in written:
+                            hook_pipeline.submit(item, _synced_path(client, item, target_folder))
+                tracker.finish_file(key, sum(_item_size(item) for item in batch if item["id"] in written), len(written))
+                downloaded += len(written)
+                done += len(written)
+                if leases is not None:
+                    for item in batch:
+                        leases.release(item["id"], done=item["id"] in written)
+                # Items of a failed or partial batch fall back to individual fetches
+                pending.extend(item for item in batch if item["id"] not in written)
+
+        if resolve_urls and quality == TIER_SOURCE:
+            resolver = UrlResolver(client)
+            client.url_resolver = resolver
+            # Only items that get downloaded need a link; skipped ones would cost a request each
+            resolver.start([item for item in pending if client.plan_item(item, target_folder, quality) == "download"])
+
+        def work(item):
+            if leases is None:
+                return _sync_item(client, item, target_folder, quality, tracker, tracer, events, hook_pipeline)
+            claim = leases.claim(item["id"])
+            if claim != CLAIMED:
+                return claim, None
+            try:
+                status, error = _sync_item(client, item, target_folder, quality, tracker, tracer, events, hook_pipeline)
+            except SyncCancelled:
+                leases.release(item["id"])
+                raise
+            leases.release(item["id"], done=status in ("downloaded", "skipped"))
+            return status, error
+
+        def start(item):
+            nonlocal done
+            if control is not None:
+                # Paused runs start no new items; transfers in flight pause per chunk
+                control.wait_if_paused(cancel_token)
+            progress = 10 + int((done / total_items) * 90)
+            filename = item.get("filename") or f"{item['id']}.mp4" # fallback
+            if callback: callback(f"Processing {filename}...", progress)
+
+            logging.info(f"Processing {done+1}/{total_items}: {filename}")
+            done += 1
+
+        def finish(item, result):
+            nonlocal downloaded, skipped, others
+            status, error = result
             if status == "downloaded":
                 downloaded += 1
             elif status == "skipped":
                 skipped += 1
+            elif status == HELD:
+                # Looked at again at the end, in case that node goes away
+                contested.append(item)
+                return
+            elif status == DONE:
+                others += 1
+                tracker.finish_file(item["id"], _item_size(item))
+                if events is not None:
+                    events.emit("item_end", id=item["id"], filename=item.get("filename"), status="other_node")
             else:
+                # Failures get another go at the end of the run
+                retry_queue.defer(item, error or "download failed")
+                return
+            retry_queue.resolve(item["id"])
+
+            if done % STATE_SAVE_INTERVAL == 0:
+                tiers.save()
+                index.save()
+                retry_queue.save()
+                if fingerprints is not None:
+                    fingerprints.save()
+                if dedup_store is not None:
+                    dedup_store.save()
+                if hook_pipeline is not None:
+                    hook_pipeline.save()
+                if journal is not None:
+                    journal.checkpoint()
+
+        run_concurrently(pending, start, work, finish, controller, cancel_token,
+                         lambda: tracker.bytes_transferred)
+
+        if contested:
+            logging.info(f"Waiting for {len(contested)} items other nodes are working on...")
+            if callback: callback(f"Waiting for {len(contested)} items other nodes are working on...", 99)
+        while contested:
+            # Each round either sees the other node finish, or takes over its expired lease
+            cancel_token.sleep(CONTESTED_POLL)
+            waiting, contested[:] = list(contested), []
+            run_concurrently(waiting, lambda item: None, work, finish, controller, cancel_token,
+                             lambda: tracker.bytes_transferred)
+
+        deferred = retry_queue.take()
+        if deferred:
+            logging.info(f"Retrying {len(deferred)} failed items...")
+            if callback: callback(f"Retrying {len(deferred)} failed items...", 99)
+            # Give a struggling CDN a moment before the deferred pass
+            retry_policy.wait(retry_policy.max_attempts, cancel_token=cancel_token)
+
+        def finish_deferred(item, result):
+            nonlocal downloaded, skipped, failed, others
+            status, error = result
+            if status == "downloaded":
+                downloaded += 1
+            elif status == "skipped":
+                skipped += 1
+            elif status in (HELD, DONE):
+                # Another node took the item over after it failed here
+                others += 1
+                if status == HELD:
+                    return
+            else:
+                retry_queue.defer(item, error or "download failed")
                 failed += 1
-        except Exception as e:
-            logging.error(f"Error syncing {filename}: {e}")
-            failed += 1
-            
+                return
+            retry_queue.resolve(item["id"])
+
+        run_concurrently(deferred, lambda item: None, work, finish_deferred, controller, cancel_token,
+                         lambda: tracker.bytes_transferred)
+
+        if hook_pipeline is not None:
+            if callback: callback("Waiting for post-download hooks...", 99)
+            if control is not None:
+                control.phase = "hooks"
+            hook_pipeline.wait()
+
+    except SyncCancelled:
+        # Partial downloads stay on disk and are resumed by the next run
+        if callback: callback("Sync cancelled.", 0)
+        logging.info("Sync cancelled by user.")
+        end_run("cancelled", items=total_items, downloaded=downloaded, skipped=skipped, failed=failed, others=others)
+        return False
+    finally:
+        if leases is not None:
+            leases.stop()
+        if resolver:
+            resolver.stop()
+        if reporter:
+            reporter.stop()
+        if hook_pipeline is not None:
+            hook_pipeline.close()
+        tiers.save()
+        index.save()
+        retry_queue.save()
+        if fingerprints is not None:
+            fingerprints.save()
+        if dedup_store is not None:
+            dedup_store.save()
+        if journal is not None:
+            journal.close()
+        if events is not None:
+            events.flush()
+
+    end_run("ok", items=total_items, downloaded=downloaded, skipped=skipped, failed=failed, others=others)
     if callback: callback("Sync complete.", 100)
-    logging.info(f"Sync finished. Processed {total_items}. Downloaded: {downloaded}, Skipped: {skipped}, Failed: {failed}")
+    logging.info(f"Sync finished. Processed {total_items}. Downloaded: {downloaded}, Skipped: {skipped}, Failed: {failed}"
+                 + (f", By other nodes: {others}" if leases is not None else ""))
+    if orphans:
+        logging.info(f"{orphans} local files belong to media deleted from the cloud (on_deleted={on_deleted}).")
+    if failed:
+        logging.info(f"{failed} failed items were saved to {retry_queue.path} and will be retried first next time.")
     return True
+
+def _item_size(item):
+    try:
+        return int(item.get("file_size") or 0)
+    except (TypeError, ValueError):
+        return 0
+
+def _synced_path(client, item, target_folder):
+    # Where the item ended up, which for a .360 is the media unpacked from it
+    path = client.local_index.get(item["id"]) if client.local_index is not None else None
+    return path if path else client.get_target_path(item, target_folder)
+
+def _sync_item(client, item, target_folder, quality, tracker, tracer=None, events=None, hooks=None):
+    """Runs one item through the client, returning (status, error)."""
+    tracker.start_file(item["id"], item.get("filename") or str(item["id"]), _item_size(item))
+    if events is not None:
+        events.emit("item_start", id=item["id"], filename=item.get("filename"), size=_item_size(item))
+    started = time.perf_counter()
+    try:
+        with span(tracer, "item", media_id=item["id"], filename=item.get("filename")) as s:
+            status, error = client.download_media_item(item, target_folder, quality=quality), None
+            s.args["status"] = status
+    except SyncCancelled:
+        tracker.abandon_file(item["id"])
+        if events is not None:
+            events.emit("item_end", id=item["id"], filename=item.get("filename"), status="cancelled",
+                        seconds=round(time.perf_counter() - started, 3), **client.pop_notes(item["id"]))
+        raise
+    except Exception as e:
+        logging.error(f"Error syncing {item.get('filename') or item['id']}: {e}")
+        status, error = "failed", e
+
+    if status in ("downloaded", "skipped"):
+        tracker.finish_file(item["id"], _item_size(item))
+    else:
+        tracker.abandon_file(item["id"])
+    if events is not None:
+        events.emit("item_end", id=item["id"], filename=item.get("filename"), status=status,
+                    seconds=round(time.perf_counter() - started, 3), size=_item_size(item),
+                    error=str(error) if error else None, **client.pop_notes(item["id"]))
+    if hooks is not None and status in ("downloaded", "skipped"):
+        hooks.submit(item, _synced_path(client, item, target_folder), new=status == "downloaded")
+    return status, error
+
+def plan_sync(auth_token, target_folder, quality=TIER_SOURCE, media_filter=None, verify=VERIFY_QUICK, storage=None,
+              auth_ttl=AUTH_TTL, upstream=None):
+    """
+    Dry run of sync_account: lists the account and sorts the items into
+    {"download": [...], "unpack": [...], "skip": [...]} with the same checks
+    a sync would make. Nothing is downloaded and no state is written; a
+    recent validation of the token is used, but not recorded.
+    Returns None when the token is invalid.
+    """
+    storage = storage or storage_for(target_folder)
+    client = GoProPlus(auth_token)
+    if upstream:
+        client.host = upstream.rstrip("/")
+    client.storage = storage
+    client.auth_cache = AuthCache(ttl=auth_ttl, read_only=True) if auth_ttl else None
+    client.tier_manifest = TierManifest(target_folder)
+    client.local_index = LocalIndex(target_folder)
+    if storage.is_local and verify != VERIFY_SIZE:
+        client.fingerprints = FingerprintCache(target_folder, rescan=verify == VERIFY_RESCAN)
+
+    if not client.validate():
+        logging.error("Invalid token.")
+        return None
+    media_list = client.get_media_list(media_filter=media_filter)
+    if client.token_rejected:
+        logging.error("Invalid token.")
+        return None
+    plan = {"download": [], "unpack": [], "skip": []}
+    for item in media_list:
+        plan[client.plan_item(item, target_folder, quality)].append(item)
+    return plan
+
+def upgrade_to_source(auth_token, target_folder, media_ids=(), callback=None, is_cancelled=None, cancel_token=None):
+    """
+    Replaces proxies fetched by an earlier proxy-tier sync with the source files.
+    media_ids limits the upgrade to those items; empty upgrades every proxy.
+    Meant to run as a later, lower priority pass (cron job or background thread).
+    """
+    return sync_account(auth_token, target_folder, callback=callback, is_cancelled=is_cancelled,
+                        upgrade_ids=list(media_ids), cancel_token=cancel_token)
@@ -0,0 +1,91 @@
+import threading
+from .state import state_path, load_json, update_json
+
+TIER_SOURCE = "source"
+
+# Special quality names understood by select_variation
+SMALLEST = "smallest"
+LARGEST = "largest"
+
+def _is_source(variation):
+    return variation.get("type") == TIER_SOURCE or variation.get("label") == TIER_SOURCE
+
+def _resolution(variation):
+    width = variation.get("width") or 0
+    height = variation.get("height") or 0
+    try:
+        return int(width) * int(height)
+    except (TypeError, ValueError):
+        return 0
+
+def variation_tier(variation):
+    """Name under which a downloaded variation is recorded in the tier manifest."""
+    if _is_source(variation):
+        return TIER_SOURCE
+    return variation.get("label") or variation.get("quality") or variation.get("type") or "proxy"
+
+def select_variation(variations, quality=TIER_SOURCE):
+    """
+    Picks the variation to download for the requested quality.
+    quality is "source", "smallest", "largest" or the label/quality/type of a
+    specific variation (e.g. "high_res_proxy_mp4"). Only variations with a
+    URL are considered. Returns None when nothing matches.
+    """
+    candidates = [v for v in variations or [] if v.get("url")]
+
+    if quality == TIER_SOURCE:
+        for v in candidates:
+            if _is_source(v):
+                return v
+        return None
+
+    proxies = [v for v in candidates if not _is_source(v)]
+    if quality == SMALLEST:
+        return min(proxies, key=_resolution) if proxies else None
+    if quality == LARGEST:
+        return max(proxies, key=_resolution) if proxies else None
+
+    for v in proxies:
+        if quality in (v.get("label"), v.get("quality"), v.get("type")):
+            return v
+    return None
+
+class TierManifest:
+    """
+    Records which tier each synced file has, persisted in the target folder
+    so later runs can upgrade proxies. Only proxies are stored; a file
+    without an entry is the source.
+    """
+    FILENAME = "tiers.json"
+
+    def __init__(self, target_folder):
+        self.path = state_path(target_folder, self.FILENAME)
+        self.entries = load_json(self.path, {})
+        self._changes = {} # media id -> entry, or None once it is the source, since the last save
+        self._lock = threading.Lock()
+
+    @property
+    def dirty(self):
+        return bool(self._changes)
+
+    def get(self, media_id):
+        entry = self.entries.get(str(media_id))
+        return entry["tier"] if entry else None
+
+    def set(self, media_id, tier, path):
+        with self._lock:
+            if tier == TIER_SOURCE:
+                if self.entries.pop(str(media_id), None) is not None:
+                    self._changes[str(media_id)] = None
+            else:
+                self.entries[str(media_id)] = self._changes[str(media_id)] = {"tier": tier, "path": path}
+
+    def proxies(self):
+        return list(self.entries)
+
+    def save(self):
+        # Merged with what other nodes sharing the target saved meanwhile
+        with self._lock:
+            if self._changes:
+                self.entries = update_json(self.path, self._changes)
+                self._changes = {}
@@ -0,0 +1,158 @@
+import time
+import logging
+import threading
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse, parse_qs
+from .tiers import select_variation, TIER_SOURCE
+
+# Signed URLs without a recognisable expiry are trusted for this long
+DEFAULT_TTL = 600
+# Refresh links this many seconds before they expire
+REFRESH_MARGIN = 120
+
+def signed_url_expiry(url):
+    """
+    Reads the expiry (epoch seconds) out of a signed URL. Understands CloudFront
+    and S3 v2 style "Expires=<epoch>" and S3 v4 "X-Amz-Date" + "X-Amz-Expires".
+    Returns None when the URL carries no expiry.
+    """
+    query = parse_qs(urlparse(url).query)
+
+    expires = query.get("Expires") or query.get("expires")
+    if expires and expires[0].isdigit():
+        return int(expires[0])
+
+    amz_date = query.get("X-Amz-Date")
+    amz_expires = query.get("X-Amz-Expires")
+    if amz_date and amz_expires and amz_expires[0].isdigit():
+        try:
+            signed_at = datetime.strptime(amz_date[0], "%Y%m%dT%H%M%SZ").replace(tzinfo=timezone.utc)
+            return int(signed_at.timestamp()) + int(amz_expires[0])
+        except ValueError:
+            return None
+
+    return None
+
+def source_url_from_download(data):
+    """
+    Picks the source file URL out of a /media/{id}/download response. Items made
+    of several files (bursts, dual lens captures) have no single source URL and
+    return None, leaving them to zip/source.
+    """
+    if not isinstance(data, dict):
+        return None
+    embedded = data.get("_embedded")
+    if not isinstance(embedded, dict):
+        return None
+
+    files = [f for f in embedded.get("files") or [] if isinstance(f, dict) and f.get("url")]
+    if len(files) == 1:
+        return files[0]["url"]
+    if files:
+        return None
+
+    variation = select_variation(embedded.get("variations") or [], TIER_SOURCE)
+    return variation.get("url") if variation else None
+
+class UrlResolver:
+    """
+    Keeps a valid direct download link for every upcoming item.
+    A background thread resolves links for the next `lookahead` items (and
+    re-resolves those about to expire) so download workers find a fresh link
+    in the cache instead of falling back to the zip endpoint.
+    """
+    def __init__(self, client, lookahead=32, workers=4, refresh_margin=REFRESH_MARGIN, default_ttl=DEFAULT_TTL):
+        self.client = client
+        self.lookahead = lookahead
+        self.workers = workers
+        self.refresh_margin = refresh_margin
+        self.default_ttl = default_ttl
+        self._cache = {}  # media_id -> (url, expires_at)
+        self._lock = threading.Lock()
+        self._items = []
+        self._positions = {}
+        self._position = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _fresh(self, media_id):
+        entry = self._cache.get(str(media_id))
+        return entry is not None and entry[1] - self.refresh_margin > time.time()
+
+    def _store(self, media_id, url):
+        # Items without a direct link are remembered too, so they are not asked for again
+        expires_at = (url and signed_url_expiry(url)) or time.time() + self.default_ttl
+        with self._lock:
+            self._cache[str(media_id)] = (url, expires_at)
+
+    def resolve(self, item):
+        """Fetches a fresh link for one item and caches it. Returns None if there is none."""
+        # A source URL from the listing is good as long as it has not expired
+        variation = select_variation(item.get("variations") or [], TIER_SOURCE)
+        if variation:
+            url = variation["url"]
+            expires_at = signed_url_expiry(url)
+            if expires_at is None or expires_at - self.refresh_margin > time.time():
+                self._store(item["id"], url)
+                return url
+
+        try:
+            url = source_url_from_download(self.client.get_media_download(item["id"]))
+        except Exception as e:
+            logging.debug(f"Could not resolve download URL for {item['id']}: {e}")
+            url = None
+
+        self._store(item["id"], url)
+        return url
+
+    def prefetch(self, items):
+        """Resolves all items without a fresh link, several at a time."""
+        stale = [item for item in items if not self._fresh(item["id"])]
+        if not stale:
+            return
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            list(pool.map(self.resolve, stale))
+
+    def get(self, item):
+        """Returns a valid direct link for item, resolving it now if needed."""
+        index = self._positions.get(str(item["id"]))
+        if index is not None and index > self._position:
+            self._position = index
+
+        with self._lock:
+            entry = self._cache.get(str(item["id"]))
+        if entry and entry[1] - self.refresh_margin > time.time():
+            return entry[0]
+        return self.resolve(item)
+
+    def invalidate(self, media_id):
+        # Called when a cached link was refused, e.g. revoked before its expiry
+        with self._lock:
+            self._cache.pop(str(media_id), None)
+
+    def start(self, items):
+        """Starts resolving ahead of the download loop, which walks items in order."""
+        self._items = list(items)
+        self._positions = {str(item["id"]): i for i, item in enumerate(self._items)}
+        self._position = 0
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="url-resolver", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            window = self._items[self._position:self._position + self.lookahead]
+            stale = [item for item in window if not self._fresh(item["id"])]
+            if stale:
+                try:
+                    self.prefetch(stale)
+                except Exception as e:
+                    logging.warning(f"URL prefetch failed: {e}")
+            self._stop.wait(1.0)
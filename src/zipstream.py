@@ -0,0 +1,239 @@
+import struct
+import zlib
+import zipfile
+
+# Entries are read front to back from a plain stream (e.g. an HTTP response),
+# so a ZIP never has to be stored before it is unpacked. Memory stays at a
+# few read buffers whatever the size of the archive.
+
+LOCAL_HEADER = b"PK\x03\x04"
+DATA_DESCRIPTOR = b"PK\x07\x08"
+READ_SIZE = 64 * 1024
+
+STORED = zipfile.ZIP_STORED
+DEFLATED = zipfile.ZIP_DEFLATED
+
+class _Source:
+    """Read side of the stream, with pushback for bytes read too far."""
+    def __init__(self, fileobj):
+        self._fileobj = fileobj
+        self._pushed = b""
+
+    def read(self, size=-1):
+        if self._pushed:
+            if size is None or size < 0:
+                data, self._pushed = self._pushed, b""
+                return data + self._fileobj.read()
+            data, self._pushed = self._pushed[:size], self._pushed[size:]
+            return data
+        return self._fileobj.read(size)
+
+    def unread(self, data):
+        if data:
+            self._pushed = bytes(data) + self._pushed
+
+    def read_exact(self, size):
+        data = b""
+        while len(data) < size:
+            chunk = self.read(size - len(data))
+            if not chunk:
+                raise zipfile.BadZipFile("Unexpected end of ZIP stream")
+            data += chunk
+        return data
+
+class ZipStreamEntry:
+    """File-like reader for one entry; only valid until the next entry is requested."""
+    def __init__(self, source, name, method, flags, crc, compressed_size, size, zip64):
+        self.name = name
+        self._source = source
+        self._method = method
+        self._has_descriptor = bool(flags & 0x08)
+        self._crc = crc
+        self._compressed_size = compressed_size
+        self._size = size
+        self._zip64 = zip64
+        self._chunks = self._decompressed()
+        self._buffer = b""
+        self._done = False
+
+    def read(self, size=-1):
+        while not self._done and (size is None or size < 0 or len(self._buffer) < size):
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                self._done = True
+            else:
+                self._buffer += chunk
+        if size is None or size < 0:
+            data, self._buffer = self._buffer, b""
+        else:
+            data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+    def drain(self):
+        # Skips whatever the caller did not read, so the next header lines up
+        for _ in self._chunks:
+            pass
+        self._done = True
+        self._buffer = b""
+
+    def _raw(self, known_size):
+        remaining = known_size
+        while remaining:
+            chunk = self._source.read(min(READ_SIZE, remaining))
+            if not chunk:
+                raise zipfile.BadZipFile(f"Truncated ZIP entry {self.name}")
+            remaining -= len(chunk)
+            yield chunk
+
+    def _decompressed(self):
+        crc = 0
+        length = 0
+        sizes_known = not self._has_descriptor or self._compressed_size
+
+        if self._method == STORED and not sizes_known:
+            chunks = self._stored_until_descriptor()
+        elif self._method == STORED:
+            chunks = self._raw(self._compressed_size)
+        else:
+            chunks = self._inflate(self._raw(self._compressed_size) if sizes_known else None)
+
+        for chunk in chunks:
+            crc = zlib.crc32(chunk, crc)
+            length += len(chunk)
+            yield chunk
+
+        if self._has_descriptor and not (self._method == STORED and not sizes_known):
+            self._read_descriptor()
+        if crc != self._crc or length != self._size:
+            raise zipfile.BadZipFile(f"Bad CRC or size for ZIP entry {self.name}")
+
+    def _inflate(self, raw_chunks):
+        # Deflate streams end by themselves, so entries with a trailing
+        # data descriptor need no size up front
+        inflater = zlib.decompressobj(-zlib.MAX_WBITS)
+        consumed = 0
+        while not inflater.eof:
+            chunk = next(raw_chunks, b"") if raw_chunks is not None else self._source.read(READ_SIZE)
+            if not chunk:
+                raise zipfile.BadZipFile(f"Truncated ZIP entry {self.name}")
+            data = inflater.decompress(chunk)
+            consumed += len(chunk) - len(inflater.unused_data)
+            if data:
+                yield data
+        if raw_chunks is None:
+            self._source.unread(inflater.unused_data)
+            self._compressed_size = consumed
+
+    def _stored_until_descriptor(self):
+        # Stored data of unknown length ends at the first data descriptor whose
+        # CRC and size agree with the data before it
+        pending = b""
+        emitted = 0
+        crc = 0
+        size_len = 8 if self._zip64 else 4
+        descriptor_len = 4 + 4 + 2 * size_len
+        eof = False
+        start = 0
+        while True:
+            at = pending.find(DATA_DESCRIPTOR, start)
+            if at >= 0 and (len(pending) >= at + descriptor_len or eof):
+                if len(pending) >= at + descriptor_len:
+                    fields = pending[at + 4:at + descriptor_len]
+                    found_crc = struct.unpack("<I", fields[:4])[0]
+                    fmt = "<QQ" if self._zip64 else "<II"
+                    compressed, size = struct.unpack(fmt, fields[4:])
+                    data_crc = zlib.crc32(pending[:at], crc)
+                    if compressed == size == emitted + at and found_crc == data_crc:
+                        self._crc = found_crc
+                        self._size = size
+                        if at:
+                            yield pending[:at]
+                        self._source.unread(pending[at + descriptor_len:])
+                        return
+                start = at + 1
+                continue
+            if at < 0:
+                # Everything but a possible partial signature at the end is data
+                keep = len(pending) - 3
+                if keep > 0:
+                    crc = zlib.crc32(pending[:keep], crc)
+                    emitted += keep
+                    yield pending[:keep]
+                    pending = pending[keep:]
+                start = 0
+            if eof:
+                raise zipfile.BadZipFile(f"No data descriptor after ZIP entry {self.name}")
+            chunk = self._source.read(READ_SIZE)
+            if not chunk:
+                eof = True
+            pending += chunk
+
+    def _read_descriptor(self):
+        first = self._source.read_exact(4)
+        if first != DATA_DESCRIPTOR:
+            self._source.unread(first)
+        size_len = 8 if self._zip64 else 4
+        fields = self._source.read_exact(4 + 2 * size_len)
+        fmt = "<IQQ" if self._zip64 else "<III"
+        self._crc, compressed, self._size = struct.unpack(fmt, fields)
+
+class ZipStream:
+    """
+    Sequential reader for ZIP data arriving as a stream. Iterating yields a
+    ZipStreamEntry per file, read straight off the stream. Raises
+    zipfile.BadZipFile for damaged or unsupported (encrypted) archives.
+    """
+    def __init__(self, fileobj):
+        self.source = _Source(fileobj)
+
+    def is_zip(self):
+        """Peeks at the first bytes without consuming them."""
+        head = self.source.read(4)
+        while head and len(head) < 4:
+            more = self.source.read(4 - len(head))
+            if not more:
+                break
+            head += more
+        self.source.unread(head)
+        return head == LOCAL_HEADER
+
+    def __iter__(self):
+        while True:
+            signature = self.source.read(4)
+            if len(signature) < 4:
+                signature += self.source.read(4 - len(signature))
+            if signature != LOCAL_HEADER:
+                # The central directory (or the end of the data) follows the last entry
+                return
+
+            (_, flags, method, _, _, crc, compressed_size, size,
+             name_len, extra_len) = struct.unpack("<HHHHHIIIHH", self.source.read_exact(26))
+            raw_name = self.source.read_exact(name_len)
+            extra = self.source.read_exact(extra_len)
+            name = raw_name.decode("utf-8" if flags & 0x800 else "cp437")
+
+            if flags & 0x01:
+                raise zipfile.BadZipFile(f"Encrypted ZIP entry {name} is not supported")
+            if method not in (STORED, DEFLATED):
+                raise zipfile.BadZipFile(f"Unsupported compression {method} for ZIP entry {name}")
+
+            zip64 = False
+            for field_id, data in _extra_fields(extra):
+                if field_id == 0x0001:
+                    zip64 = True
+                    values = list(struct.unpack(f"<{len(data) // 8}Q", data[:len(data) // 8 * 8]))
+                    if size == 0xFFFFFFFF and values:
+                        size = values.pop(0)
+                    if compressed_size == 0xFFFFFFFF and values:
+                        compressed_size = values.pop(0)
+
+            entry = ZipStreamEntry(self.source, name, method, flags, crc, compressed_size, size, zip64)
+            yield entry
+            entry.drain()
+
+def _extra_fields(extra):
+    offset = 0
+    while offset + 4 <= len(extra):
+        field_id, length = struct.unpack("<HH", extra[offset:offset + 4])
+        yield field_id, extra[offset + 4:offset + 4 + length]
+        offset += 4 + length
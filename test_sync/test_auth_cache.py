@@ -0,0 +1,104 @@
+import os
+import json
+import time
+import base64
+import tempfile
+import unittest
+from unittest.mock import patch, MagicMock
+from src.auth_cache import AuthCache, token_expiry, AUTH_COOKIE
+from src.gopro_client import GoProPlus
+
+def jwt(**claims):
+    encode = lambda data: base64.urlsafe_b64encode(json.dumps(data).encode()).rstrip(b"=").decode()
+    return f"{encode({'alg': 'HS256'})}.{encode(claims)}.signature"
+
+def response(status_code, body=None):
+    resp = MagicMock()
+    resp.status_code = status_code
+    resp.json.return_value = body or {}
+    resp.raw.tell.return_value = len(json.dumps(resp.json.return_value))
+    return resp
+
+def page(items):
+    return response(200, {"_embedded": {"media": items}, "_pages": {"total_pages": 1}})
+
+class TestAuthCache(unittest.TestCase):
+    """Test cases for cached token validation"""
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.cache_path = os.path.join(self.folder.name, "auth.json")
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def client(self, token="token", ttl=3600):
+        client = GoProPlus(token)
+        client.auth_cache = AuthCache(self.cache_path, ttl=ttl)
+        return client
+
+    def test_token_expiry(self):
+        """Test reading the expiry out of a JWT, and tokens that are not JWTs"""
+        self.assertEqual(token_expiry(jwt(exp=1900000000, sub="user")), 1900000000)
+        self.assertIsNone(token_expiry(jwt(sub="user")))
+        self.assertIsNone(token_expiry("opaque-token"))
+
+    @patch('requests.get')
+    def test_cached_validation(self, mock_get):
+        """Test that a recent validation and the session are reused, and the style that worked is tried first"""
+        mock_get.side_effect = [response(404), response(200)]
+        self.assertTrue(self.client().validate())
+        self.assertEqual(mock_get.call_count, 2)
+        with open(self.cache_path) as f:
+            self.assertNotIn("token", f.read())
+
+        # The next run starts without a single request
+        client = self.client()
+        self.assertTrue(client.validate())
+        self.assertEqual(client.auth_method, AUTH_COOKIE)
+        self.assertEqual(mock_get.call_count, 2)
+        # and with the page size an earlier listing settled on
+        client.page_size = 100
+        client.save_session()
+        client = self.client()
+        client.validate()
+        self.assertEqual(client.page_size, 100)
+
+        # Once the entry is stale, /media/user is asked straight away
+        mock_get.side_effect = [response(200)]
+        self.assertTrue(self.client(ttl=0).validate())
+        self.assertEqual(mock_get.call_args[0][0], "https://api.gopro.com/media/user")
+
+    @patch('requests.get')
+    def test_expiring_token_is_checked(self, mock_get):
+        """Test that a token about to expire is validated again despite the cache"""
+        token = jwt(exp=int(time.time()) + 60)
+        mock_get.return_value = response(200, {"id": "user"})
+        self.assertTrue(self.client(token).validate())
+        self.assertTrue(self.client(token).validate())
+        self.assertEqual(mock_get.call_count, 2)
+
+    @patch('src.gopro_client.time.sleep')
+    @patch('requests.get')
+    def test_revalidate_on_401(self, mock_get, mock_sleep):
+        """Test that a 401 validates the token again, and a revoked token ends the listing"""
+        self.client().auth_cache.update("token", method="bearer", validated_at=time.time())
+
+        # Still valid: the refused page is asked for again
+        mock_get.side_effect = [response(401), response(200, {"id": "user"}), page([{"id": "a"}])]
+        client = self.client()
+        self.assertTrue(client.validate())
+        self.assertEqual([item["id"] for item in client.get_media_list()], ["a"])
+        self.assertFalse(client.token_rejected)
+
+        # Revoked: one check, no retry, and the cached validation is gone
+        mock_get.reset_mock()
+        mock_get.side_effect = [response(401), response(401), response(401)]
+        client = self.client()
+        self.assertEqual(client.get_media_list(), [])
+        self.assertTrue(client.token_rejected)
+        self.assertEqual(mock_get.call_count, 3)
+        self.assertIsNone(client.auth_cache.fresh("token"))
+
+if __name__ == '__main__':
+    unittest.main()
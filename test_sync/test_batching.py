@@ -0,0 +1,124 @@
+import unittest
+import io
+import os
+import tempfile
+import zipfile
+from unittest.mock import patch, MagicMock
+from src.batching import plan_batches
+from src.gopro_client import GoProPlus
+from src.sync import sync_account
+from src.tiers import TierManifest
+
+def make_zip(entries):
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, 'w') as z:
+        for name, data in entries.items():
+            z.writestr(name, data)
+    return buf.getvalue()
+
+def zip_response(payload, status_code=200):
+    response = MagicMock()
+    response.status_code = status_code
+    response.headers = {"Content-Type": "application/zip"}
+    response.iter_content.return_value = [payload]
+    response.__enter__.return_value = response
+    return response
+
+class TestBatching(unittest.TestCase):
+    """Test cases for batched zip downloads of small items"""
+
+    def test_plan_batches_respects_limits(self):
+        """Test that small items are grouped within the byte budget"""
+        items = [{"id": f"m{i}", "file_size": 40} for i in range(5)]
+        items.append({"id": "big", "file_size": 1000})
+        items.append({"id": "unknown"})
+
+        batches, remaining = plan_batches(items, threshold=100, max_bytes=100)
+        self.assertEqual([[i["id"] for i in b] for b in batches], [["m0", "m1"], ["m2", "m3"]])
+        self.assertEqual([i["id"] for i in remaining], ["big", "unknown", "m4"])
+
+    def test_plan_batches_max_items(self):
+        """Test that the item count per batch is capped"""
+        items = [{"id": f"m{i}", "file_size": 1} for i in range(5)]
+        batches, remaining = plan_batches(items, threshold=10, max_bytes=100, max_items=2)
+        self.assertEqual([len(b) for b in batches], [2, 2])
+        self.assertEqual(len(remaining), 1)
+
+    @patch('requests.get')
+    def test_download_batch_extracts_entries(self, mock_get):
+        """Test that every zip entry is written to the path of its item"""
+        mock_get.return_value = zip_response(make_zip({"A.JPG": b"aaa", "B.JPG": b"bb"}))
+        client = GoProPlus("token")
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            batch = [
+                ({"id": "a", "filename": "A.JPG"}, os.path.join(temp_dir, "A.JPG")),
+                ({"id": "b", "filename": "B.JPG"}, os.path.join(temp_dir, "B.JPG")),
+                ({"id": "c", "filename": "C.JPG"}, os.path.join(temp_dir, "C.JPG")),
+            ]
+            written = client.download_batch(batch)
+
+            self.assertEqual(written, {"a", "b"})
+            with open(os.path.join(temp_dir, "A.JPG"), 'rb') as f:
+                self.assertEqual(f.read(), b"aaa")
+            self.assertEqual(sorted(os.listdir(temp_dir)), ["A.JPG", "B.JPG"])
+            self.assertEqual(mock_get.call_args[1]["params"]["ids"], "a,b,c")
+
+    @patch('requests.get')
+    def test_download_batch_failure(self, mock_get):
+        """Test that a failed batch reports nothing as written"""
+        mock_get.return_value = zip_response(b"", status_code=500)
+        client = GoProPlus("token")
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            batch = [({"id": "a", "filename": "A.JPG"}, os.path.join(temp_dir, "A.JPG"))]
+            self.assertEqual(client.download_batch(batch), set())
+
+    def test_sync_falls_back_for_failed_batch_items(self):
+        """Test that items missing from a batch are fetched individually"""
+        with tempfile.TemporaryDirectory() as test_folder:
+            with patch('src.sync.GoProPlus') as mock_client_class:
+                mock_client = MagicMock()
+                mock_client.token_rejected = False
+                mock_client.listing_complete = False
+                mock_client.validate.return_value = True
+                mock_client.get_media_list.return_value = [
+                    {"id": "a", "filename": "A.JPG", "file_size": 10},
+                    {"id": "b", "filename": "B.JPG", "file_size": 10},
+                ]
+                mock_client.is_synced.return_value = False
+                mock_client.download_batch.return_value = {"a"}
+                mock_client.download_media_item.return_value = "downloaded"
+                mock_client_class.return_value = mock_client
+
+                result = sync_account("token", test_folder, batch_small_files=True)
+                self.assertTrue(result)
+                mock_client.download_batch.assert_called_once()
+                mock_client.download_media_item.assert_called_once()
+                self.assertEqual(mock_client.download_media_item.call_args[0][0]["id"], "b")
+
+    @patch('requests.get')
+    def test_batched_source_pass_replaces_proxy(self, mock_get):
+        """Test that a batch fetching a proxied item records it as the source in tiers.json"""
+        mock_get.return_value = zip_response(make_zip({"A.JPG": b"source", "B.JPG": b"bb"}))
+        with tempfile.TemporaryDirectory() as test_folder:
+            with open(os.path.join(test_folder, "A.JPG"), 'wb') as f:
+                f.write(b"low")
+            manifest = TierManifest(test_folder)
+            manifest.set("a", "edit_proxy", os.path.join(test_folder, "A.JPG"))
+            manifest.save()
+
+            items = [{"id": "a", "filename": "A.JPG", "file_size": 6}, {"id": "b", "filename": "B.JPG", "file_size": 2}]
+            client = GoProPlus("token")
+            with patch('src.sync.GoProPlus', return_value=client), \
+                 patch.object(client, 'validate', return_value=True), \
+                 patch.object(client, 'get_media_list', return_value=items):
+                self.assertTrue(sync_account("token", test_folder, batch_small_files=True))
+            self.assertEqual(mock_get.call_count, 1)
+
+            with open(os.path.join(test_folder, "A.JPG"), 'rb') as f:
+                self.assertEqual(f.read(), b"source")
+            self.assertIsNone(TierManifest(test_folder).get("a"))
+
+if __name__ == '__main__':
+    unittest.main()
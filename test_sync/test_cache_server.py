@@ -0,0 +1,130 @@
+import os
+import json
+import tempfile
+import threading
+import unittest
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from unittest.mock import patch
+import requests
+from src.cache_server import CacheServer, parse_range
+from src.gopro_client import GoProPlus
+
+PAYLOADS = {"1": bytes(range(256)) * 2048, "2": b"photo" * 1000}
+
+class FakeCloud(BaseHTTPRequestHandler):
+    """API and CDN in one, counting the media bytes it sends."""
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, code, body, content_type="application/json"):
+        self.send_response(code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        base = f"http://127.0.0.1:{self.server.server_address[1]}"
+        path = self.path.split("?")[0]
+        if path.startswith("/cdn/"):
+            # Signed links, no credentials
+            payload = PAYLOADS[path.split("/")[2]]
+            self.server.sent += len(payload)
+            return self._send(200, payload, "video/mp4")
+        if self.headers.get("Authorization") != "Bearer token":
+            return self._send(401, b"{}")
+        if path == "/me":
+            return self._send(200, b'{"id": "user"}')
+        if path == "/media/search":
+            media = [{"id": media_id, "filename": f"GX0{media_id}.MP4", "file_size": len(payload)}
+                     for media_id, payload in PAYLOADS.items()]
+            return self._send(200, json.dumps({"_embedded": {"media": media}, "_pages": {"total_pages": 1}}).encode())
+        if path.startswith("/media/"):
+            media_id = path.split("/")[2]
+            data = {"_embedded": {"files": [{"url": f"{base}/cdn/{media_id}?Expires=9999999999", "item_number": 1}],
+                                  "variations": [{"label": "proxy", "height": 480, "url": f"{base}/cdn/{media_id}"}]}}
+            return self._send(200, json.dumps(data).encode())
+        self._send(404, b"{}")
+
+class TestCacheServer(unittest.TestCase):
+    """Test cases for the LAN read-through media cache"""
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.cloud = ThreadingHTTPServer(("127.0.0.1", 0), FakeCloud)
+        self.cloud.sent = 0
+        threading.Thread(target=self.cloud.serve_forever, daemon=True).start()
+        self.node = os.path.join(self.folder.name, "node")
+        self.cache = CacheServer("token", self.node, "127.0.0.1", 0, cloud=f"http://127.0.0.1:{self.cloud.server_address[1]}")
+        self.cache.start()
+        patcher = patch('src.gopro_client.API_DELAY', 0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.cache.stop()
+        self.cloud.shutdown()
+        self.cloud.server_close()
+        self.folder.cleanup()
+
+    def client(self):
+        client = GoProPlus("token")
+        client.host = self.cache.address
+        return client
+
+    def test_clients_share_one_cloud_fetch(self):
+        """Test that several clients syncing through the cache pull each file from the cloud once"""
+        for n in range(3):
+            client = self.client()
+            self.assertTrue(client.validate())
+            items = client.get_media_list()
+            self.assertEqual([item["id"] for item in items], ["1", "2"])
+            target = os.path.join(self.folder.name, f"workstation{n}")
+            os.makedirs(target)
+            for item in items:
+                self.assertEqual(client.download_media_item(item, target), "downloaded")
+                with open(os.path.join(target, item["filename"]), 'rb') as f:
+                    self.assertEqual(f.read(), PAYLOADS[item["id"]])
+
+        self.assertEqual(self.cloud.sent, sum(len(payload) for payload in PAYLOADS.values()))
+        self.assertEqual((self.cache.stats["misses"], self.cache.stats["hits"]), (2, 4))
+
+        # Once the node's own sync has the file, the blob is dropped and the synced copy served
+        self.cache.client.host = self.cache.address
+        os.makedirs(self.node, exist_ok=True)
+        self.assertEqual(self.cache.client.download_media_item(items[0], self.node), "downloaded")
+        self.cache.client.local_index = None
+        with open(os.path.join(self.node, ".gopro-sync", "index.json"), 'w') as f:
+            json.dump({"1": {"path": os.path.join(self.node, "GX01.MP4")}}, f)
+        self.assertEqual(self.cache.prune(), 1)
+        late = os.path.join(self.folder.name, "late")
+        os.makedirs(late)
+        item = self.client().get_media_list()[0]
+        self.assertEqual(self.client().download_media_item(item, late), "downloaded")
+        self.assertEqual(self.cloud.sent, sum(len(payload) for payload in PAYLOADS.values()))
+
+    def test_ranges_and_links(self):
+        """Test range requests, signed links and parse_range edge cases"""
+        client = self.client()
+        client.validate()
+        client.get_media_list()
+        data = client.get_media_download("1")
+        link = data["_embedded"]["files"][0]["url"]
+        self.assertTrue(link.startswith(self.cache.address + "/cache/1/source?"))
+        self.assertEqual(client._read_range(link, 1000, 300, "1"), PAYLOADS["1"][1000:1300])
+        self.assertEqual(requests.get(link, headers={"Range": "bytes=-5"}).content, PAYLOADS["1"][-5:])
+        self.assertEqual(requests.get(link, headers={"Range": f"bytes={len(PAYLOADS['1'])}-"}).status_code, 416)
+        self.assertEqual(requests.get(link.replace("Signature=", "Signature=0")).status_code, 403)
+        self.assertEqual(requests.get(self.cache.address + "/media/search").status_code, 401)
+
+        self.assertIsNone(parse_range(None, 10))
+        self.assertIsNone(parse_range("bytes=0-1,4-5", 10))
+        self.assertEqual(parse_range("bytes=2-", 10), (2, 9))
+        self.assertEqual(parse_range("bytes=2-100", 10), (2, 9))
+        with self.assertRaises(ValueError):
+            parse_range("bytes=10-", 10)
+
+if __name__ == '__main__':
+    unittest.main()
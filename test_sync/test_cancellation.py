@@ -0,0 +1,143 @@
+import unittest
+import os
+import tempfile
+import zipfile
+from unittest.mock import patch, MagicMock
+from src.gopro_client import GoProPlus
+from src.cancellation import CancelToken, SyncCancelled
+from src.sync import sync_account
+
+def stream_response(chunks, status_code=200, headers=None):
+    response = MagicMock()
+    response.status_code = status_code
+    response.headers = headers or {}
+    response.iter_content.return_value = chunks
+    response.__enter__.return_value = response
+    return response
+
+class TestCancellation(unittest.TestCase):
+    """Test cases for mid-transfer cancellation and resuming partial files"""
+
+    def test_token(self):
+        """Test cancel, polling callables and interruptible sleeps"""
+        token = CancelToken()
+        self.assertFalse(token.cancelled)
+        token.cancel()
+        self.assertTrue(token.cancelled)
+        with self.assertRaises(SyncCancelled):
+            token.sleep(10)
+
+        flag = {"stop": False}
+        polled = CancelToken(lambda: flag["stop"])
+        polled.raise_if_cancelled()
+        flag["stop"] = True
+        with self.assertRaises(SyncCancelled):
+            polled.raise_if_cancelled()
+
+    @patch('requests.get')
+    def test_cancel_within_chunk_keeps_partial(self, mock_get):
+        """Test that a cancel stops the transfer mid-file and keeps the .part file"""
+        client = GoProPlus("token")
+        client.cancel_token = CancelToken()
+
+        def chunks():
+            yield b"first"
+            client.cancel_token.cancel()
+            yield b"second"
+            yield b"third"
+        mock_get.return_value = stream_response(chunks())
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            final_path = os.path.join(temp_dir, "a.mp4")
+            with self.assertRaises(SyncCancelled):
+                client._download_direct("https://cdn/a", final_path, "a")
+            self.assertFalse(os.path.exists(final_path))
+            with open(final_path + ".part", 'rb') as f:
+                self.assertEqual(f.read(), b"first")
+        # Cancellation is not treated as a retryable failure
+        self.assertEqual(mock_get.call_count, 1)
+
+    @patch('requests.get')
+    def test_resume_with_range(self, mock_get):
+        """Test that a partial file is resumed with a Range request"""
+        mock_get.return_value = stream_response([b"-rest"], 206, {"Content-Range": "bytes 5-9/10"})
+        client = GoProPlus("token")
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            final_path = os.path.join(temp_dir, "a.mp4")
+            with open(final_path + ".part", 'wb') as f:
+                f.write(b"first")
+
+            self.assertTrue(client._download_direct("https://cdn/a", final_path, "a"))
+            with open(final_path, 'rb') as f:
+                self.assertEqual(f.read(), b"first-rest")
+            self.assertFalse(os.path.exists(final_path + ".part"))
+        self.assertEqual(mock_get.call_args[1]["headers"]["Range"], "bytes=5-")
+
+    @patch('requests.get')
+    def test_resume_restarts_when_range_ignored(self, mock_get):
+        """Test that a full response replaces the partial file instead of appending"""
+        mock_get.return_value = stream_response([b"whole-file"], 200)
+        client = GoProPlus("token")
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            final_path = os.path.join(temp_dir, "a.mp4")
+            with open(final_path + ".part", 'wb') as f:
+                f.write(b"stale")
+
+            self.assertTrue(client._download_direct("https://cdn/a", final_path, "a"))
+            with open(final_path, 'rb') as f:
+                self.assertEqual(f.read(), b"whole-file")
+
+    @patch('requests.get')
+    def test_resume_extracts_complete_zip(self, mock_get):
+        """Test that a fully downloaded zip from a cancelled run is only extracted"""
+        mock_get.return_value = stream_response([], 416)
+        client = GoProPlus("token")
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            target = os.path.join(temp_dir, "GX01.MP4")
+            with zipfile.ZipFile(target + ".temp", 'w') as z:
+                z.writestr("GX01.MP4", b"video")
+
+            self.assertTrue(client.download_file("m1", target))
+            with open(target, 'rb') as f:
+                self.assertEqual(f.read(), b"video")
+            self.assertFalse(os.path.exists(target + ".temp"))
+
+    def test_cancel_during_360_extraction(self):
+        """Test that cancelling a .360 extraction restores the .360 file"""
+        client = GoProPlus("token")
+        client.cancel_token = CancelToken()
+        client.cancel_token.cancel()
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, "test.360")
+            with zipfile.ZipFile(path, 'w') as z:
+                z.writestr("test_media.mp4", "test content")
+
+            with self.assertRaises(SyncCancelled):
+                client._handle_360_file(path)
+            self.assertEqual(os.listdir(temp_dir), ["test.360"])
+
+    def test_sync_stops_on_cancel(self):
+        """Test that a cancel raised inside a download ends the sync"""
+        with tempfile.TemporaryDirectory() as test_folder:
+            with patch('src.sync.GoProPlus') as mock_client_class:
+                mock_client = MagicMock()
+                mock_client.token_rejected = False
+                mock_client.listing_complete = False
+                mock_client.validate.return_value = True
+                mock_client.get_media_list.return_value = [{"id": "a"}, {"id": "b"}]
+                mock_client.download_media_item.side_effect = SyncCancelled()
+                mock_client_class.return_value = mock_client
+
+                messages = []
+                result = sync_account("token", test_folder, callback=lambda m, p: messages.append(m),
+                                      resolve_urls=False)
+                self.assertFalse(result)
+                self.assertEqual(messages[-1], "Sync cancelled.")
+                mock_client.download_media_item.assert_called_once()
+
+if __name__ == '__main__':
+    unittest.main()
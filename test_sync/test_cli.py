@@ -13,6 +13,19 @@ sys.modules['keyring.errors'] = MagicMock()
 
 from src.cli import get_token, set_token, main
 
+def set_option_defaults(mock_args):
+    # Options that switch features on would otherwise be truthy MagicMocks
+    mock_args.report = None
+    mock_args.plan = False
+    mock_args.events = None
+    mock_args.dedup = False
+    mock_args.dedup_index = None
+    mock_args.hook = []
+    mock_args.control = None
+    mock_args.limit_rate = None
+    mock_args.serve_cache = None
+    mock_args.upstream = None
+
 class TestCLI(unittest.TestCase):
     """Test cases for the CLI module"""
 
@@ -91,6 +104,8 @@ class TestCLI(unittest.TestCase):
         mock_args.save_token = False
         mock_args.folder = "/test/folder"
         mock_args.verbose = False
+        mock_args.profile = None
+        set_option_defaults(mock_args)
         mock_parse_args.return_value = mock_args
 
         # Mock sync_account to return True
@@ -118,6 +133,8 @@ class TestCLI(unittest.TestCase):
         mock_args.save_token = False
         mock_args.folder = "/test/folder"
         mock_args.verbose = False
+        mock_args.profile = None
+        set_option_defaults(mock_args)
         mock_parse_args.return_value = mock_args
 
         # Mock sync_account to return False
@@ -142,6 +159,8 @@ class TestCLI(unittest.TestCase):
         mock_args.save_token = False
         mock_args.folder = "/test/folder"
         mock_args.verbose = False
+        mock_args.profile = None
+        set_option_defaults(mock_args)
         mock_parse_args.return_value = mock_args
 
         # Mock argv
@@ -166,6 +185,8 @@ class TestCLI(unittest.TestCase):
         mock_args.save_token = True
         mock_args.folder = "/test/folder"
         mock_args.verbose = False
+        mock_args.profile = None
+        set_option_defaults(mock_args)
         mock_parse_args.return_value = mock_args
 
         # Mock sync_account to return True
@@ -0,0 +1,132 @@
+import time
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch, MagicMock
+from src.concurrency import AimdController, run_concurrently, PROBE_AFTER
+from src.cancellation import CancelToken, SyncCancelled
+from src.retry import DownloadError
+from src.sync import sync_account
+
+MB = 1024 * 1024
+
+class Feed:
+    """Drives a controller with a given throughput per interval."""
+    def __init__(self, controller):
+        self.controller = controller
+        self.now = 0.0
+        self.bytes = 0
+        controller.update(0, 0.0)
+
+    def interval(self, rate):
+        self.now += self.controller.interval
+        self.bytes += rate * self.controller.interval
+        return self.controller.update(self.bytes, self.now)
+
+class TestConcurrency(unittest.TestCase):
+    """Test cases for the AIMD concurrency controller and the download engine"""
+
+    def test_additive_increase_until_plateau(self):
+        """Test that streams are added while throughput improves and held on a plateau"""
+        controller = AimdController(floor=1, ceiling=8)
+        feed = Feed(controller)
+        self.assertEqual(feed.interval(10 * MB), 2)
+        self.assertEqual(feed.interval(20 * MB), 3)
+        self.assertEqual(feed.interval(30 * MB), 4)
+        # The link is saturated: no more streams, but no cut either
+        self.assertEqual(feed.interval(30 * MB), 4)
+        self.assertEqual(feed.interval(30 * MB), 4)
+        for _ in range(PROBE_AFTER - 2):
+            feed.interval(30 * MB)
+        self.assertEqual(controller.level, 5)
+
+    def test_multiplicative_decrease(self):
+        """Test that errors, 429s and a collapsing per-stream rate halve the level"""
+        controller = AimdController(floor=2, ceiling=16, initial=8)
+        feed = Feed(controller)
+        feed.interval(80 * MB)
+        self.assertEqual(controller.level, 9)
+        controller.record_error(DownloadError("HTTP 429", 429))
+        self.assertEqual(feed.interval(80 * MB), 4)
+        controller.record_error(TimeoutError())
+        self.assertEqual(feed.interval(80 * MB), 2)
+        controller.record_error(TimeoutError())
+        self.assertEqual(feed.interval(80 * MB), 2) # floor
+
+        controller = AimdController(floor=1, ceiling=16, initial=8)
+        feed = Feed(controller)
+        feed.interval(80 * MB)
+        self.assertEqual(feed.interval(20 * MB), 4)
+
+    def test_ceiling_and_metrics(self):
+        """Test the ceiling and that changes reach the metric listener"""
+        levels = []
+        controller = AimdController(floor=1, ceiling=2, on_change=levels.append)
+        feed = Feed(controller)
+        feed.interval(MB)
+        feed.interval(2 * MB)
+        feed.interval(4 * MB)
+        self.assertEqual(controller.level, 2)
+        self.assertEqual(levels, [2])
+
+    def test_engine_runs_in_parallel(self):
+        """Test that work runs on several threads while bookkeeping stays on the caller's"""
+        controller = AimdController(floor=3, ceiling=3)
+        caller = threading.current_thread()
+        active = [0]
+        peak = [0]
+        lock = threading.Lock()
+        finished = []
+
+        def work(item):
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            time.sleep(0.05)
+            with lock:
+                active[0] -= 1
+            return item * 2
+
+        def finish(item, result):
+            self.assertIs(threading.current_thread(), caller)
+            finished.append(result)
+
+        run_concurrently(range(9), lambda item: None, work, finish, controller, CancelToken(), lambda: 0)
+        self.assertEqual(sorted(finished), [i * 2 for i in range(9)])
+        self.assertEqual(peak[0], 3)
+
+    def test_engine_cancel(self):
+        """Test that a cancel inside a worker stops the engine"""
+        controller = AimdController(floor=2, ceiling=2)
+        token = CancelToken()
+        started = []
+
+        def work(item):
+            started.append(item)
+            if item == 1:
+                token.cancel()
+            token.raise_if_cancelled()
+            return item
+
+        with self.assertRaises(SyncCancelled):
+            run_concurrently(range(100), lambda item: None, work, lambda item, result: None,
+                             controller, token, lambda: 0)
+        self.assertLess(len(started), 10)
+
+    def test_sync_with_concurrency(self):
+        """Test a parallel sync through the engine"""
+        with tempfile.TemporaryDirectory() as folder:
+            with patch('src.sync.GoProPlus') as mock_client_class:
+                mock_client = MagicMock()
+                mock_client.token_rejected = False
+                mock_client.listing_complete = False
+                mock_client.validate.return_value = True
+                mock_client.get_media_list.return_value = [{"id": str(i)} for i in range(20)]
+                mock_client.download_media_item.return_value = "downloaded"
+                mock_client_class.return_value = mock_client
+
+                self.assertTrue(sync_account("token", folder, resolve_urls=False, max_concurrency=4))
+                self.assertEqual(mock_client.download_media_item.call_count, 20)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+import json
+import tempfile
+import threading
+import unittest
+from urllib.request import Request, urlopen
+from urllib.error import HTTPError
+from unittest.mock import patch, MagicMock
+from src.cancellation import CancelToken
+from src.concurrency import AimdController
+from src.control import SyncControl, ControlServer, fetch_snapshot, parse_address
+from src.progress import ProgressTracker
+from src.sync import sync_account
+
+def call(server, path, body=None, token=None):
+    data = json.dumps(body).encode() if body is not None else (b"" if path != "/status" else None)
+    headers = {"Authorization": f"Bearer {token}"} if token else {}
+    with urlopen(Request(server.address + path, data=data, headers=headers), timeout=5) as response:
+        return json.load(response)
+
+class TestControl(unittest.TestCase):
+    """Test cases for the live status and control API"""
+
+    def setUp(self):
+        self.tracker = ProgressTracker()
+        self.tracker.set_totals(3, 3000)
+        self.tracker.start_file("a", "a.mp4", 1000)
+        self.tracker.advance("a", 400)
+        self.cancel_token = CancelToken()
+        self.controller = AimdController(1, 4)
+        self.control = SyncControl()
+        self.control.attach(self.tracker, self.cancel_token, self.controller)
+        self.server = ControlServer(self.control, port=0)
+        self.server.start()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_status_and_controls(self):
+        """Test status, pause/resume, bandwidth and concurrency changes over HTTP"""
+        status = call(self.server, "/status")
+        self.assertEqual((status["state"], status["bytes_done"], status["queued"]), ("starting", 400, 2))
+        self.assertEqual(status["active"][0]["filename"], "a.mp4")
+        self.assertEqual(status["concurrency_limits"], {"min": 1, "max": 4})
+
+        self.assertEqual(call(self.server, "/pause")["state"], "paused")
+        waiter = threading.Thread(target=self.control.wait_if_paused)
+        waiter.start()
+        waiter.join(0.3)
+        self.assertTrue(waiter.is_alive())
+        call(self.server, "/resume")
+        waiter.join(5)
+        self.assertFalse(waiter.is_alive())
+
+        self.assertEqual(call(self.server, "/bandwidth", {"bytes_per_second": "2MB"})["bandwidth_limit"], 2 * 1024 * 1024)
+        with self.assertRaises(HTTPError) as raised:
+            call(self.server, "/bandwidth", {"bytes_per_second": -5})
+        self.assertEqual(raised.exception.code, 400)
+        self.assertEqual(self.control.bytes_per_second, 2 * 1024 * 1024)
+        self.assertEqual(call(self.server, "/concurrency", {"max": 8, "min": 2})["concurrency_limits"], {"min": 2, "max": 8})
+        self.assertEqual(self.controller.level, 2)
+        with self.assertRaises(HTTPError) as raised:
+            call(self.server, "/concurrency", {"max": 0})
+        self.assertEqual(raised.exception.code, 400)
+
+        snapshot, _ = fetch_snapshot(self.server.address)
+        self.assertEqual((snapshot.files_total, snapshot.active[0].bytes_done), (3, 400))
+
+        call(self.server, "/cancel")
+        self.assertTrue(self.cancel_token.cancelled)
+        self.assertEqual(call(self.server, "/status")["state"], "cancelling")
+
+    def test_token(self):
+        """Test that a configured token is required"""
+        self.server.httpd.token = "secret"
+        with self.assertRaises(HTTPError) as raised:
+            call(self.server, "/status")
+        self.assertEqual(raised.exception.code, 401)
+        self.assertEqual(call(self.server, "/status", token="secret")["files_total"], 3)
+
+    def test_throttle(self):
+        """Test that the bandwidth limit spaces out chunks to the configured rate"""
+        control = SyncControl(bytes_per_second=100000)
+        cancel_token = MagicMock()
+        delays = []
+        cancel_token.sleep.side_effect = delays.append
+        # Time stands still, so the last of 200 KB at 100 KB/s has to wait two seconds
+        with patch('src.control.time.monotonic', return_value=control._last):
+            for _ in range(10):
+                control.throttle(20000, cancel_token)
+        self.assertAlmostEqual(delays[-1], 2.0, delta=0.1)
+        self.assertEqual(parse_address("8080"), ("127.0.0.1", 8080))
+        self.assertEqual(parse_address("0.0.0.0:9000"), ("0.0.0.0", 9000))
+
+    def test_paused_sync(self):
+        """Test that a paused sync starts no item until it is resumed"""
+        control = SyncControl()
+        control.pause()
+        with tempfile.TemporaryDirectory() as folder, patch('src.sync.GoProPlus') as mock_client_class:
+            mock_client = MagicMock()
+            mock_client.token_rejected = False
+            mock_client.listing_complete = False
+            mock_client.validate.return_value = True
+            mock_client.get_media_list.return_value = [{"id": "1", "filename": "a.mp4"}]
+            mock_client.download_media_item.return_value = "downloaded"
+            mock_client_class.return_value = mock_client
+
+            results = []
+            run = threading.Thread(target=lambda: results.append(sync_account("token", folder, control=control)))
+            run.start()
+            run.join(0.5)
+            self.assertTrue(run.is_alive())
+            mock_client.download_media_item.assert_not_called()
+            self.assertEqual(control.status()["state"], "paused")
+            control.resume()
+            run.join(5)
+        self.assertEqual(results, [True])
+        self.assertEqual(control.status()["state"], "finished")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,3 +1,4 @@
+import json
 import unittest
 import os
 import tempfile
@@ -63,12 +64,14 @@ class TestCoreFunctionality(unittest.TestCase):
             },
             "_pages": {"total_pages": 1}
         }
+        mock_response.raw.tell.return_value = len(json.dumps(mock_response.json.return_value))
         mock_get.return_value = mock_response
 
         media_list = self.client.get_media_list(pages=1)
         self.assertEqual(len(media_list), 2)
         self.assertEqual(media_list[0]["id"], "media1")
         self.assertEqual(media_list[1]["filename"], "test2.mp4")
+        self.assertEqual(self.client.listing_stats["bytes"], len(json.dumps(mock_response.json.return_value)))
 
     def test_download_url_selection(self):
         """Test getting download URL from media variations"""
@@ -140,6 +143,8 @@ class TestCoreFunctionality(unittest.TestCase):
         try:
             with patch('src.sync.GoProPlus') as mock_client_class:
                 mock_client = MagicMock()
+                mock_client.token_rejected = False
+                mock_client.listing_complete = False
                 mock_client.validate.return_value = True
                 mock_client.get_media_list.return_value = [
                     {"id": "media1", "filename": "test1.mp4", "file_size": 1000, "file_extension": "mp4"}
@@ -169,6 +174,8 @@ class TestCoreFunctionality(unittest.TestCase):
         try:
             with patch('src.sync.GoProPlus') as mock_client_class:
                 mock_client = MagicMock()
+                mock_client.token_rejected = False
+                mock_client.listing_complete = False
                 mock_client.validate.return_value = False
                 mock_client_class.return_value = mock_client
 
@@ -191,6 +198,8 @@ class TestCoreFunctionality(unittest.TestCase):
         try:
             with patch('src.sync.GoProPlus') as mock_client_class:
                 mock_client = MagicMock()
+                mock_client.token_rejected = False
+                mock_client.listing_complete = False
                 mock_client.validate.return_value = True
                 mock_client.get_media_list.return_value = []
                 mock_client_class.return_value = mock_client
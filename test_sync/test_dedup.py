@@ -0,0 +1,113 @@
+import os
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch, MagicMock
+from src import state
+from src.dedup import DedupIndex, dedup_key
+from src.gopro_client import GoProPlus
+
+PAYLOAD = bytes(range(256)) * 4096 # 1 MiB, more than the sampled ranges
+
+def range_server(payload, requests_seen):
+    def get(url, headers=None, **kwargs):
+        requests_seen.append(headers or {})
+        start, end = headers["Range"][len("bytes="):].split("-")
+        response = MagicMock()
+        response.status_code = 206
+        response.content = payload[int(start):int(end) + 1]
+        response.__enter__.return_value = response
+        return response
+    return get
+
+def clip(media_id, **fields):
+    item = {"id": media_id, "filename": "GX010042.MP4", "file_size": len(PAYLOAD),
+            "captured_at": "2024-05-01T10:00:00Z", "variations": [{"type": "source", "url": f"https://cdn/{media_id}"}]}
+    item.update(fields)
+    return item
+
+class TestDedup(unittest.TestCase):
+    """Test cases for content-addressed deduplication"""
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.target = self.folder.name
+        self.original = os.path.join(self.target, "a", "GX010042.MP4")
+        os.makedirs(os.path.dirname(self.original))
+        with open(self.original, 'wb') as f:
+            f.write(PAYLOAD)
+        self.index = DedupIndex(os.path.join(self.target, "dedup.json"))
+        self.index.record(clip("1"), self.original)
+        self.client = GoProPlus("token")
+        self.client.dedup = self.index
+        self.client._download_direct = MagicMock(return_value=True)
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def test_keys_and_shared_index(self):
+        """Test the metadata key, and that indexes sharing a file merge on save"""
+        self.assertEqual(dedup_key(clip("1")), dedup_key(clip("2", created_at="2025-01-01T00:00:00Z")))
+        self.assertNotEqual(dedup_key(clip("1")), dedup_key(clip("2", file_size=5)))
+        self.assertIsNone(dedup_key(clip("2", captured_at=None)))
+
+        other_path = os.path.join(self.target, "b.MP4")
+        with open(other_path, 'wb') as f:
+            f.write(b"x" * 5)
+        other = DedupIndex(self.index.path)
+        other.record(clip("3", file_size=5), other_path)
+        self.index.save()
+        other.save()
+        self.assertEqual(set(DedupIndex(self.index.path).entries),
+                         {dedup_key(clip("1")), dedup_key(clip("3", file_size=5))})
+
+    def test_concurrent_saves_keep_both_records(self):
+        """Test that an index saved while another one is being saved keeps both records"""
+        copy = os.path.join(self.target, "b", "GX010042.MP4")
+        os.makedirs(os.path.dirname(copy))
+        with open(copy, 'wb') as f:
+            f.write(PAYLOAD)
+        other = DedupIndex(self.index.path)
+        other.record(clip("2"), copy)
+        save_json = state.save_json
+        racing = threading.Thread(target=other.save)
+
+        def slow_save(path, data):
+            # The other index saves while this one is between reading and writing
+            if racing.ident is None:
+                racing.start()
+                racing.join(0.3)
+            save_json(path, data)
+
+        with patch('src.state.save_json', side_effect=slow_save):
+            self.index.save()
+            racing.join(5)
+        self.assertEqual(sorted(DedupIndex(self.index.path).entries[dedup_key(clip("1"))]), sorted([self.original, copy]))
+
+    def test_duplicate_is_linked(self):
+        """Test that a confirmed copy is linked after a few range requests instead of downloaded"""
+        seen = []
+        target = os.path.join(self.target, "b")
+        with patch('src.gopro_client.requests.get', side_effect=range_server(PAYLOAD, seen)):
+            self.assertEqual(self.client.download_media_item(clip("2"), target), "downloaded")
+
+        copy = os.path.join(target, "GX010042.MP4")
+        with open(copy, 'rb') as f:
+            self.assertEqual(f.read(), PAYLOAD)
+        if os.path.samefile(copy, self.original):
+            self.assertEqual(os.stat(copy).st_nlink, 2)
+        self.client._download_direct.assert_not_called()
+        self.assertTrue(all("Range" in headers for headers in seen))
+        self.assertLessEqual(len(seen), 6)
+        self.assertIn(os.path.abspath(copy), self.index.candidates(clip("3"), exclude=self.original))
+
+    def test_lookalike_is_downloaded(self):
+        """Test that a file with matching metadata but different content is downloaded"""
+        changed = PAYLOAD[:-1] + b"\0"
+        with patch('src.gopro_client.requests.get', side_effect=range_server(changed, [])):
+            self.client.download_media_item(clip("2"), os.path.join(self.target, "b"))
+        self.client._download_direct.assert_called_once()
+        self.assertFalse(os.path.exists(os.path.join(self.target, "b", "GX010042.MP4.link")))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import os
+import json
+import unittest
+import tempfile
+import threading
+from unittest.mock import patch, MagicMock
+from src.events import EventLog, FLUSH_EVERY
+from src.gopro_client import GoProPlus
+from src.report import load_runs, format_report
+from src.retry import RetryPolicy
+from src.sync import sync_account
+
+def stream_response(chunks, status_code=200, headers=None):
+    response = MagicMock()
+    response.status_code = status_code
+    response.headers = headers or {}
+    response.iter_content.return_value = chunks
+    response.__enter__.return_value = response
+    return response
+
+def read_events(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+class TestEvents(unittest.TestCase):
+    """Test cases for the JSON lines run journal and its report"""
+
+    def test_buffered_writes(self):
+        """Test that events are buffered in memory and written in batches by the writer thread"""
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "events.jsonl")
+            log = EventLog(path, run_id="r1")
+            log.emit("item_end", id="1", error=ValueError("odd"))
+            self.assertFalse(os.path.exists(path))
+
+            flushed_by = []
+            written = threading.Event()
+            flush = log.flush
+            def watched_flush():
+                flushed_by.append(threading.current_thread().name)
+                flush()
+                written.set()
+            with patch.object(log, 'flush', side_effect=watched_flush):
+                for i in range(FLUSH_EVERY - 1):
+                    log.emit("item_end", id=str(i))
+                self.assertTrue(written.wait(5))
+            self.assertEqual(flushed_by, ["events"])
+            self.assertEqual(len(read_events(path)), FLUSH_EVERY)
+            log.emit("run_end")
+            log.close()
+            events = read_events(path)
+            self.assertEqual(len(events), FLUSH_EVERY + 1)
+            self.assertEqual(events[0]["run"], "r1")
+            self.assertEqual(events[0]["error"], "odd")
+
+    def run_sync(self, folder, events_path, responses):
+        with open(os.path.join(folder, "old.jpg"), 'wb') as f:
+            f.write(b"1234")
+        client = GoProPlus("token")
+        client.validate = MagicMock(return_value=True)
+        client.get_media_list = MagicMock(return_value=[
+            {"id": "1", "filename": "old.jpg", "file_size": 4},
+            {"id": "2", "filename": "new.mp4", "file_size": 10, "variations": []},
+        ])
+        client.get_download_url = MagicMock(return_value="https://cdn/new.mp4")
+        with patch('src.sync.GoProPlus', return_value=client), \
+             patch('src.gopro_client.requests.get', side_effect=responses):
+            self.assertTrue(sync_account("token", folder, resolve_urls=False, verify="size",
+                                         retry_policy=RetryPolicy(base_delay=0), events=EventLog(events_path)))
+        os.remove(os.path.join(folder, "new.mp4"))
+
+    def test_sync_events_and_report(self):
+        """Test per-item and per-run events of a sync, and the report across runs"""
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "events.jsonl")
+            self.run_sync(folder, path, [stream_response([], 500), stream_response([b"0123456789"])])
+
+            events = read_events(path)
+            self.assertEqual([e["event"] for e in events],
+                             ["run_start", "listed", "item_start", "item_end", "item_start", "item_end", "run_end"])
+            skipped, downloaded, totals = events[3], events[5], events[6]
+            self.assertEqual(skipped["reason"], "exists and size matches")
+            self.assertEqual((downloaded["status"], downloaded["method"], downloaded["bytes"], downloaded["retries"]),
+                             ("downloaded", "direct", 10, 1))
+            self.assertEqual((totals["status"], totals["downloaded"], totals["skipped"], totals["bytes"]), ("ok", 1, 1, 10))
+
+            self.run_sync(folder, path, [stream_response([b"0123456789"])])
+            runs = load_runs(path)
+            self.assertEqual(len(runs), 2)
+            self.assertEqual((runs[0]["retries"], runs[1]["retries"]), (1, 0))
+            self.assertEqual(runs[1]["methods"], {"direct": 1})
+            report = format_report(runs)
+            self.assertIn("direct 1", report)
+            self.assertIn("over 1 earlier runs", report)
+
+if __name__ == '__main__':
+    unittest.main()
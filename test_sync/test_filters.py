@@ -0,0 +1,83 @@
+import json
+import unittest
+from datetime import datetime, timezone
+from unittest.mock import patch, MagicMock
+from src.gopro_client import GoProPlus
+from src.filters import MediaFilter, parse_types, parse_date, parse_size
+
+def page(items, total_pages=10):
+    response = MagicMock()
+    response.status_code = 200
+    response.json.return_value = {"_embedded": {"media": items}, "_pages": {"total_pages": total_pages}}
+    response.raw.tell.return_value = len(json.dumps(response.json.return_value))
+    return response
+
+class TestFilters(unittest.TestCase):
+    """Test cases for selective sync filters"""
+
+    def test_parsing(self):
+        """Test parsing of types, dates and sizes"""
+        self.assertIn("TimeLapseVideo", parse_types("videos"))
+        self.assertEqual(parse_types("Photo, Video,Photo"), ["Photo", "Video"])
+        self.assertEqual(parse_date("2024-05-01"), datetime(2024, 5, 1, tzinfo=timezone.utc))
+        self.assertEqual(parse_date("2024-05-01T10:00:00Z").hour, 10)
+        age = datetime.now(timezone.utc) - parse_date("90d")
+        self.assertAlmostEqual(age.total_seconds(), 90 * 86400, delta=60)
+        self.assertEqual(parse_size("20GB"), 20 * 1024 ** 3)
+        self.assertEqual(parse_size("1.5m"), int(1.5 * 1024 ** 2))
+        self.assertEqual(parse_size("100"), 100)
+        with self.assertRaises(ValueError):
+            parse_size("big")
+
+    def test_matches(self):
+        """Test that every filter field narrows the selection"""
+        item = {"type": "Video", "captured_at": "2024-05-02T10:00:00Z", "file_size": 5000,
+                "filename": "GX010001.MP4", "camera_model": "HERO11 Black"}
+        self.assertFalse(MediaFilter())
+        self.assertTrue(MediaFilter().matches(item))
+        self.assertTrue(MediaFilter(types=["Video"], since=parse_date("2024-05-01"), until=parse_date("2024-06-01"),
+                                    min_size=1000, max_size=10000, include=["gx*.mp4"], cameras=["hero11"]).matches(item))
+        self.assertFalse(MediaFilter(types=["Photo"]).matches(item))
+        self.assertFalse(MediaFilter(since=parse_date("2024-05-03")).matches(item))
+        self.assertFalse(MediaFilter(until=parse_date("2024-05-01")).matches(item))
+        self.assertFalse(MediaFilter(max_size=4999).matches(item))
+        self.assertFalse(MediaFilter(include=["*.JPG"]).matches(item))
+        self.assertFalse(MediaFilter(exclude=["GX01*"]).matches(item))
+        self.assertFalse(MediaFilter(cameras=["HERO9"]).matches(item))
+        # Without a capture time the upload time is used
+        self.assertTrue(MediaFilter(since=parse_date("2024-01-01")).matches({"created_at": "2024-02-01T00:00:00Z"}))
+
+    @patch('src.gopro_client.time.sleep')
+    @patch('requests.get')
+    def test_listing_pushdown_and_early_stop(self, mock_get, mock_sleep):
+        """Test that filters become search params, apply per page and end a sorted listing early"""
+        mock_get.side_effect = [
+            page([{"id": "a", "type": "Video", "captured_at": "2024-05-03T00:00:00Z"},
+                  {"id": "b", "type": "Video", "captured_at": "2024-05-02T00:00:00Z", "file_size": 10 ** 12}]),
+            page([{"id": "c", "type": "Video", "captured_at": "2024-04-01T00:00:00Z"}]),
+            page([{"id": "d", "type": "Video", "captured_at": "2024-03-01T00:00:00Z"}]),
+        ]
+        media_filter = MediaFilter(types=["Video"], since=parse_date("2024-05-01"), max_size=parse_size("20GB"))
+
+        items = GoProPlus("token").get_media_list(media_filter=media_filter)
+        self.assertEqual([item["id"] for item in items], ["a"])
+        # The second page is entirely older than the start date, so the third is never fetched
+        self.assertEqual(mock_get.call_count, 2)
+        params = mock_get.call_args_list[0][1]["params"]
+        self.assertEqual(params["type"], "Video")
+        self.assertEqual(params["captured_range"], "2024-05-01T00:00:00Z,")
+
+    @patch('src.gopro_client.time.sleep')
+    @patch('requests.get')
+    def test_unsorted_listing_is_read_in_full(self, mock_get, mock_sleep):
+        """Test that a listing that ignores the sort order is not cut short"""
+        mock_get.side_effect = [
+            page([{"id": "a", "captured_at": "2024-01-01T00:00:00Z"}], total_pages=2),
+            page([{"id": "b", "captured_at": "2024-06-01T00:00:00Z"}], total_pages=2),
+        ]
+        items = GoProPlus("token").get_media_list(media_filter=MediaFilter(since=parse_date("2024-05-01")))
+        self.assertEqual([item["id"] for item in items], ["b"])
+        self.assertEqual(mock_get.call_count, 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import os
+import unittest
+import tempfile
+from unittest.mock import patch
+from src.gopro_client import GoProPlus
+from src.fingerprint import FingerprintCache, sample_hash, SAMPLE_SIZE
+
+def write(path, data):
+    with open(path, 'wb') as f:
+        f.write(data)
+
+def bump_mtime(path):
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+
+class TestFingerprint(unittest.TestCase):
+    """Test cases for sampled-hash quick checks of existing files"""
+
+    def test_sample_hash(self):
+        """Test that samples cover head, tail and strided blocks of large files"""
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "a.mp4")
+            data = bytearray(os.urandom(SAMPLE_SIZE * 20))
+            write(path, data)
+            original = sample_hash(path)
+
+            for offset in (0, len(data) - 1, (len(data) - SAMPLE_SIZE) // 5):
+                changed = bytearray(data)
+                changed[offset] ^= 0xFF
+                write(path, changed)
+                self.assertNotEqual(sample_hash(path), original)
+
+            write(path, data)
+            self.assertEqual(sample_hash(path), original)
+
+    def test_verify(self):
+        """Test that unchanged files cost a stat and changed ones are re-hashed"""
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "a.mp4")
+            write(path, b"a" * 1000)
+            cache = FingerprintCache(folder)
+            self.assertTrue(cache.verify("1", path, 1000)) # first sight is recorded
+            self.assertFalse(cache.verify("1", path, 999))
+            cache.save()
+
+            cache = FingerprintCache(folder)
+            with patch('src.fingerprint.sample_hash') as mock_hash:
+                self.assertTrue(cache.verify("1", path, 1000))
+                mock_hash.assert_not_called()
+
+            # Touched but unchanged: re-hashed once, still trusted
+            bump_mtime(path)
+            self.assertTrue(cache.verify("1", path, 1000))
+
+            # Same size, different content
+            write(path, b"b" * 1000)
+            bump_mtime(path)
+            self.assertFalse(cache.verify("1", path, 1000))
+
+    def test_rescan(self):
+        """Test that rescan re-hashes files even when their mtime is unchanged"""
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "a.mp4")
+            write(path, b"a" * 1000)
+            cache = FingerprintCache(folder)
+            cache.record("1", path)
+            cache.save()
+
+            st = os.stat(path)
+            write(path, b"b" * 1000)
+            os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns)) # corruption that kept the mtime
+            self.assertTrue(FingerprintCache(folder).verify("1", path, 1000))
+            self.assertFalse(FingerprintCache(folder, rescan=True).verify("1", path, 1000))
+
+    def test_corrupted_file_is_downloaded_again(self):
+        """Test that the client re-downloads a file whose content no longer matches"""
+        with tempfile.TemporaryDirectory() as folder:
+            client = GoProPlus("token")
+            client.fingerprints = FingerprintCache(folder)
+            item = {"id": "1", "filename": "a.mp4", "file_size": 4}
+            path = os.path.join(folder, "a.mp4")
+
+            def download(media_id, target_path, max_retries=None):
+                write(target_path, b"good")
+                return True
+            with patch.object(client, 'get_download_url', return_value=None), \
+                 patch.object(client, 'download_file', side_effect=download) as mock_download:
+                self.assertEqual(client.download_media_item(item, folder), "downloaded")
+                self.assertEqual(client.download_media_item(item, folder), "skipped")
+
+                write(path, b"evil")
+                bump_mtime(path)
+                self.assertEqual(client.download_media_item(item, folder), "downloaded")
+                self.assertEqual(mock_download.call_count, 2)
+
+if __name__ == '__main__':
+    unittest.main()
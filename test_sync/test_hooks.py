@@ -0,0 +1,122 @@
+import os
+import sys
+import json
+import shlex
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch, MagicMock
+from src.hooks import Hook, HookPipeline
+from src.reconcile import LocalIndex
+from src.sync import sync_account
+
+class TestHooks(unittest.TestCase):
+    """Test cases for the post-download hook pipeline"""
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.target = self.folder.name
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def test_command_hook(self):
+        """Test placeholders, the appended path and the environment of command hooks"""
+        script = os.path.join(self.target, "hook.py")
+        with open(script, 'w') as f:
+            f.write("import os, sys, json\n"
+                    "open(sys.argv[-1] + '.meta', 'w').write(json.dumps([sys.argv[1:], os.environ['GOPRO_SYNC_MEDIA_ID'], "
+                    "json.loads(os.environ['GOPRO_SYNC_ITEM'])['filename']]))\n")
+        path = os.path.join(self.target, "GX01.MP4")
+        command = f"{shlex.quote(sys.executable)} {shlex.quote(script)} --id={{id}}"
+        Hook(command).run(path, {"id": 7, "filename": "GX01.MP4"})
+        with open(path + ".meta") as f:
+            self.assertEqual(json.load(f), [["--id=7", path], "7", "GX01.MP4"])
+
+        with self.assertRaises(Exception):
+            Hook(f"{shlex.quote(sys.executable)} -c 'import sys; sys.exit(3)'").run(path, {"id": 7})
+
+    def test_outcomes_and_retry(self):
+        """Test that outcomes are recorded per hook and only failed hooks run again for present items"""
+        calls = []
+        def extract(path, item):
+            calls.append(("extract", item["id"]))
+        def index(path, item):
+            calls.append(("index", item["id"]))
+            if item["id"] == "b":
+                raise RuntimeError("MAM offline")
+
+        pipeline = HookPipeline([extract, index], self.target, workers=1)
+        pipeline.start()
+        pipeline.submit({"id": "a"}, "a.mp4")
+        pipeline.submit({"id": "b"}, "b.mp4")
+        pipeline.wait()
+        pipeline.close()
+        self.assertEqual(calls, [("extract", "a"), ("index", "a"), ("extract", "b"), ("index", "b")])
+        self.assertEqual((pipeline.succeeded, pipeline.failed), (3, 1))
+
+        calls.clear()
+        pipeline = HookPipeline([extract, index], self.target, workers=1)
+        self.assertEqual(pipeline.records["b"]["index"]["error"], "MAM offline")
+        pipeline.start()
+        for media_id in ("a", "b", "c"):
+            pipeline.submit({"id": media_id}, f"{media_id}.mp4", new=False)
+        pipeline.wait()
+        pipeline.close()
+        self.assertEqual(calls, [("index", "b")])
+
+    def test_nodes_share_records(self):
+        """Test that pipelines of nodes sharing a target keep each other's outcomes"""
+        pipelines = [HookPipeline([lambda path, item: None], self.target, workers=1) for _ in range(2)]
+        for pipeline, media_id in zip(pipelines, ("a", "b")):
+            pipeline.start()
+            pipeline.submit({"id": media_id}, f"{media_id}.mp4")
+            pipeline.wait()
+        for pipeline in pipelines:
+            pipeline.close()
+        self.assertEqual(set(HookPipeline([], self.target).records), {"a", "b"})
+
+    def test_backpressure(self):
+        """Test that submitting blocks while the workers and queue are full"""
+        release = threading.Event()
+        pipeline = HookPipeline([lambda path, item: release.wait(5)], self.target, workers=1, queue_size=1)
+        pipeline.start()
+        pipeline.submit({"id": "1"}, "1.mp4")
+        pipeline.submit({"id": "2"}, "2.mp4")
+        third = threading.Thread(target=pipeline.submit, args=({"id": "3"}, "3.mp4"))
+        third.start()
+        third.join(0.5)
+        self.assertTrue(third.is_alive())
+        release.set()
+        third.join(5)
+        self.assertFalse(third.is_alive())
+        pipeline.wait()
+        pipeline.close()
+        self.assertEqual(pipeline.succeeded, 3)
+
+    def test_sync_runs_hooks(self):
+        """Test that sync_account runs hooks on new downloads, at the path the index has for them, before it returns"""
+        seen = []
+        # The .360 was unpacked, so the local index points at the media it became
+        unpacked = os.path.join(self.target, "pano.mp4")
+        index = LocalIndex(self.target)
+        index.record("3", unpacked)
+        index.save()
+        with patch('src.sync.GoProPlus') as mock_client_class:
+            mock_client = MagicMock()
+            mock_client.token_rejected = False
+            mock_client.listing_complete = False
+            mock_client.validate.return_value = True
+            mock_client.get_media_list.return_value = [{"id": "1", "filename": "new.mp4"}, {"id": "2", "filename": "old.mp4"},
+                                                       {"id": "3", "filename": "pano.360"}]
+            mock_client.download_media_item.side_effect = lambda item, folder, quality: (
+                "skipped" if item["id"] == "2" else "downloaded")
+            mock_client.get_target_path.side_effect = lambda item, folder: os.path.join(folder, item["filename"])
+            mock_client_class.return_value = mock_client
+
+            self.assertTrue(sync_account("token", self.target, hooks=[lambda path, item: seen.append(path)]))
+        self.assertEqual(sorted(seen), [os.path.join(self.target, "new.mp4"), unpacked])
+        self.assertTrue(os.path.exists(os.path.join(self.target, ".gopro-sync", "hooks.json")))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,128 @@
+import os
+import unittest
+import tempfile
+from unittest.mock import patch, MagicMock
+from src.gopro_client import GoProPlus
+from src.journal import WriteJournal, RESUME, SCRATCH, UNPACK
+from src.retry import RetryPolicy
+from src.sync import sync_account
+
+def stream_response(chunks, status_code=200, headers=None):
+    response = MagicMock()
+    response.status_code = status_code
+    response.headers = headers or {}
+    response.iter_content.return_value = chunks
+    response.__enter__.return_value = response
+    return response
+
+def touch(path, data=b"x"):
+    with open(path, 'wb') as f:
+        f.write(data)
+
+class TestJournal(unittest.TestCase):
+    """Test cases for the crash-safe write journal"""
+
+    def test_commit_and_checkpoint(self):
+        """Test that committed files are moved into place and drop out of the journal"""
+        with tempfile.TemporaryDirectory() as folder:
+            journal = WriteJournal(folder)
+            part = os.path.join(folder, "a.mp4.part")
+            touch(part, b"data")
+            journal.stage(part, RESUME, "a")
+            journal.stage(os.path.join(folder, "b.mp4.part"), RESUME, "b")
+
+            journal.commit(part, os.path.join(folder, "a.mp4"))
+            journal.checkpoint()
+            with open(os.path.join(folder, "a.mp4"), 'rb') as f:
+                self.assertEqual(f.read(), b"data")
+            with open(journal.path) as f:
+                self.assertEqual(len(f.readlines()), 1) # only b is still open
+
+    def test_recover(self):
+        """Test that leftovers of a crashed run are cleaned up, restored or kept for resuming"""
+        with tempfile.TemporaryDirectory() as folder:
+            crashed = WriteJournal(folder)
+            for name, kind, media_id in [("a.mp4.part", RESUME, "a"), ("b.jpg.extract", SCRATCH, None),
+                                         ("c.360.zip", UNPACK, None), ("d.mp4.extract", SCRATCH, None)]:
+                path = os.path.join(folder, name)
+                touch(path)
+                crashed.stage(path, kind, media_id)
+            crashed.unstage(os.path.join(folder, "d.mp4.extract")) # finished before the crash
+            crashed._file.close()
+
+            report = WriteJournal(folder).recover()
+            self.assertEqual(report.resumable, ["a"])
+            self.assertEqual(report.removed, [os.path.join(folder, "b.jpg.extract")])
+            self.assertEqual(report.restored, [os.path.join(folder, "c.360")])
+            self.assertTrue(os.path.exists(os.path.join(folder, "a.mp4.part")))
+            self.assertTrue(os.path.exists(os.path.join(folder, "c.360")))
+            self.assertTrue(os.path.exists(os.path.join(folder, "d.mp4.extract")))
+
+            # The partial download stays recorded until it is finished
+            self.assertEqual(WriteJournal(folder).recover().resumable, ["a"])
+
+    @patch('requests.get')
+    def test_truncated_direct_download_is_resumed(self, mock_get):
+        """Test that a direct download cut short is resumed instead of renamed into place"""
+        client = GoProPlus("token")
+        client.retry_policy = RetryPolicy(base_delay=0)
+        mock_get.side_effect = [
+            stream_response([b"12345"]),
+            stream_response([b"67890"], 206, {"Content-Range": "bytes 5-9/10"}),
+        ]
+        with tempfile.TemporaryDirectory() as folder:
+            client.journal = WriteJournal(folder)
+            final_path = os.path.join(folder, "a.mp4")
+            self.assertTrue(client._download_direct("https://cdn/a", final_path, "a", expected_size=10))
+            with open(final_path, 'rb') as f:
+                self.assertEqual(f.read(), b"1234567890")
+            self.assertEqual(mock_get.call_args_list[1][1]["headers"]["Range"], "bytes=5-")
+            self.assertEqual(client.journal.staged, {})
+
+    @patch('requests.get')
+    def test_partial_is_dropped_after_fallback(self, mock_get):
+        """Test that a direct download cut short leaves nothing behind once the zip fallback stored the item"""
+        client = GoProPlus("token")
+        client.retry_policy = RetryPolicy(max_attempts=1, base_delay=0)
+        mock_get.return_value = stream_response([b"123"])
+        item = {"id": "1", "filename": "a.jpg", "file_size": 10,
+                "variations": [{"type": "source", "url": "https://cdn/a"}]}
+        with tempfile.TemporaryDirectory() as folder:
+            client.journal = WriteJournal(folder)
+            def zip_fallback(media_id, target_path):
+                touch(target_path, b"1234567890")
+                return True
+            client.download_file = MagicMock(side_effect=zip_fallback)
+            self.assertEqual(client.download_media_item(item, folder), "downloaded")
+            client.journal.close()
+
+            self.assertEqual(sorted(os.listdir(folder)), [".gopro-sync", "a.jpg"])
+            self.assertEqual(WriteJournal(folder).recover().resumable, [])
+
+    def test_sync_resumes_interrupted_items_first(self):
+        """Test that a sync starts with the items a crashed run was downloading"""
+        with tempfile.TemporaryDirectory() as folder:
+            crashed = WriteJournal(folder)
+            part = os.path.join(folder, "2.mp4.part")
+            touch(part)
+            crashed.stage(part, RESUME, "2")
+            crashed.stage(os.path.join(folder, "1.jpg.extract"), SCRATCH)
+            touch(os.path.join(folder, "1.jpg.extract"))
+            crashed.close()
+
+            with patch('src.sync.GoProPlus') as mock_client_class:
+                mock_client = MagicMock()
+                mock_client.token_rejected = False
+                mock_client.listing_complete = False
+                mock_client.validate.return_value = True
+                mock_client.get_media_list.return_value = [{"id": "1"}, {"id": "2"}, {"id": "3"}]
+                mock_client.download_media_item.return_value = "downloaded"
+                mock_client_class.return_value = mock_client
+
+                self.assertTrue(sync_account("token", folder, resolve_urls=False))
+                order = [c[0][0]["id"] for c in mock_client.download_media_item.call_args_list]
+                self.assertEqual(order, ["2", "1", "3"])
+            self.assertFalse(os.path.exists(os.path.join(folder, "1.jpg.extract")))
+
+if __name__ == '__main__':
+    unittest.main()
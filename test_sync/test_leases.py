@@ -0,0 +1,160 @@
+import os
+import time
+import threading
+import unittest
+import tempfile
+from unittest.mock import patch, MagicMock
+from src.leases import SqliteLeaseStore, LockDirLeaseStore, open_lease_store, CLAIMED, HELD, DONE
+from src.sync import sync_account
+
+class TestLeases(unittest.TestCase):
+    """Test cases for leases shared between sync nodes"""
+
+    def check_store(self, make):
+        a, b = make("a"), make("b")
+        self.assertEqual(a.claim("1"), CLAIMED)
+        self.assertEqual(b.claim("1"), HELD)
+        self.assertEqual(a.claim("1"), CLAIMED) # own lease
+
+        a.release("1")
+        self.assertEqual(b.claim("1"), CLAIMED)
+        b.release("1", done=True)
+        self.assertEqual(a.claim("1"), DONE)
+        self.assertEqual(b.claim("1"), DONE)
+
+        # A node that stops renewing loses its lease once it expires
+        self.assertEqual(a.claim("2"), CLAIMED)
+        with patch('src.leases.time.time', return_value=time.time() + a.ttl + 1):
+            self.assertEqual(b.claim("2"), CLAIMED)
+        a.renew_all()
+        a.release("2") # no longer a's, so this must not free it
+        self.assertEqual(a.claim("2"), HELD)
+
+    def test_sqlite_store(self):
+        """Test claiming, releasing and taking over expired leases in SQLite"""
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "leases.db")
+            self.check_store(lambda node: SqliteLeaseStore(path, node, ttl=60))
+            self.assertIsInstance(open_lease_store(path, "c"), SqliteLeaseStore)
+
+    def test_lock_dir_store(self):
+        """Test claiming, releasing and taking over expired leases in a lock directory"""
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "leases")
+            self.check_store(lambda node: LockDirLeaseStore(path, node, ttl=60))
+            self.assertIsInstance(open_lease_store(path, "c"), LockDirLeaseStore)
+
+    def test_lock_dir_takeover_race(self):
+        """Test that only one of two nodes taking over the same expired lease gets it"""
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "leases")
+            crashed, b, c = (LockDirLeaseStore(path, node, ttl=60) for node in ("crashed", "b", "c"))
+            self.assertEqual(crashed.claim("1"), CLAIMED)
+            later = time.time() + 61
+            results = {}
+            read = b._read
+            def read_then_c_takes_over(lease_path):
+                lease = read(lease_path)
+                if "c" not in results:
+                    # c takes over the expired lease between b reading it and moving it aside
+                    results["c"] = c._claim("1", later)
+                return lease
+            with patch.object(b, "_read", side_effect=read_then_c_takes_over):
+                results["b"] = b._claim("1", later)
+            self.assertEqual(results, {"b": HELD, "c": CLAIMED})
+            self.assertEqual(b._claim("1", later), HELD)
+            self.assertEqual(os.listdir(path), ["1.lease"])
+
+            # A lease file that is still being written is not taken for expired
+            with open(os.path.join(path, "2.lease"), 'w') as f:
+                f.write('{"node": "c", "exp')
+            self.assertEqual(b.claim("2"), HELD)
+
+    def test_lock_dir_stale_renew(self):
+        """Test that a node whose lease was taken over can't renew or release the new owner's lease"""
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "leases")
+            a, b = (LockDirLeaseStore(path, node, ttl=60) for node in ("a", "b"))
+            lease_path = a._file("1")
+            self.assertEqual(a.claim("1"), CLAIMED)
+            now = time.time()
+            later = now + 61
+
+            # Expired but not taken over yet: a no longer owns it
+            expired = a._read(lease_path)
+            a._renew("1", later)
+            a._release("1", later, True)
+            self.assertEqual(a._read(lease_path), expired)
+
+            # b takes over between a reading its lease and swapping it for the renewed one
+            read = a._read
+            def read_then_b_takes_over(lease_path):
+                lease = read(lease_path)
+                if lease and lease["node"] == "a":
+                    self.assertEqual(b._claim("1", later), CLAIMED)
+                return lease
+            with patch.object(a, "_read", side_effect=read_then_b_takes_over):
+                a._renew("1", now)
+            taken = a._read(lease_path)
+            self.assertEqual(taken["node"], "b")
+            a._release("1", now, True)
+            a._release("1", now, False)
+            self.assertEqual(a._read(lease_path), taken)
+            self.assertEqual(os.listdir(path), ["1.lease"])
+
+    def test_stop_frees_held_leases(self):
+        """Test that leases still held when a node stops are free for others at once"""
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "leases.db")
+            a = SqliteLeaseStore(path, "a", ttl=60).start()
+            self.assertEqual(a.claim("1"), CLAIMED)
+            a.stop()
+            self.assertEqual(SqliteLeaseStore(path, "b").claim("1"), CLAIMED)
+
+    def make_client(self, media_list, downloads):
+        client = MagicMock()
+        client.token_rejected = False
+        client.listing_complete = False
+        client.validate.return_value = True
+        client.get_media_list.return_value = media_list
+        def download(item, target_folder, quality=None):
+            time.sleep(0.01)
+            downloads.append(item["id"])
+            return "downloaded"
+        client.download_media_item.side_effect = download
+        return client
+
+    def test_two_nodes_split_the_work(self):
+        """Test that two nodes together download every item exactly once"""
+        media_list = [{"id": str(i)} for i in range(30)]
+        downloads = []
+        with tempfile.TemporaryDirectory() as folder:
+            coordinate = os.path.join(folder, "leases.db")
+            with patch('src.sync.GoProPlus') as mock_client_class:
+                mock_client_class.side_effect = lambda token: self.make_client(media_list, downloads)
+                nodes = [threading.Thread(target=sync_account, args=("token", folder),
+                                          kwargs={"resolve_urls": False, "coordinate": coordinate, "node_id": node})
+                         for node in ("a", "b")]
+                for node in nodes:
+                    node.start()
+                for node in nodes:
+                    node.join()
+
+        self.assertEqual(sorted(downloads, key=int), [item["id"] for item in media_list])
+
+    def test_takes_over_crashed_node(self):
+        """Test that items leased by a node that died are synced once the lease expires"""
+        downloads = []
+        with tempfile.TemporaryDirectory() as folder:
+            coordinate = os.path.join(folder, "leases")
+            crashed = LockDirLeaseStore(coordinate, "crashed", ttl=0.2)
+            self.assertEqual(crashed.claim("2"), CLAIMED)
+
+            with patch('src.sync.GoProPlus') as mock_client_class, patch('src.sync.CONTESTED_POLL', 0.05):
+                mock_client_class.return_value = self.make_client([{"id": "1"}, {"id": "2"}, {"id": "3"}], downloads)
+                self.assertTrue(sync_account("token", folder, resolve_urls=False, coordinate=coordinate, node_id="b"))
+
+        self.assertEqual(downloads, ["1", "3", "2"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,127 @@
+import sys
+import gzip
+import json
+import tempfile
+import unittest
+from unittest.mock import patch, MagicMock
+from src.gopro_client import GoProPlus, LIST_FIELDS_FULL
+
+def signed(name):
+    return f"https://cdn.example.com/{name}?Expires=1900000000&Signature={'x' * 200}&Key-Pair-Id=APKA{'Y' * 16}"
+
+class FakeApi:
+    """
+    Stand-in for /media/search and /media/{id}/download: pages of `count` items,
+    refuses page sizes above max_per_page, returns only the requested fields and
+    reports gzip sizes as the bytes on the wire when gzip was accepted.
+    """
+    def __init__(self, count, max_per_page=100):
+        self.max_per_page = max_per_page
+        self.items = [{
+            "id": str(i), "created_at": "2024-05-01T00:00:00Z", "captured_at": "2024-05-01T00:00:00Z",
+            "camera_model": "HERO11 Black", "content_title": f"GX01{i:04d}", "filename": f"GX01{i:04d}.MP4",
+            "file_extension": "mp4", "file_size": 1000 + i, "type": "Video",
+            "variations": [{"label": label, "type": label, "width": w, "height": h, "url": signed(f"{i}/{label}")}
+                           for label, w, h in (("source", 3840, 2160), ("high_res_proxy_mp4", 1920, 1080),
+                                               ("mp4_low", 640, 360), ("concat", 3840, 2160))],
+        } for i in range(count)]
+        self.requests = []
+        self.wire_bytes = 0
+
+    def get(self, url, params=None, headers=None, **kwargs):
+        self.requests.append((url, params))
+        if url.endswith("/download"):
+            item = self.items[int(url.split("/")[-2])]
+            body = {"_embedded": {"files": [{"url": item["variations"][0]["url"]}],
+                                  "variations": item["variations"][1:]}}
+            return self.response(body, headers)
+        per_page, page = params["per_page"], params["page"]
+        if per_page > self.max_per_page:
+            return self.response({"message": "per_page too large"}, headers, status_code=400)
+        fields = params["fields"].split(",")
+        items = self.items[(page - 1) * per_page:page * per_page]
+        body = {"_embedded": {"media": [{k: v for k, v in item.items() if k in fields} for item in items]},
+                "_pages": {"current_page": page, "per_page": per_page,
+                           "total_pages": -(-len(self.items) // per_page), "total_items": len(self.items)}}
+        return self.response(body, headers)
+
+    def response(self, body, headers, status_code=200):
+        raw = json.dumps(body).encode()
+        accepted = (headers or {}).get("Accept-Encoding", "gzip, deflate") # requests' default
+        response = MagicMock()
+        response.status_code = status_code
+        response.json.return_value = body
+        response.text = raw.decode()
+        response.raw.tell.return_value = len(gzip.compress(raw)) if "gzip" in accepted else len(raw)
+        self.wire_bytes += response.raw.tell.return_value
+        return response
+
+def list_with(api, **kwargs):
+    client = GoProPlus("token")
+    with patch('src.gopro_client.requests.get', side_effect=api.get), patch('src.gopro_client.time.sleep'):
+        items = client.get_media_list(**kwargs)
+    return client, items
+
+class TestListing(unittest.TestCase):
+    """Test cases for page size probing, compression and lazy variations of the listing"""
+
+    def test_page_size_probe(self):
+        """Test that the largest accepted page size is found once and kept"""
+        api = FakeApi(250, max_per_page=100)
+        client, items = list_with(api)
+        self.assertEqual(len(items), 250)
+        self.assertTrue(client.listing_complete)
+        self.assertEqual([params["per_page"] for _, params in api.requests], [200, 100, 100, 100])
+        self.assertEqual(client.listing_stats["requests"], 4)
+        self.assertEqual(client.page_size, 100)
+
+        api.requests = []
+        with patch('src.gopro_client.requests.get', side_effect=api.get) as mock_get, \
+             patch('src.gopro_client.time.sleep'):
+            client.get_media_list()
+        self.assertEqual([params["per_page"] for _, params in api.requests], [100, 100, 100])
+        self.assertIn("gzip", mock_get.call_args[1]["headers"]["Accept-Encoding"])
+
+    def test_minimal_fields_beat_legacy_listing(self):
+        """Test that the default listing needs fewer requests and bytes than 30 full items per page"""
+        api = FakeApi(300)
+        legacy, _ = list_with(api, per_page=30, fields=LIST_FIELDS_FULL)
+        client, items = list_with(api)
+        self.assertNotIn("variations", items[0])
+        self.assertLess(client.listing_stats["requests"], legacy.listing_stats["requests"])
+        self.assertLess(client.listing_stats["bytes"] * 3, legacy.listing_stats["bytes"])
+
+    def test_lazy_variations(self):
+        """Test that variations are fetched only for items that get downloaded"""
+        api = FakeApi(2)
+        client, items = list_with(api, fields="minimal")
+        client._download_direct = MagicMock(return_value=True)
+        api.requests = []
+        with tempfile.TemporaryDirectory() as folder, \
+             patch('src.gopro_client.requests.get', side_effect=api.get):
+            self.assertEqual(client.download_media_item(items[0], folder, quality="smallest"), "downloaded")
+            self.assertEqual(client.download_media_item(items[1], folder), "downloaded")
+        self.assertEqual([url for url, _ in api.requests],
+                         ["https://api.gopro.com/media/0/download", "https://api.gopro.com/media/1/download"])
+        self.assertEqual(client._download_direct.call_args_list[0][0][0], signed("0/mp4_low"))
+        self.assertEqual(client._download_direct.call_args_list[1][0][0], signed("1/source"))
+
+def benchmark(count=5000, max_per_page=100, downloads=50):
+    """Listing benchmark: python -m test_sync.test_listing --benchmark"""
+    print(f"Listing {count} items, API accepts up to {max_per_page} per page, {downloads} of them to download:")
+    for name, kwargs in (("30 per page, variations listed", {"per_page": 30, "fields": LIST_FIELDS_FULL}),
+                         ("probed page size, variations", {"fields": "full"}),
+                         ("probed page size, minimal fields", {})):
+        api = FakeApi(count, max_per_page)
+        client, items = list_with(api, **kwargs)
+        with patch('src.gopro_client.requests.get', side_effect=api.get):
+            # Minimal listings look the links of downloaded items up one by one
+            for item in items[:downloads]:
+                client.ensure_variations(item)
+        print(f"{name:<34} {len(api.requests):>5} requests {api.wire_bytes / 1024:>7.0f} KiB on the wire")
+
+if __name__ == '__main__':
+    if "--benchmark" in sys.argv:
+        benchmark()
+    else:
+        unittest.main()
@@ -0,0 +1,73 @@
+import os
+import json
+import unittest
+import tempfile
+from unittest.mock import patch, MagicMock
+from src.gopro_client import GoProPlus
+from src.profiling import Tracer, SyncProfiler, span, PROFILE_ENV, PROFILE_CPU_ENV
+
+class TestProfiling(unittest.TestCase):
+    """Test cases for per-phase spans and profiling captures"""
+
+    def test_spans_and_chrome_trace(self):
+        """Test that spans are recorded with their args and exported as complete events"""
+        tracer = Tracer()
+        with span(tracer, "item", media_id="a") as s:
+            with tracer.span("transfer"):
+                pass
+            s.args["status"] = "downloaded"
+        with self.assertRaises(ValueError):
+            with span(tracer, "rename"):
+                raise ValueError()
+        # Without a tracer spans cost nothing and record nothing
+        with span(None, "item") as s:
+            s.args["status"] = "ignored"
+
+        trace = tracer.chrome_trace()
+        complete = {e["name"]: e for e in trace["traceEvents"] if e["ph"] == "X"}
+        self.assertEqual(set(complete), {"item", "transfer", "rename"})
+        self.assertEqual(complete["item"]["args"], {"media_id": "a", "status": "downloaded"})
+        self.assertEqual(complete["rename"]["args"], {"error": "ValueError"})
+        self.assertGreaterEqual(complete["item"]["dur"], complete["transfer"]["dur"])
+        self.assertTrue(any(e["ph"] == "M" for e in trace["traceEvents"]))
+        self.assertEqual(tracer.summary()["item"][0], 1)
+
+    @patch('requests.get')
+    def test_client_phases(self, mock_get):
+        """Test that a direct download is split into connect, transfer and rename"""
+        response = MagicMock()
+        response.status_code = 200
+        response.headers = {}
+        response.iter_content.return_value = [b"abc", b"def"]
+        response.__enter__.return_value = response
+        mock_get.return_value = response
+
+        client = GoProPlus("token")
+        client.tracer = Tracer()
+        with tempfile.TemporaryDirectory() as temp_dir:
+            client._download_direct("https://cdn/a", os.path.join(temp_dir, "a.mp4"), "a")
+
+        names = [event[0] for event in client.tracer.events]
+        self.assertEqual(names, ["connect", "transfer", "rename"])
+        self.assertEqual(client.tracer.events[1][4]["bytes"], 6)
+
+    def test_profiler_captures(self):
+        """Test the environment toggle and the files written by a profiling session"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            self.assertIsNone(SyncProfiler.from_env())
+            with patch.dict(os.environ, {PROFILE_ENV: temp_dir, PROFILE_CPU_ENV: "1"}):
+                profiler = SyncProfiler.from_env(memory=True)
+            self.assertTrue(profiler.cpu and profiler.memory)
+
+            profiler.start()
+            with profiler.tracer.span("list"):
+                sum(range(1000))
+            written = profiler.stop()
+
+            self.assertEqual(sorted(os.path.basename(p) for p in written),
+                             ["cpu.pstats", "memory.tracemalloc", "memory.txt", "trace.json"])
+            with open(os.path.join(temp_dir, "trace.json")) as f:
+                self.assertIn("list", [e["name"] for e in json.load(f)["traceEvents"]])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+import unittest
+import time
+import tempfile
+from unittest.mock import patch, MagicMock
+from src.gopro_client import GoProPlus
+from src.progress import ProgressTracker, ProgressReporter, format_snapshot
+from src.sync import sync_account
+
+class TestProgress(unittest.TestCase):
+    """Test cases for byte level progress events"""
+
+    def test_tracker_accounting(self):
+        """Test bytes, files and active transfers through a file's lifecycle"""
+        tracker = ProgressTracker()
+        tracker.set_totals(2, 300)
+        tracker.start_file("a", "a.mp4", 200)
+        tracker.advance("a", 50)
+
+        snapshot = tracker.snapshot()
+        self.assertEqual(snapshot.bytes_done, 50)
+        self.assertEqual([f.filename for f in snapshot.active], ["a.mp4"])
+
+        # A retry starts over, a finished file accounts for its full size
+        tracker.restart_file("a")
+        tracker.advance("a", 200)
+        tracker.finish_file("a", 200)
+        # A skipped file transfers nothing but still completes
+        tracker.start_file("b", "b.mp4", 100)
+        tracker.finish_file("b", 100)
+
+        snapshot = tracker.snapshot()
+        self.assertEqual(snapshot.files_done, 2)
+        self.assertEqual(snapshot.bytes_done, 300)
+        self.assertEqual(snapshot.percent, 100.0)
+        self.assertEqual(tracker.bytes_transferred, 250)
+        self.assertEqual(snapshot.active, [])
+
+    def test_abandon_gives_back_bytes(self):
+        """Test that a failed transfer does not count as progress"""
+        tracker = ProgressTracker()
+        tracker.set_totals(1, 100)
+        tracker.start_file("a", "a.mp4", 100)
+        tracker.advance("a", 40)
+        tracker.abandon_file("a")
+        snapshot = tracker.snapshot()
+        self.assertEqual(snapshot.bytes_done, 0)
+        self.assertEqual(snapshot.files_done, 0)
+
+    @patch('src.progress.time.monotonic')
+    def test_throughput_and_eta(self, mock_monotonic):
+        """Test throughput over the sampling window and the resulting ETA"""
+        tracker = ProgressTracker()
+        tracker.set_totals(1, 1000)
+        tracker.start_file("a", "a.mp4", 1000)
+
+        mock_monotonic.return_value = 100.0
+        tracker.snapshot()
+        tracker.advance("a", 200)
+        mock_monotonic.return_value = 102.0
+        snapshot = tracker.snapshot()
+
+        self.assertAlmostEqual(snapshot.bytes_per_second, 100.0)
+        self.assertAlmostEqual(snapshot.eta_seconds, 8.0)
+        self.assertIn("ETA 0:08", format_snapshot(snapshot))
+
+    def test_reporter_coalesces_updates(self):
+        """Test that a burst of chunks turns into a few listener calls"""
+        tracker = ProgressTracker()
+        tracker.set_totals(1, 100000)
+        tracker.start_file("a", "a.mp4", 100000)
+        received = []
+
+        reporter = ProgressReporter(tracker, received.append, hz=20)
+        reporter.start()
+        for _ in range(100000):
+            tracker.advance("a", 1)
+        time.sleep(0.1)
+        reporter.stop()
+
+        self.assertLess(len(received), 100)
+        self.assertEqual(received[-1].bytes_done, 100000)
+
+    @patch('requests.get')
+    def test_client_reports_chunks(self, mock_get):
+        """Test that direct downloads report their bytes per media id"""
+        response = MagicMock()
+        response.status_code = 200
+        response.headers = {}
+        response.__enter__.return_value = response
+        response.iter_content.return_value = [b"abc", b"de"]
+        mock_get.return_value = response
+
+        client = GoProPlus("token")
+        client.progress = ProgressTracker()
+        client.progress.start_file("a", "a.mp4", 5)
+        item = {"id": "a", "filename": "a.mp4", "variations": [{"label": "source", "url": "https://cdn/a"}]}
+        with tempfile.TemporaryDirectory() as temp_dir:
+            self.assertEqual(client.download_media_item(item, temp_dir), "downloaded")
+        self.assertEqual(client.progress.bytes_transferred, 5)
+
+    def test_sync_emits_final_snapshot(self):
+        """Test that sync_account delivers progress snapshots ending at 100%"""
+        with tempfile.TemporaryDirectory() as test_folder:
+            with patch('src.sync.GoProPlus') as mock_client_class:
+                mock_client = MagicMock()
+                mock_client.token_rejected = False
+                mock_client.listing_complete = False
+                mock_client.validate.return_value = True
+                mock_client.get_media_list.return_value = [
+                    {"id": "a", "filename": "a.mp4", "file_size": 100},
+                    {"id": "b", "filename": "b.mp4", "file_size": 300},
+                ]
+                mock_client.download_media_item.return_value = "downloaded"
+                mock_client_class.return_value = mock_client
+
+                snapshots = []
+                self.assertTrue(sync_account("token", test_folder, on_progress=snapshots.append, resolve_urls=False))
+                self.assertEqual(snapshots[-1].bytes_total, 400)
+                self.assertEqual(snapshots[-1].files_done, 2)
+                self.assertEqual(snapshots[-1].percent, 100.0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,161 @@
+import os
+import time
+import unittest
+import zipfile
+import tempfile
+from unittest.mock import patch, MagicMock
+from src.gopro_client import GoProPlus
+from src.reconcile import LocalIndex, reconcile, ARCHIVE_DIR
+from src.tiers import TierManifest, TIER_SOURCE
+from src.fingerprint import FingerprintCache
+from src.retry import RetryQueue
+from src.storage import LocalStorage
+from src.sync import sync_account
+
+class SetStorage:
+    """Storage stand-in whose files are a set of paths."""
+    def __init__(self, paths):
+        self.paths = set(paths)
+
+    def exists(self, path):
+        return path in self.paths
+
+class TestReconcile(unittest.TestCase):
+    """Test cases for reconciling the local index with the cloud listing"""
+
+    def make_files(self, folder, names):
+        index = LocalIndex(folder)
+        for media_id, name in names.items():
+            path = os.path.join(folder, name)
+            with open(path, 'w') as f:
+                f.write(name)
+            index.record(media_id, path)
+        return index
+
+    def test_report_and_missing(self):
+        """Test that orphans are only reported by default and missing files are re-queued"""
+        with tempfile.TemporaryDirectory() as folder:
+            index = self.make_files(folder, {"a": "a.mp4", "b": "b.mp4", "c": "c.mp4"})
+            os.remove(os.path.join(folder, "b.mp4"))
+
+            report = reconcile([{"id": "b"}, {"id": "c"}, {"id": "d"}], index, LocalStorage(), folder)
+            self.assertEqual(report.orphans, [("a", os.path.join(folder, "a.mp4"))])
+            self.assertEqual(report.missing, ["b"])
+            self.assertIsNone(index.get("b"))
+            self.assertTrue(os.path.exists(os.path.join(folder, "a.mp4")))
+
+            index.save()
+            self.assertEqual(set(LocalIndex(folder).entries), {"a", "c"})
+
+    def test_archive_and_delete(self):
+        """Test archiving and deleting files whose media was deleted from the cloud"""
+        with tempfile.TemporaryDirectory() as folder:
+            index = self.make_files(folder, {"a": "a.mp4", "b": "b.mp4", "c": "c.mp4"})
+
+            report = reconcile([{"id": "b"}, {"id": "c"}], index, LocalStorage(), folder, "archive")
+            self.assertEqual(report.archived, [os.path.join(folder, ARCHIVE_DIR, "a.mp4")])
+            self.assertTrue(os.path.exists(os.path.join(folder, ARCHIVE_DIR, "a.mp4")))
+            self.assertIsNone(index.get("a"))
+
+            report = reconcile([{"id": "c"}], index, LocalStorage(), folder, "delete")
+            self.assertEqual(report.deleted, [os.path.join(folder, "b.mp4")])
+            self.assertFalse(os.path.exists(os.path.join(folder, "b.mp4")))
+
+    def test_mass_orphans_are_only_reported(self):
+        """Test that a listing missing most items can't delete the library"""
+        with tempfile.TemporaryDirectory() as folder:
+            index = self.make_files(folder, {"a": "a.mp4", "b": "b.mp4", "c": "c.mp4"})
+            report = reconcile([{"id": "c"}], index, LocalStorage(), folder, "delete")
+            self.assertEqual(len(report.orphans), 2)
+            self.assertEqual(report.deleted, [])
+            self.assertEqual(len(os.listdir(folder)), 3)
+
+    def test_large_library(self):
+        """Test that 100k items reconcile in well under the time of a tree walk"""
+        index = LocalIndex("/nonexistent")
+        paths = []
+        for i in range(100000):
+            path = f"/library/{i}.mp4"
+            index.entries[str(i)] = {"path": path}
+            paths.append(path)
+        listing = [{"id": str(i)} for i in range(1, 100001)]
+
+        started = time.monotonic()
+        report = reconcile(listing, index, SetStorage(paths[:-1]), "/library")
+        self.assertLess(time.monotonic() - started, 5)
+        self.assertEqual(report.orphans, [("0", "/library/0.mp4")])
+        self.assertEqual(report.missing, ["99999"])
+
+    @patch('requests.get')
+    def test_client_records_paths(self, mock_get):
+        """Test that downloads, skips and unpacked .360 files end up in the index"""
+        with tempfile.TemporaryDirectory() as folder:
+            client = GoProPlus("token")
+            client.local_index = LocalIndex(folder)
+            with open(os.path.join(folder, "a.mp4"), 'w') as f:
+                f.write("12345")
+            self.assertEqual(client.download_media_item({"id": "a", "filename": "a.mp4", "file_size": 5}, folder), "skipped")
+            self.assertEqual(client.local_index.get("a"), os.path.join(folder, "a.mp4"))
+
+            with zipfile.ZipFile(os.path.join(folder, "b.360"), 'w') as z:
+                z.writestr("b_media.mp4", "spherical")
+            client.download_file = MagicMock(return_value=True)
+            self.assertEqual(client.download_media_item({"id": "b", "filename": "b.360"}, folder), "downloaded")
+            self.assertEqual(client.local_index.get("b"), os.path.join(folder, "b.mp4"))
+            # Once unpacked the .360 is not fetched again
+            self.assertEqual(client.download_media_item({"id": "b", "filename": "b.360"}, folder), "skipped")
+            client.download_file.assert_called_once()
+
+    def test_sync_requeues_and_archives(self):
+        """Test that sync downloads locally removed files first and archives orphans"""
+        with tempfile.TemporaryDirectory() as folder:
+            index = self.make_files(folder, {"a": "a.mp4", "b": "b.mp4", "c": "c.mp4", "d": "d.mp4"})
+            index.save()
+            os.remove(os.path.join(folder, "c.mp4"))
+
+            with patch('src.sync.GoProPlus') as mock_client_class:
+                mock_client = MagicMock()
+                mock_client.token_rejected = False
+                mock_client.listing_complete = False
+                mock_client.validate.return_value = True
+                mock_client.listing_complete = True
+                mock_client.get_media_list.return_value = [{"id": "b"}, {"id": "c"}, {"id": "d"}, {"id": "e"}]
+                mock_client.download_media_item.return_value = "downloaded"
+                mock_client_class.return_value = mock_client
+
+                self.assertTrue(sync_account("token", folder, on_deleted="archive", resolve_urls=False))
+                order = [c[0][0]["id"] for c in mock_client.download_media_item.call_args_list]
+                self.assertEqual(order[0], "c")
+            self.assertTrue(os.path.exists(os.path.join(folder, ARCHIVE_DIR, "a.mp4")))
+
+    def test_nodes_sharing_state_keep_each_others_entries(self):
+        """Test that state files saved by several nodes sharing a target are merged"""
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "a.mp4")
+            with open(path, 'wb') as f:
+                f.write(b"a" * 10)
+            indexes, tiers, fingerprints, retries = ([make(folder) for _ in range(2)]
+                                                     for make in (LocalIndex, TierManifest, FingerprintCache, RetryQueue))
+            for n, media_id in enumerate(("1", "2")):
+                indexes[n].record(media_id, path)
+                tiers[n].set(media_id, "proxy", path)
+                fingerprints[n].record(media_id, path)
+                retries[n].defer({"id": media_id, "filename": "a.mp4"}, "HTTP 500")
+            for store in indexes + tiers + fingerprints + retries:
+                store.save()
+
+            self.assertEqual(set(LocalIndex(folder).entries), {"1", "2"})
+            self.assertEqual(set(TierManifest(folder).entries), {"1", "2"})
+            self.assertEqual(set(FingerprintCache(folder).entries), {"1", "2"})
+            self.assertEqual(set(RetryQueue(folder).previous), {"1", "2"})
+
+            # Removals only remove what the node removed
+            indexes[0].forget("1")
+            tiers[1].set("2", TIER_SOURCE, path)
+            indexes[0].save()
+            tiers[1].save()
+            self.assertEqual(set(LocalIndex(folder).entries), {"2"})
+            self.assertEqual(set(TierManifest(folder).entries), {"1"})
+
+if __name__ == '__main__':
+    unittest.main()
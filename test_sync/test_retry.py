@@ -0,0 +1,157 @@
+import unittest
+import os
+import tempfile
+import requests
+from unittest.mock import patch, MagicMock
+from src.gopro_client import GoProPlus
+from src.retry import RetryPolicy, RetryQueue, DownloadError, is_retryable
+from src.filters import MediaFilter
+from src.sync import sync_account
+
+def http_response(status_code, payload=b"", content_type="video/mp4"):
+    response = MagicMock()
+    response.status_code = status_code
+    response.headers = {"Content-Type": content_type}
+    response.iter_content.return_value = [payload]
+    response.__enter__.return_value = response
+    return response
+
+class TestRetry(unittest.TestCase):
+    """Test cases for the retry policy and deferred retry queue"""
+
+    def test_error_classification(self):
+        """Test that transient errors are retryable and client errors are fatal"""
+        self.assertTrue(is_retryable(DownloadError("x", 503)))
+        self.assertTrue(is_retryable(DownloadError("x", 429)))
+        self.assertTrue(is_retryable(requests.exceptions.ConnectTimeout()))
+        self.assertTrue(is_retryable(requests.exceptions.ConnectionError()))
+        self.assertTrue(is_retryable(ConnectionResetError()))
+        self.assertFalse(is_retryable(DownloadError("x", 404)))
+        self.assertFalse(is_retryable(DownloadError("x", 403)))
+        self.assertFalse(is_retryable(PermissionError()))
+
+        http_error = requests.exceptions.HTTPError(response=MagicMock(status_code=502))
+        self.assertTrue(is_retryable(http_error))
+
+    def test_backoff_is_capped_and_jittered(self):
+        """Test that backoff grows exponentially within the cap"""
+        policy = RetryPolicy(base_delay=1.0, max_delay=5.0)
+        for attempt in range(10):
+            delay = policy.backoff(attempt)
+            self.assertGreaterEqual(delay, 0)
+            self.assertLessEqual(delay, min(5.0, 2 ** attempt))
+
+    @patch('time.sleep')
+    def test_run_retries_transient_errors(self, mock_sleep):
+        """Test that retryable failures back off and try again"""
+        calls = []
+        def attempt(n):
+            calls.append(n)
+            if n < 2:
+                raise DownloadError("busy", 503)
+
+        self.assertTrue(RetryPolicy(max_attempts=3).run(attempt, "test"))
+        self.assertEqual(calls, [0, 1, 2])
+
+    @patch('time.sleep')
+    def test_run_stops_on_fatal_errors(self, mock_sleep):
+        """Test that fatal failures are not retried"""
+        calls = []
+        def attempt(n):
+            calls.append(n)
+            raise DownloadError("gone", 404)
+
+        self.assertFalse(RetryPolicy(max_attempts=3).run(attempt, "test"))
+        self.assertEqual(calls, [0])
+        mock_sleep.assert_not_called()
+
+    @patch('time.sleep')
+    def test_run_honours_retry_after(self, mock_sleep):
+        """Test that a server supplied Retry-After is used as the delay"""
+        def attempt(n):
+            if n == 0:
+                raise DownloadError("slow down", 429, retry_after=7)
+
+        self.assertTrue(RetryPolicy(max_attempts=2).run(attempt, "test"))
+        mock_sleep.assert_called_once_with(7.0)
+
+    @patch('time.sleep')
+    @patch('requests.get')
+    def test_download_file_backs_off(self, mock_get, mock_sleep):
+        """Test that the zip download waits between retryable failures"""
+        mock_get.side_effect = [http_response(503), http_response(200, b"photo", "image/jpeg")]
+        client = GoProPlus("token")
+        client.retry_policy = RetryPolicy(base_delay=2.0)
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            target = os.path.join(temp_dir, "a.jpg")
+            self.assertTrue(client.download_file("a", target))
+            with open(target, 'rb') as f:
+                self.assertEqual(f.read(), b"photo")
+        self.assertEqual(mock_get.call_count, 2)
+        mock_sleep.assert_called_once()
+
+    def test_retry_queue_persistence(self):
+        """Test that failures are persisted, prioritized and cleared once resolved"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            queue = RetryQueue(temp_dir)
+            queue.defer({"id": "b", "filename": "b.mp4"}, "HTTP 503")
+            queue.save()
+
+            queue = RetryQueue(temp_dir)
+            self.assertEqual(queue.previous["b"]["runs"], 1)
+            ordered = queue.prioritize([{"id": "a"}, {"id": "b"}])
+            self.assertEqual([i["id"] for i in ordered], ["b", "a"])
+
+            queue.resolve("b")
+            queue.save()
+            self.assertEqual(RetryQueue(temp_dir).previous, {})
+
+    def test_sync_retries_deferred_items_at_end(self):
+        """Test that failed items are retried after the main pass"""
+        with tempfile.TemporaryDirectory() as test_folder:
+            with patch('src.sync.GoProPlus') as mock_client_class:
+                mock_client = MagicMock()
+                mock_client.token_rejected = False
+                mock_client.listing_complete = False
+                mock_client.validate.return_value = True
+                mock_client.get_media_list.return_value = [
+                    {"id": "a", "filename": "a.mp4"},
+                    {"id": "b", "filename": "b.mp4"},
+                    {"id": "c", "filename": "c.mp4"},
+                ]
+                outcomes = {"a": ["failed", "downloaded"], "b": ["downloaded"], "c": ["failed", "failed"]}
+                mock_client.download_media_item.side_effect = lambda item, *a, **kw: outcomes[item["id"]].pop(0)
+                mock_client_class.return_value = mock_client
+
+                policy = RetryPolicy(base_delay=0)
+                self.assertTrue(sync_account("token", test_folder, retry_policy=policy))
+
+                order = [c[0][0]["id"] for c in mock_client.download_media_item.call_args_list]
+                self.assertEqual(order, ["a", "b", "c", "a", "c"])
+                self.assertEqual(list(RetryQueue(test_folder).previous), ["c"])
+
+    def test_filtered_run_keeps_unlisted_failures(self):
+        """Test that failures of items a filtered run did not list stay queued, and go once a full listing lacks them"""
+        with tempfile.TemporaryDirectory() as test_folder:
+            queue = RetryQueue(test_folder)
+            queue.defer({"id": "photo1", "filename": "GOPR1.JPG"}, "HTTP 503")
+            queue.save()
+
+            with patch('src.sync.GoProPlus') as mock_client_class:
+                mock_client = MagicMock()
+                mock_client.token_rejected = False
+                mock_client.listing_complete = True
+                mock_client.validate.return_value = True
+                mock_client.get_media_list.return_value = [{"id": "video1", "filename": "GX01.MP4"}]
+                mock_client.download_media_item.return_value = "downloaded"
+                mock_client_class.return_value = mock_client
+
+                self.assertTrue(sync_account("token", test_folder, media_filter=MediaFilter(types=["Video"])))
+                self.assertEqual(list(RetryQueue(test_folder).previous), ["photo1"])
+
+                self.assertTrue(sync_account("token", test_folder))
+                self.assertEqual(RetryQueue(test_folder).previous, {})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import os
+import sys
+import tempfile
+import unittest
+import subprocess
+from unittest.mock import patch, MagicMock
+from src.sync import plan_sync
+from src.cli import get_token
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ("requests", "keyring", "zipfile", "boto3", "sqlite3", "src.sync")
+
+def import_times(*args, env=None):
+    """Runs the CLI under -X importtime; returns {module: cumulative microseconds}."""
+    result = subprocess.run([sys.executable, "-X", "importtime", os.path.join("src", "cli.py"), *args],
+                            cwd=PROJECT_ROOT, capture_output=True, text=True, env=env)
+    times = {}
+    for line in result.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            _, cumulative, name = line[len("import time:"):].split("|")
+            if name.strip() == "site":
+                times = {} # whatever the interpreter's own startup loaded is not ours
+            elif cumulative.strip().isdigit():
+                times[name.strip()] = int(cumulative)
+    return times
+
+class TestStartup(unittest.TestCase):
+    """Test cases for the fast CLI startup path"""
+
+    def test_help_skips_heavy_imports(self):
+        """Test that --help loads neither requests, keyring, zipfile nor the sync stack"""
+        times = import_times("--help")
+        self.assertIn("src.progress", times)
+        for module in HEAVY_MODULES:
+            self.assertNotIn(module, times)
+
+    def test_env_token_skips_keyring(self):
+        """Test that a token in the environment never imports keyring"""
+        with patch.dict(os.environ, {"GO_PRO_AUTH_TOKEN": "token"}), patch('src.cli._keyring') as mock_keyring:
+            self.assertEqual(get_token(), "token")
+            mock_keyring.assert_not_called()
+
+    def test_plan(self):
+        """Test that a plan sorts items like a sync would, without writing anything, auth.json included"""
+        with tempfile.TemporaryDirectory() as folder, tempfile.TemporaryDirectory() as state_dir:
+            with open(os.path.join(folder, "present.jpg"), 'wb') as f:
+                f.write(b"1234")
+            me = MagicMock(status_code=200)
+            me.json.return_value = {"id": "user"}
+            with patch('src.sync.GoProPlus') as mock_client_class, patch('requests.get', return_value=me), \
+                 patch.dict(os.environ, {"GOPRO_SYNC_STATE_DIR": state_dir}):
+                from src.gopro_client import GoProPlus
+                client = GoProPlus("token")
+                client.get_media_list = MagicMock(return_value=[
+                    {"id": "1", "filename": "present.jpg", "file_size": 4},
+                    {"id": "2", "filename": "new.mp4", "file_size": 100},
+                ])
+                mock_client_class.return_value = client
+
+                plan = plan_sync("token", folder)
+            self.assertEqual([item["id"] for item in plan["download"]], ["2"])
+            self.assertEqual([item["id"] for item in plan["skip"]], ["1"])
+            self.assertEqual(os.listdir(folder), ["present.jpg"])
+            self.assertEqual(os.listdir(state_dir), [])
+
+def benchmark(runs=10):
+    """Startup benchmark: python -m test_sync.test_startup --benchmark"""
+    results = []
+    for _ in range(runs):
+        times = import_times("--help")
+        results.append(sum(t for name, t in times.items() if name.count(".") == 1 and name.startswith("src.")))
+    results.sort()
+    print(f"CLI imports for --help: median {results[len(results) // 2] / 1000:.1f} ms, "
+          f"best {results[0] / 1000:.1f} ms over {runs} runs")
+
+if __name__ == '__main__':
+    if "--benchmark" in sys.argv:
+        benchmark()
+    else:
+        unittest.main()
@@ -0,0 +1,165 @@
+import io
+import os
+import unittest
+import zipfile
+from unittest.mock import patch, MagicMock
+from src.gopro_client import GoProPlus
+from src.state import state_path
+from src.storage import S3Storage, LocalStorage, storage_for
+from src.zipstream import ZipStream
+
+try:
+    import boto3
+    from moto import mock_aws
+except ImportError:
+    mock_aws = None
+
+class Unseekable(io.RawIOBase):
+    """Write target that makes zipfile use data descriptors, like a streaming server."""
+    def __init__(self):
+        self.data = bytearray()
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self.data += b
+        return len(b)
+
+def make_zip(entries, compression=zipfile.ZIP_DEFLATED, streamed=False):
+    target = Unseekable() if streamed else io.BytesIO()
+    with zipfile.ZipFile(target, 'w', compression=compression) as z:
+        for name, data in entries:
+            z.writestr(name, data)
+    return bytes(target.data) if streamed else target.getvalue()
+
+def stream_response(data, content_type="application/zip", chunk=1000):
+    response = MagicMock()
+    response.status_code = 200
+    response.headers = {"Content-Type": content_type}
+    response.iter_content.return_value = [data[i:i + chunk] for i in range(0, len(data), chunk)]
+    response.__enter__.return_value = response
+    return response
+
+class TestZipStream(unittest.TestCase):
+    """Test cases for unpacking ZIPs while they stream in"""
+
+    def test_all_layouts(self):
+        """Test stored/deflated entries with and without data descriptors"""
+        # Contains the descriptor signature to make sure stored data isn't cut short
+        entries = [("a.mp4", os.urandom(70000) + b"PK\x07\x08" + b"x" * 20), ("b.jpg", b""), ("c.txt", b"hello" * 1000)]
+        for compression in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+            for streamed in (False, True):
+                data = make_zip(entries, compression, streamed)
+                stream = ZipStream(io.BytesIO(data))
+                self.assertTrue(stream.is_zip())
+                read = [(entry.name, entry.read()) for entry in stream]
+                self.assertEqual(read, entries, f"compression={compression} streamed={streamed}")
+
+    def test_skipping_entries_and_corruption(self):
+        """Test that unread entries are skipped and damaged data is detected"""
+        data = make_zip([("a.mp4", b"a" * 5000), ("b.mp4", b"b" * 10)], zipfile.ZIP_STORED)
+        names = [entry.name for entry in ZipStream(io.BytesIO(data))]
+        self.assertEqual(names, ["a.mp4", "b.mp4"])
+
+        damaged = data.replace(b"a" * 10, b"c" * 10, 1)
+        with self.assertRaises(zipfile.BadZipFile):
+            for entry in ZipStream(io.BytesIO(damaged)):
+                entry.read()
+
+        self.assertFalse(ZipStream(io.BytesIO(b"not a zip")).is_zip())
+
+class TestStorage(unittest.TestCase):
+    """Test cases for storage backends"""
+
+    def test_backend_selection_and_state(self):
+        """Test picking a backend by target and keeping remote state local"""
+        self.assertIsInstance(storage_for("/tmp/x"), LocalStorage)
+        self.assertEqual(state_path("/tmp/x", "a.json"), os.path.join("/tmp/x", ".gopro-sync", "a.json"))
+        with patch.dict(os.environ, {"GOPRO_SYNC_STATE_DIR": "/state"}):
+            self.assertEqual(state_path("s3://bucket/media", "a.json"), "/state/s3_bucket_media/a.json")
+
+@unittest.skipUnless(mock_aws, "boto3 and moto are needed for the S3 tests")
+class TestS3Storage(unittest.TestCase):
+    """Test cases for syncing straight into an S3-compatible bucket (moto stand-in)"""
+
+    def setUp(self):
+        self.mock = mock_aws()
+        self.mock.start()
+        self.s3 = boto3.client("s3", region_name="us-east-1")
+        self.s3.create_bucket(Bucket="media")
+        self.storage = S3Storage("s3://media/gopro", client=self.s3, part_size=5 * 1024 * 1024)
+        self.client = GoProPlus("token")
+        self.client.storage = self.storage
+
+    def tearDown(self):
+        self.mock.stop()
+
+    def body(self, key):
+        return self.s3.get_object(Bucket="media", Key=key)["Body"].read()
+
+    def test_multipart_upload(self):
+        """Test that large files go up in parts and small ones in one request"""
+        data = os.urandom(11 * 1024 * 1024)
+        with self.storage.open_write("s3://media/gopro/big.mp4") as f:
+            for i in range(0, len(data), 64 * 1024):
+                f.write(data[i:i + 64 * 1024])
+                self.assertLess(len(f._buffer), self.storage.part_size)
+            self.assertEqual(len(f._parts), 2)
+        self.assertEqual(self.body("gopro/big.mp4"), data)
+        self.assertEqual(self.storage.getsize("s3://media/gopro/big.mp4"), len(data))
+
+        with self.assertRaises(RuntimeError):
+            with self.storage.open_write("s3://media/gopro/aborted.mp4") as f:
+                f.write(data)
+                raise RuntimeError("interrupted")
+        self.assertFalse(self.storage.exists("s3://media/gopro/aborted.mp4"))
+        self.assertEqual(self.s3.list_multipart_uploads(Bucket="media").get("Uploads", []), [])
+
+    @patch('requests.get')
+    def test_direct_download_and_size_check(self, mock_get):
+        """Test that direct downloads land in the bucket and are then skipped"""
+        mock_get.return_value = stream_response(b"video-data", "video/mp4")
+        item = {"id": "m1", "filename": "GX01.MP4", "file_size": 10,
+                "variations": [{"type": "source", "label": "source", "url": "https://cdn/a"}]}
+
+        self.assertEqual(self.client.download_media_item(item, "s3://media/gopro"), "downloaded")
+        self.assertEqual(self.body("gopro/GX01.MP4"), b"video-data")
+        # A fresh backend sees it in the listing of the prefix
+        self.client.storage = S3Storage("s3://media/gopro", client=self.s3)
+        self.assertEqual(self.client.download_media_item(item, "s3://media/gopro"), "skipped")
+        self.assertEqual(mock_get.call_count, 1)
+
+    @patch('requests.get')
+    def test_streamed_zip_and_360(self, mock_get):
+        """Test that zip/source downloads, .360 archives included, are unpacked on the way"""
+        inner = make_zip([("GS01.mp4", b"spherical"), ("GS01.thm", b"thumb")], streamed=True)
+        responses = {
+            "m1": make_zip([("GX01.MP4", b"zipped-video")], streamed=True),
+            "m2": make_zip([("GS01.360", inner)], zipfile.ZIP_STORED, streamed=True),
+        }
+        mock_get.side_effect = lambda url, params=None, **kwargs: stream_response(responses[params["ids"]])
+
+        self.assertEqual(self.client.download_media_item({"id": "m1", "filename": "GX01.MP4", "variations": []}, "s3://media/gopro"), "downloaded")
+        self.assertEqual(self.client.download_media_item({"id": "m2", "filename": "GS01.360", "variations": []}, "s3://media/gopro"), "downloaded")
+
+        self.assertEqual(self.body("gopro/GX01.MP4"), b"zipped-video")
+        self.assertEqual(self.body("gopro/GS01.mp4"), b"spherical")
+        self.assertEqual(self.body("gopro/GS01.thm"), b"thumb")
+        keys = {obj["Key"] for obj in self.s3.list_objects_v2(Bucket="media")["Contents"]}
+        self.assertEqual(keys, {"gopro/GX01.MP4", "gopro/GS01.mp4", "gopro/GS01.thm"})
+
+    @patch('requests.get')
+    def test_streamed_batch(self, mock_get):
+        """Test that a multi-id batch zip is unpacked straight into the bucket"""
+        mock_get.return_value = stream_response(make_zip([("a.jpg", b"photo-a"), ("b.jpg", b"photo-b")], streamed=True))
+        batch = [({"id": "a"}, "s3://media/gopro/a.jpg"), ({"id": "b"}, "s3://media/gopro/b.jpg"),
+                 ({"id": "c"}, "s3://media/gopro/c.jpg")]
+
+        self.assertEqual(self.client.download_batch(batch), {"a", "b"})
+        self.assertEqual(self.body("gopro/a.jpg"), b"photo-a")
+        self.assertEqual(self.body("gopro/b.jpg"), b"photo-b")
+        self.assertFalse(self.storage.exists("s3://media/gopro/c.jpg"))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -16,6 +16,8 @@ class TestSync(unittest.TestCase):
             # Mock the GoProPlus client
             with patch('src.sync.GoProPlus') as mock_client_class:
                 mock_client = MagicMock()
+                mock_client.token_rejected = False
+                mock_client.listing_complete = False
                 mock_client.validate.return_value = True
                 mock_client.get_media_list.return_value = [
                     {
@@ -62,6 +64,8 @@ class TestSync(unittest.TestCase):
             # Mock the GoProPlus client with validation failure
             with patch('src.sync.GoProPlus') as mock_client_class:
                 mock_client = MagicMock()
+                mock_client.token_rejected = False
+                mock_client.listing_complete = False
                 mock_client.validate.return_value = False
                 mock_client_class.return_value = mock_client
 
@@ -93,6 +97,8 @@ class TestSync(unittest.TestCase):
             # Mock the GoProPlus client
             with patch('src.sync.GoProPlus') as mock_client_class:
                 mock_client = MagicMock()
+                mock_client.token_rejected = False
+                mock_client.listing_complete = False
                 mock_client.validate.return_value = True
                 mock_client.get_media_list.return_value = [
                     {
@@ -138,6 +144,8 @@ class TestSync(unittest.TestCase):
             # Mock the GoProPlus client
             with patch('src.sync.GoProPlus') as mock_client_class:
                 mock_client = MagicMock()
+                mock_client.token_rejected = False
+                mock_client.listing_complete = False
                 mock_client.validate.return_value = True
                 mock_client.get_media_list.return_value = []
                 mock_client_class.return_value = mock_client
@@ -0,0 +1,98 @@
+import unittest
+import os
+import tempfile
+from unittest.mock import patch, MagicMock
+from src.gopro_client import GoProPlus
+from src.sync import sync_account
+from src.tiers import TierManifest, select_variation, TIER_SOURCE
+
+VARIATIONS = [
+    {"type": "source", "label": "source", "url": "https://source.url", "width": 5312, "height": 2988},
+    {"label": "high_res_proxy_mp4", "url": "https://high.url", "width": 1920, "height": 1080},
+    {"label": "edit_proxy", "url": "https://low.url", "width": 640, "height": 360},
+    {"label": "no_url_proxy", "width": 320, "height": 180},
+]
+
+class TestTiers(unittest.TestCase):
+    """Test cases for proxy/source tiered sync"""
+
+    def test_select_variation(self):
+        """Test picking variations by quality"""
+        self.assertEqual(select_variation(VARIATIONS, TIER_SOURCE)["url"], "https://source.url")
+        self.assertEqual(select_variation(VARIATIONS, "smallest")["url"], "https://low.url")
+        self.assertEqual(select_variation(VARIATIONS, "largest")["url"], "https://high.url")
+        self.assertEqual(select_variation(VARIATIONS, "high_res_proxy_mp4")["url"], "https://high.url")
+        self.assertIsNone(select_variation(VARIATIONS, "missing"))
+        self.assertIsNone(select_variation(VARIATIONS[1:], TIER_SOURCE))
+
+    def test_manifest_persistence(self):
+        """Test that proxies are recorded and cleared once upgraded"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            manifest = TierManifest(temp_dir)
+            manifest.set("a", "edit_proxy", "/x/a.mp4")
+            manifest.set("b", TIER_SOURCE, "/x/b.mp4")
+            manifest.save()
+
+            reloaded = TierManifest(temp_dir)
+            self.assertEqual(reloaded.get("a"), "edit_proxy")
+            self.assertIsNone(reloaded.get("b"))
+            self.assertEqual(reloaded.proxies(), ["a"])
+
+            reloaded.set("a", TIER_SOURCE, "/x/a.mp4")
+            reloaded.save()
+            self.assertEqual(TierManifest(temp_dir).proxies(), [])
+
+    @patch('requests.get')
+    def test_proxy_pass_then_upgrade(self, mock_get):
+        """Test that proxies are kept on proxy passes and replaced on source passes"""
+        def fake_get(url, **kwargs):
+            response = MagicMock()
+            response.status_code = 200
+            response.headers = {}
+            response.__enter__.return_value = response
+            response.iter_content.return_value = [b"proxy" if url == "https://low.url" else b"source-data"]
+            return response
+        mock_get.side_effect = fake_get
+
+        item = {"id": "m1", "filename": "GX01.MP4", "file_size": 11, "variations": VARIATIONS}
+        with tempfile.TemporaryDirectory() as temp_dir:
+            client = GoProPlus("token")
+            client.tier_manifest = TierManifest(temp_dir)
+            path = os.path.join(temp_dir, "GX01.MP4")
+
+            self.assertEqual(client.download_media_item(item, temp_dir, quality="smallest"), "downloaded")
+            self.assertEqual(client.tier_manifest.get("m1"), "edit_proxy")
+            self.assertEqual(client.download_media_item(item, temp_dir, quality="smallest"), "skipped")
+            self.assertEqual(mock_get.call_count, 1)
+
+            self.assertEqual(client.download_media_item(item, temp_dir), "downloaded")
+            self.assertIsNone(client.tier_manifest.get("m1"))
+            with open(path, 'rb') as f:
+                self.assertEqual(f.read(), b"source-data")
+            self.assertEqual(client.download_media_item(item, temp_dir), "skipped")
+
+    def test_upgrade_only_touches_selected_proxies(self):
+        """Test that an upgrade run only processes the selected proxied items"""
+        with tempfile.TemporaryDirectory() as test_folder:
+            manifest = TierManifest(test_folder)
+            manifest.set("a", "edit_proxy", os.path.join(test_folder, "a.mp4"))
+            manifest.set("b", "edit_proxy", os.path.join(test_folder, "b.mp4"))
+            manifest.save()
+
+            with patch('src.sync.GoProPlus') as mock_client_class:
+                mock_client = MagicMock()
+                mock_client.token_rejected = False
+                mock_client.listing_complete = False
+                mock_client.validate.return_value = True
+                mock_client.get_media_list.return_value = [{"id": "a"}, {"id": "b"}, {"id": "c"}]
+                mock_client.download_media_item.return_value = "downloaded"
+                mock_client_class.return_value = mock_client
+
+                self.assertTrue(sync_account("token", test_folder, upgrade_ids=["b"]))
+                mock_client.download_media_item.assert_called_once()
+                args, kwargs = mock_client.download_media_item.call_args
+                self.assertEqual(args[0]["id"], "b")
+                self.assertEqual(kwargs["quality"], TIER_SOURCE)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+import unittest
+import time
+from unittest.mock import patch, MagicMock
+from src.gopro_client import GoProPlus
+from src.url_resolver import UrlResolver, signed_url_expiry, source_url_from_download
+
+def download_info(url):
+    return {"_embedded": {"files": [{"url": url}], "variations": []}}
+
+class TestUrlResolver(unittest.TestCase):
+    """Test cases for the signed download URL resolver"""
+
+    def test_signed_url_expiry(self):
+        """Test reading the expiry of CloudFront and S3 signed URLs"""
+        self.assertEqual(signed_url_expiry("https://cdn/x.mp4?Expires=1700000000&Signature=abc"), 1700000000)
+        s3 = "https://bucket.s3/x.mp4?X-Amz-Date=20240101T000000Z&X-Amz-Expires=3600&X-Amz-Signature=abc"
+        self.assertEqual(signed_url_expiry(s3), 1704067200 + 3600)
+        self.assertIsNone(signed_url_expiry("https://cdn/x.mp4"))
+
+    def test_source_url_from_download(self):
+        """Test picking the source URL out of a download response"""
+        self.assertEqual(source_url_from_download(download_info("https://a")), "https://a")
+        two_files = {"_embedded": {"files": [{"url": "https://a"}, {"url": "https://b"}]}}
+        self.assertIsNone(source_url_from_download(two_files))
+        variations = {"_embedded": {"files": [], "variations": [{"label": "source", "url": "https://s"}]}}
+        self.assertEqual(source_url_from_download(variations), "https://s")
+        self.assertIsNone(source_url_from_download(None))
+
+    def test_resolver_caches_until_expiry(self):
+        """Test that links are cached and refreshed ahead of expiry"""
+        client = MagicMock()
+        soon = int(time.time()) + 30
+        later = int(time.time()) + 3600
+        client.get_media_download.side_effect = [
+            download_info(f"https://cdn/a?Expires={soon}"),
+            download_info(f"https://cdn/a?Expires={later}"),
+        ]
+        resolver = UrlResolver(client, refresh_margin=60)
+        item = {"id": "a"}
+
+        self.assertEqual(resolver.get(item), f"https://cdn/a?Expires={soon}")
+        # Within the refresh margin, so the next get resolves again
+        self.assertEqual(resolver.get(item), f"https://cdn/a?Expires={later}")
+        self.assertEqual(resolver.get(item), f"https://cdn/a?Expires={later}")
+        self.assertEqual(client.get_media_download.call_count, 2)
+
+    def test_resolver_remembers_items_without_link(self):
+        """Test that items without a direct link are not resolved repeatedly"""
+        client = MagicMock()
+        client.get_media_download.return_value = {"_embedded": {"files": []}}
+        resolver = UrlResolver(client)
+
+        self.assertIsNone(resolver.get({"id": "a"}))
+        self.assertIsNone(resolver.get({"id": "a"}))
+        self.assertEqual(client.get_media_download.call_count, 1)
+
+    def test_prefetch_and_listing_urls(self):
+        """Test that prefetch resolves in bulk and trusts unexpired listing URLs"""
+        client = MagicMock()
+        client.get_media_download.side_effect = lambda media_id: download_info(f"https://cdn/{media_id}")
+        resolver = UrlResolver(client)
+        listed = {"id": "b", "variations": [{"label": "source", "url": "https://listing/b"}]}
+
+        resolver.prefetch([{"id": "a"}, listed, {"id": "c"}])
+        self.assertEqual(client.get_media_download.call_count, 2)
+        self.assertEqual(resolver.get({"id": "a"}), "https://cdn/a")
+        self.assertEqual(resolver.get(listed), "https://listing/b")
+        self.assertEqual(client.get_media_download.call_count, 2)
+
+    def test_background_lookahead(self):
+        """Test that the background thread resolves upcoming items"""
+        client = MagicMock()
+        client.get_media_download.side_effect = lambda media_id: download_info(f"https://cdn/{media_id}")
+        resolver = UrlResolver(client, lookahead=2)
+        items = [{"id": str(i)} for i in range(5)]
+
+        resolver.start(items)
+        try:
+            deadline = time.time() + 5
+            while client.get_media_download.call_count < 2 and time.time() < deadline:
+                time.sleep(0.01)
+        finally:
+            resolver.stop()
+        resolved = {c[0][0] for c in client.get_media_download.call_args_list}
+        self.assertEqual(resolved, {"0", "1"})
+
+    @patch('src.gopro_client.API_DELAY', 0.05)
+    @patch('requests.get')
+    def test_lookups_are_paced(self, mock_get):
+        """Test that parallel lookups share the API pacing and a 429 holds all of them off"""
+        started = []
+        def get(url, **kwargs):
+            started.append(time.monotonic())
+            response = MagicMock()
+            response.status_code = 429 if len(started) == 1 else 200
+            response.headers = {"Retry-After": "0.2"} if len(started) == 1 else {}
+            response.json.return_value = download_info(f"https://cdn/{url.split('/')[-2]}")
+            return response
+        mock_get.side_effect = get
+        client = GoProPlus("token")
+        held = []
+        hold_off = client._hold_off
+        def record_hold(seconds):
+            held.append(time.monotonic())
+            hold_off(seconds)
+        client._hold_off = record_hold
+        resolver = UrlResolver(client, workers=4)
+
+        resolver.prefetch([{"id": str(i)} for i in range(4)])
+        self.assertEqual(resolver.get({"id": "3"}), "https://cdn/3")
+        self.assertEqual(len(started), 5)
+        started.sort()
+        self.assertTrue(all(b - a >= 0.05 - 0.01 for a, b in zip(started, started[1:])))
+        # Calls already under way when the 429 came in can't be held; none start during the hold
+        after = [t for t in started[1:] if t >= held[0]]
+        self.assertTrue(after)
+        self.assertTrue(all(t - held[0] >= 0.2 - 0.01 for t in after))
+
+    @patch('requests.get')
+    def test_client_invalidates_refused_link(self, mock_get):
+        """Test that a refused direct link is dropped and zip/source is used"""
+        client = GoProPlus("token")
+        client.url_resolver = MagicMock()
+        client.url_resolver.get.return_value = "https://cdn/a"
+        client._download_direct = MagicMock(return_value=False)
+        client.download_file = MagicMock(return_value=True)
+
+        status = client.download_media_item({"id": "a", "filename": "a.mp4"}, "/nonexistent")
+        self.assertEqual(status, "downloaded")
+        client.url_resolver.invalidate.assert_called_once_with("a")
+        client.download_file.assert_called_once()
+
+if __name__ == '__main__':
+    unittest.main()